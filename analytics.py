@@ -0,0 +1,132 @@
+# Competitor rank analytics for emag-product-rank-finder
+"""Keyword × product analytics over a full-SERP snapshot, all in vectorized pandas.
+
+`snapshot_frame` loads every card of a snapshot once: product ids become a
+categorical pd_code, and pages after the end of the results (or after a gap)
+are dropped. `rank_cards` then assigns `rank_global` and `position_on_page`
+with grouped cumcounts, using the same rules as `emag_rank.filter_cards`:
+only cards with a pd_code and a title count, and paid cards are dropped when
+ignoring sponsored results. Every other function is a groupby/pivot over
+that frame:
+
+* rank_matrix: best rank of each watched pd_code for each keyword/view
+* share_of_top: organic vs. sponsored share of the top N slots
+* rank_deltas: rank changes of the watchlist between two snapshots
+* sponsored_density: share of promoted/sponsored cards per page
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from snapshot import SnapshotReader
+
+KEYS = ["keyword", "view"]
+
+
+def snapshot_frame(reader: SnapshotReader) -> pd.DataFrame:
+    """One row per stored card on a valid page, with pd_code, title flag and paid flag."""
+    cards = reader.cards_table()
+    pages = reader.pages_table()
+    if cards is None or pages is None:
+        return pd.DataFrame(columns=KEYS + ["page", "idx_on_page", "pd_code", "has_title", "paid"])
+    frame = cards.to_pandas()
+    frame["keyword"] = frame["keyword"].astype(str)
+    frame["view"] = frame["view"].astype(str)
+    product = frame["product"].to_numpy()
+    frame["pd_code"] = pd.Categorical.from_codes(product, categories=reader.pd_codes)
+    has_title = np.array([bool(title.strip()) for title in reader.titles], dtype=bool)
+    frame["has_title"] = has_title[product]
+    frame["paid"] = frame["promoted"] | frame["sponsored"]
+
+    # A keyword's pages count up to its first empty page, and only while they are contiguous from 1
+    pages = pages.to_pandas().drop_duplicates(KEYS + ["page"]).sort_values(KEYS + ["page"])
+    grouped = pages.groupby(KEYS, sort=False)
+    contiguous = pages["page"].to_numpy() == grouped.cumcount().to_numpy() + 1
+    empty = (pages["cards"] == 0).astype(int)
+    after_empty = (empty.groupby([pages["keyword"], pages["view"]]).cumsum() - empty) > 0
+    broken = pd.Series(~contiguous, index=pages.index) | after_empty
+    valid = pages[broken.groupby([pages["keyword"], pages["view"]]).cumsum() == 0]
+    return frame.merge(valid[KEYS + ["page"]], on=KEYS + ["page"], how="inner")
+
+
+def rank_cards(frame: pd.DataFrame, ignore_sponsored: bool = False) -> pd.DataFrame:
+    """Countable cards with `rank_global` and `position_on_page`, as a live crawl would rank them."""
+    keep = frame["has_title"] & (frame["pd_code"].astype(str) != "")
+    if ignore_sponsored:
+        keep &= ~frame["paid"]
+    ranked = frame[keep].sort_values(KEYS + ["page", "idx_on_page"], kind="stable")
+    ranked["rank_global"] = ranked.groupby(KEYS, sort=False).cumcount() + 1
+    ranked["position_on_page"] = ranked.groupby(KEYS + ["page"], sort=False).cumcount() + 1
+    return ranked
+
+
+def rank_matrix(ranked: pd.DataFrame, watchlist: Sequence[str]) -> pd.DataFrame:
+    """(keyword, view) × pd_code best global rank; NaN where the product is absent."""
+    watched = ranked[ranked["pd_code"].isin(list(watchlist))]
+    matrix = (watched.groupby(KEYS + ["pd_code"], observed=True)["rank_global"].min()
+              .unstack("pd_code"))
+    index = pd.MultiIndex.from_frame(ranked[KEYS].drop_duplicates().sort_values(KEYS))
+    return matrix.reindex(index=index, columns=list(watchlist))
+
+
+def share_of_top(ranked: pd.DataFrame, top_n: int, watchlist: Optional[Sequence[str]] = None,
+                 by_keyword: bool = False) -> pd.DataFrame:
+    """Share of the top N slots held per pd_code, split into organic and sponsored.
+
+    Pass a frame ranked with ignore_sponsored=False, so paid cards hold slots.
+    """
+    top = ranked[ranked["rank_global"] <= top_n]
+    groups = (KEYS if by_keyword else []) + ["pd_code"]
+    counts = (top.groupby(groups + ["paid"], observed=True).size()
+              .unstack("paid", fill_value=0)
+              .reindex(columns=[False, True], fill_value=0))
+    if by_keyword:
+        slots = top.groupby(KEYS).size().rename("slots")
+        counts = counts.join(slots, on=KEYS)
+        slots = counts.pop("slots")
+    else:
+        slots = len(top)
+    share = pd.DataFrame({
+        "organic_share": counts[False] / slots,
+        "sponsored_share": counts[True] / slots,
+    })
+    share["total_share"] = share["organic_share"] + share["sponsored_share"]
+    if watchlist is not None:
+        share = share[share.index.get_level_values("pd_code").isin(list(watchlist))]
+    return share.sort_values("total_share", ascending=False)
+
+
+def rank_deltas(old_matrix: pd.DataFrame, new_matrix: pd.DataFrame) -> pd.DataFrame:
+    """Long table of old/new rank per keyword/view/pd_code; negative delta = moved up."""
+    def long(matrix, name):
+        return matrix.rename_axis(columns="pd_code").reset_index().melt(id_vars=KEYS, var_name="pd_code", value_name=name)
+
+    both = long(old_matrix, "old").merge(long(new_matrix, "new"), on=KEYS + ["pd_code"], how="outer")
+    both = both[both["old"].notna() | both["new"].notna()]
+    both["delta"] = both["new"] - both["old"]
+    both["status"] = np.select(
+        [both["old"].isna(), both["new"].isna(), both["delta"] < 0, both["delta"] > 0],
+        ["entered", "dropped", "up", "down"], default="same")
+    return both.sort_values(KEYS + ["pd_code"]).reset_index(drop=True)
+
+
+def sponsored_density(frame: pd.DataFrame, by_keyword: bool = False) -> pd.DataFrame:
+    """Share of promoted/sponsored cards per page number (or per keyword page)."""
+    groups = (KEYS if by_keyword else []) + ["page"]
+    return frame.groupby(groups)["paid"].agg(density="mean", cards="size", paid="sum")
+
+
+def parse_watchlist(text: str) -> Tuple[List[str], List[str]]:
+    """(pd_codes, invalid entries) from a newline/comma separated list of codes or product URLs."""
+    from emag_rank import extract_pd_code
+    codes, invalid = [], []
+    for item in text.replace(",", "\n").splitlines():
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            codes.append(extract_pd_code(item) if "/pd/" in item else item)
+        except ValueError:
+            invalid.append(item)
+    return list(dict.fromkeys(codes)), invalid
@@ -0,0 +1,159 @@
+# Parse/filter/rank benchmark for emag-product-rank-finder
+"""Time the hot path over saved eMAG search pages.
+
+Runs parse_cards, filter_cards, find_target and utils.deduplicate_cards over a
+corpus of saved pages plus synthetic pages scaled up to thousands of cards,
+and writes per-stage timings, throughput and peak memory to JSON so runs can
+be compared across commits:
+
+    python benchmark.py --scales 500,2000 --backend both --out bench_results.json
+"""
+import argparse
+import copy
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from lxml import etree, html as lxml_html
+
+from emag_rank import console, parse_cards, filter_cards, find_target, PARSER_BACKENDS
+from utils import deduplicate_cards
+
+DEFAULT_CORPUS = ["debug_emag_search_page.html"]
+
+
+def make_synthetic_page(html: str, n_cards: int) -> str:
+    """Clone the grid cards of a real page until it holds `n_cards` cards.
+
+    Clones get fresh pd_codes and data-positions so dedup and ranking still
+    see distinct products.
+    """
+    doc = lxml_html.document_fromstring(html)
+    grid = doc.get_element_by_id("card_grid")
+    originals = [el for el in grid.iterchildren() if "card-item" in (el.get("class") or "").split()]
+    if not originals:
+        raise ValueError("Page has no grid cards to clone.")
+    for el in originals:
+        grid.remove(el)
+    for i in range(n_cards):
+        card = copy.deepcopy(originals[i % len(originals)])
+        if i >= len(originals):
+            url = card.get("data-url") or ""
+            marker = "/pd/"
+            start = url.find(marker)
+            if start != -1:
+                end = url.find("/", start + len(marker))
+                code = url[start + len(marker):end]
+                card.set("data-url", f"{url[:start + len(marker)]}{code}X{i}{url[end:]}")
+        card.set("data-position", str(i + 1))
+        grid.append(card)
+    return etree.tostring(doc, encoding="unicode", method="html")
+
+
+def load_corpus(paths: List[str], scales: List[int]) -> List[Tuple[str, str]]:
+    corpus = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        corpus.append((path, html))
+        for n in scales:
+            corpus.append((f"{path}@{n}", make_synthetic_page(html, n)))
+    return corpus
+
+
+def _measure(fn: Callable, rounds: int) -> Dict:
+    fn()  # warm-up, also primes compiled regex / XPath caches
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    seconds = (time.perf_counter() - started) / rounds
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def bench_page(name: str, html: str, backend: str, rounds: int) -> Dict:
+    cards = parse_cards(html, backend=backend)
+    filtered = filter_cards(cards, True, True)
+    # Worst case for find_target: the last organic card
+    target = filtered[-1]["pd_code"] if filtered else "MISSING"
+    stages = {
+        "parse_cards": _measure(lambda: parse_cards(html, backend=backend), rounds),
+        "filter_cards": _measure(lambda: filter_cards(cards, True, True), rounds * 10),
+        "find_target": _measure(lambda: find_target(filtered, target), rounds * 10),
+        "deduplicate_cards": _measure(lambda: deduplicate_cards(cards), rounds * 10),
+    }
+    for stats in stages.values():
+        stats["pages_per_sec"] = 1 / stats["seconds"] if stats["seconds"] else None
+        stats["cards_per_sec"] = len(cards) / stats["seconds"] if stats["seconds"] else None
+    total = sum(stats["seconds"] for stats in stages.values())
+    return {
+        "page": name,
+        "backend": backend,
+        "html_bytes": len(html.encode("utf-8")),
+        "cards": len(cards),
+        "stages": stages,
+        "total_seconds": total,
+        "pages_per_sec": 1 / total if total else None,
+        "cards_per_sec": len(cards) / total if total else None,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse/filter/rank pipeline")
+    parser.add_argument("pages", nargs="*", default=DEFAULT_CORPUS, help="Saved eMAG search pages")
+    parser.add_argument("--scales", default="500,2000", help="Synthetic page sizes in cards, comma separated")
+    parser.add_argument("--backend", choices=PARSER_BACKENDS + ("both",), default="both")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed repetitions per stage")
+    parser.add_argument("--out", default="bench_results.json", help="JSON output file")
+    args = parser.parse_args()
+
+    scales = [int(n) for n in args.scales.split(",") if n.strip()]
+    backends = PARSER_BACKENDS if args.backend == "both" else (args.backend,)
+    corpus = load_corpus(args.pages, scales)
+
+    console.quiet = True  # parse/filter debug prints would dominate the timings
+    results = [bench_page(name, html, backend, args.rounds) for backend in backends for name, html in corpus]
+    console.quiet = False
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "rounds": args.rounds,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    from rich.table import Table
+    table = Table(title=f"Benchmark ({report['commit']})")
+    for col in ("Page", "Backend", "Cards", "parse ms", "filter ms", "find ms", "dedup ms", "pages/s", "cards/s", "parse peak KB"):
+        table.add_column(col)
+    for r in results:
+        st = r["stages"]
+        table.add_row(
+            r["page"], r["backend"], str(r["cards"]),
+            *(f"{st[s]['seconds'] * 1000:.2f}" for s in ("parse_cards", "filter_cards", "find_target", "deduplicate_cards")),
+            f"{r['pages_per_sec']:.1f}", f"{r['cards_per_sec']:.0f}",
+            f"{st['parse_cards']['peak_bytes'] / 1024:.0f}",
+        )
+    console.print(table)
+    console.print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
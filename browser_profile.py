@@ -0,0 +1,119 @@
+# Lean scraping profile for emag-product-rank-finder
+"""Load only what rank detection needs: card markup and badge text.
+
+The lean profile switches Chrome to the `eager` page-load strategy, turns
+images off and blocks static assets and third-party trackers through the
+DevTools protocol (`Network.setBlockedURLs`). Use `page_metrics` to compare
+bytes transferred and Chrome RSS per page, and run this module on a sample
+of keywords to check that badge/promoted detection still matches the full
+profile:
+
+    python browser_profile.py --keywords "core300s, purificator aer" --pages 2
+"""
+import argparse
+from typing import Dict, List, Optional, Sequence
+
+from config import LEAN_BLOCKED_URLS
+
+try:
+    import psutil
+except ImportError:  # RSS reporting is optional
+    psutil = None
+
+PAGE_BYTES_JS = """
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+let bytes = 0;
+for (const e of entries) { bytes += e.transferSize || 0; }
+return {bytes: bytes, requests: entries.length};
+"""
+
+
+def apply_lean_options(chrome_options):
+    """Chrome options for the lean profile; request blocking is applied per driver."""
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+    })
+    return chrome_options
+
+
+def enable_request_blocking(driver, patterns: Optional[Sequence[str]] = None):
+    patterns = list(LEAN_BLOCKED_URLS if patterns is None else patterns)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def chrome_rss_bytes(driver) -> Optional[int]:
+    """Resident memory of chromedriver plus every Chrome process it spawned."""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        procs = [root] + root.children(recursive=True)
+        return sum(p.memory_info().rss for p in procs if p.is_running())
+    except Exception:
+        return None
+
+
+def page_metrics(driver) -> Dict:
+    """Bytes transferred for the current page (Resource Timing) and Chrome RSS.
+
+    Cross-origin entries without Timing-Allow-Origin report 0 bytes, so the
+    byte count is a lower bound; it is still comparable between profiles.
+    """
+    try:
+        metrics = driver.execute_script(PAGE_BYTES_JS)
+    except Exception:
+        metrics = {"bytes": None, "requests": None}
+    metrics["rss_bytes"] = chrome_rss_bytes(driver)
+    return metrics
+
+
+def _card_signature(cards: List[Dict]) -> List[tuple]:
+    return [(c["pd_code"], c["is_promoted"], c["is_sponsored"]) for c in cards]
+
+
+def verify_lean_profile(urls: Sequence[str], headless: bool = True,
+                        blocked_urls: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Fetch each URL with the full and the lean profile and compare detection."""
+    from emag_rank import get_chrome_driver, load_search_page, parse_cards
+    report = []
+    drivers = {
+        "full": get_chrome_driver(headless=headless),
+        "lean": get_chrome_driver(headless=headless, lean=True, blocked_urls=blocked_urls),
+    }
+    try:
+        for url in urls:
+            row = {"url": url}
+            signatures = {}
+            for name, driver in drivers.items():
+                ready = load_search_page(driver, url)
+                cards = parse_cards(driver.page_source)
+                signatures[name] = _card_signature(cards)
+                row[name] = dict(page_metrics(driver), ready_sec=round(ready["seconds"], 2), cards=len(cards))
+            row["match"] = signatures["full"] == signatures["lean"]
+            report.append(row)
+    finally:
+        for driver in drivers.values():
+            driver.quit()
+    return report
+
+
+if __name__ == "__main__":
+    from emag_rank import build_search_url, console
+    parser = argparse.ArgumentParser(description="Check lean-profile badge detection against the full profile")
+    parser.add_argument("--keywords", required=True, help="Comma separated sample keywords")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per keyword")
+    parser.add_argument("--visible", action="store_true", help="Run Chrome with a window")
+    args = parser.parse_args()
+    sample = [build_search_url(kw.strip(), page) for kw in args.keywords.split(",") if kw.strip()
+              for page in range(1, args.pages + 1)]
+    rows = verify_lean_profile(sample, headless=not args.visible)
+    for row in rows:
+        console.print(f"{'[green]OK' if row['match'] else '[red]MISMATCH'}[/] {row['url']}")
+        for name in ("full", "lean"):
+            console.print(f"    {name}: {row[name]}")
+    mismatches = sum(not row["match"] for row in rows)
+    console.print(f"{len(rows) - mismatches}/{len(rows)} pages match")
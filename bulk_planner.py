@@ -0,0 +1,100 @@
+# Bulk analysis planner for emag-product-rank-finder
+"""Group bulk CSV rows so each keyword page is fetched once for every product on it.
+
+The naive bulk loop walks the CSV row by row, so ten products tracked for
+the same keyword fetch the same search pages ten times. `plan_bulk` groups
+all rows by (canonical keyword, view); `scan_group` then fetches each page of
+a group once, checks every card against the group's set of target pd_codes
+and stops as soon as all targets are found or the page cap is reached.
+"""
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from emag_rank import extract_pd_code, filter_cards
+from utils import normalize_keyword
+
+
+def split_keywords(value) -> List[str]:
+    return [kw.strip() for kw in str(value).replace("\n", ",").split(",") if kw.strip()]
+
+
+def plan_bulk(batch_df, views: List[str]) -> List[Dict]:
+    """One group per (canonical keyword, view) with all of its target pd_codes."""
+    groups: Dict[tuple, Dict] = {}
+    for idx, row in batch_df.iterrows():
+        product_url = row.get('Product URL', '') or row.get('ProductURL', '')
+        keywords = row.get('Keyword', '') or row.get('Keywords', '')
+        if pd.isna(product_url) or pd.isna(keywords) or not product_url or not keywords:
+            continue
+        pd_code = extract_pd_code(product_url)
+        for keyword in split_keywords(keywords):
+            for view in views:
+                key = (normalize_keyword(keyword), view)
+                group = groups.setdefault(key, {
+                    "keyword": keyword,
+                    "view": view,
+                    "targets": {},
+                    "instances": 0,
+                    # resumable scan state
+                    "page": 1,
+                    "rank_global": 0,
+                    "pages_fetched": 0,
+                    "matches": [],
+                })
+                group["targets"].setdefault(pd_code, []).append({"row": idx + 1, "product_url": product_url})
+                group["instances"] += 1
+    return list(groups.values())
+
+
+def scan_group(group: Dict, fetch_cards: Callable[[str, int, str], List[Dict]], pages: int, cap: int,
+               strict_grid: bool, ignore_sponsored: bool, pause: Optional[Callable[[], None]] = None) -> Dict:
+    """Fetch the group's pages in order until every target is found, the cap, or an empty page.
+
+    The group dict is advanced page by page, so an exception (e.g. a CAPTCHA)
+    leaves it ready to resume from the failing page.
+    """
+    targets = group["targets"]
+    found = {m["pd_code"] for m in group["matches"]}
+    last_page = pages if pages > 0 else cap
+    while group["page"] <= last_page and len(found) < len(targets):
+        page = group["page"]
+        cards = fetch_cards(group["keyword"], page, group["view"])
+        group["pages_fetched"] += 1
+        filtered = filter_cards(cards, strict_grid, ignore_sponsored)
+        for position, card in enumerate(filtered, start=1):
+            if card["pd_code"] in targets:
+                found.add(card["pd_code"])
+                group["matches"].append({
+                    "pd_code": card["pd_code"],
+                    "page": page,
+                    "position_on_page": position,
+                    "rank_global": group["rank_global"] + position,
+                    "filtered_count": len(filtered),
+                    "card": card,
+                })
+        group["rank_global"] += len(filtered)
+        group["page"] += 1
+        if not cards:
+            break
+        if pause and len(found) < len(targets) and group["page"] <= last_page:
+            pause()
+    return group
+
+
+def savings_report(groups: List[Dict]) -> Dict:
+    """Fetches made vs. the row-by-row plan.
+
+    Each row would have fetched at least the pages its group fetched (the
+    naive loop never stops early on a match), so `naive_fetches` and
+    `fetches_saved` are lower bounds.
+    """
+    fetched = sum(g["pages_fetched"] for g in groups)
+    naive = sum(g["instances"] * g["pages_fetched"] for g in groups)
+    return {
+        "groups": len(groups),
+        "row_keyword_views": sum(g["instances"] for g in groups),
+        "fetches": fetched,
+        "naive_fetches": naive,
+        "fetches_saved": naive - fetched,
+    }
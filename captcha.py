@@ -0,0 +1,137 @@
+# CAPTCHA / block-page detection and retry quarantine for emag-product-rank-finder
+import random
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from fetcher import has_card_payload
+
+# Markers of challenge and block pages. Plain "captcha" is not enough: every
+# normal eMAG page ships feature flags such as "captcha_enabled".
+CHALLENGE_RE = re.compile(
+    r"g-recaptcha|h-captcha|px-captcha|cf-chl|challenge-form|challenge-platform|captcha-container"
+    r"|/captcha/|_Incapsula_Resource|Access Denied|Request unsuccessful"
+    r"|not a robot|nu sunt robot|verificare de securitate|security check",
+    re.I,
+)
+_TITLE_RE = re.compile(r"<title[^>]*>([^<]*)</title>", re.I)
+_TITLE_CHALLENGE_RE = re.compile(r"captcha|robot|security|securitate|access denied|blocked|verific", re.I)
+
+CHALLENGE_PROBE_JS = """
+const selectors = 'iframe[src*="captcha"], iframe[src*="challenge"], #px-captcha, .g-recaptcha, '
+  + '.h-captcha, #challenge-form, form[action*="captcha"]';
+const hit = document.querySelector(selectors);
+return {
+  title: document.title || '',
+  hasGrid: !!document.querySelector('div#card_grid .card-item, div.card-item a[href*="/pd/"]'),
+  marker: hit ? (hit.id || hit.className || hit.tagName) : null,
+  text: document.body ? document.body.innerText.slice(0, 2000) : '',
+};
+"""
+
+
+class ChallengeDetected(RuntimeError):
+    """A page was served as a CAPTCHA or block page instead of search results."""
+
+    def __init__(self, url: str, reason: str):
+        super().__init__(f"Challenge on {url}: {reason}")
+        self.url = url
+        self.reason = reason
+        self.page = None  # filled in by callers that know the page number
+
+
+def detect_challenge(html: Optional[str]) -> Optional[str]:
+    """Reason string when `html` looks like a challenge/block page, else None."""
+    if not html:
+        return "empty response"
+    if has_card_payload(html):
+        return None
+    title = _TITLE_RE.search(html)
+    if title and _TITLE_CHALLENGE_RE.search(title.group(1)):
+        return f"title: {title.group(1).strip()[:80]}"
+    match = CHALLENGE_RE.search(html)
+    if match:
+        return f"marker: {match.group(0)}"
+    return None
+
+
+def detect_challenge_in_driver(driver) -> Optional[str]:
+    """Same check against the live page, without pulling page_source."""
+    probe = driver.execute_script(CHALLENGE_PROBE_JS)
+    if probe["hasGrid"]:
+        return None
+    if probe["marker"]:
+        return f"element: {probe['marker']}"
+    if _TITLE_CHALLENGE_RE.search(probe["title"]):
+        return f"title: {probe['title'][:80]}"
+    match = CHALLENGE_RE.search(probe["text"])
+    if match:
+        return f"text: {match.group(0)}"
+    return None
+
+
+def wait_for_manual_solve(driver, reason: str, timeout: float, poll: float = 2.0,
+                          notify: Callable[[str], None] = print) -> bool:
+    """Interactive mode: let a human solve the challenge in the visible browser."""
+    notify(f"CAPTCHA detected ({reason}). Solve it in the browser window; waiting up to {timeout:.0f}s...")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        try:
+            if detect_challenge_in_driver(driver) is None:
+                return True
+        except Exception:
+            return False
+    return False
+
+
+class QuarantineQueue:
+    """Challenged work units, retried later with exponential backoff and jitter.
+
+    Items are opaque to the queue; `drain` hands each one back to a handler,
+    which is expected to run it on a fresh browser session.
+    """
+
+    def __init__(self, base_delay: float = 60.0, max_delay: float = 900.0, max_attempts: int = 4):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._entries: List[Dict] = []
+        self.failed: List[Dict] = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, item, reason: str, attempts: int = 0):
+        attempts += 1
+        if attempts > self.max_attempts:
+            self.failed.append({"item": item, "reason": reason, "attempts": attempts - 1})
+            return
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        self._entries.append({"item": item, "reason": reason, "attempts": attempts,
+                              "due": time.monotonic() + delay})
+
+    def next_wait(self) -> Optional[float]:
+        if not self._entries:
+            return None
+        return max(0.0, min(e["due"] for e in self._entries) - time.monotonic())
+
+    def pop_due(self) -> List[Dict]:
+        now = time.monotonic()
+        due = [e for e in self._entries if e["due"] <= now]
+        self._entries = [e for e in self._entries if e["due"] > now]
+        return due
+
+    def drain(self, handler: Callable, notify: Callable[[str], None] = print,
+              sleep: Callable[[float], None] = time.sleep):
+        """Retry every entry until it succeeds or runs out of attempts."""
+        while self._entries:
+            wait = self.next_wait()
+            if wait:
+                notify(f"{len(self._entries)} quarantined unit(s); next retry in {wait:.0f}s")
+                sleep(wait)
+            for entry in self.pop_due():
+                try:
+                    handler(entry["item"])
+                except ChallengeDetected as e:
+                    self.add(entry["item"], e.reason, entry["attempts"])
@@ -6,3 +6,101 @@ DEFAULT_COLUMNS = [
     "Title", "Result URL", "Page URL", "Promoted", "Sponsored", "Product Code"
 ]
 HISTORY_FILE = "keyword_history.json"
+
+# Browser pool
+DRIVER_POOL_SIZE = 1
+DRIVER_MAX_PAGES = 40
+
+# Search-page cache
+CACHE_DIR = ".emag_cache"
+CACHE_TTL_SEC = 6 * 3600
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Page readiness
+READY_TIMEOUT_SEC = 15.0
+
+# Lean browser profile: URL patterns blocked via Network.setBlockedURLs
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*googleadservices.com*", "*facebook.net*",
+    "*facebook.com/tr*", "*hotjar.com*", "*criteo.*", "*tiktok.com*",
+    "*clarity.ms*", "*bing.com*", "*scorecardresearch.com*",
+]
+
+# Concurrent crawl politeness budget (per host)
+CRAWL_RATE_PER_SEC = 0.25
+CRAWL_BURST = 1
+CRAWL_MAX_IN_FLIGHT = 2
+
+# Rank history store (SQLite) and warm-start page counts
+RANK_DB_FILE = "rank_history.sqlite3"
+RANK_DB_BATCH_SIZE = 200
+PAGE_COUNT_TTL_SEC = 3600
+
+# Streaming sink checkpoint (--resume)
+CHECKPOINT_FILE = ".emag_checkpoint.jsonl"
+
+# Worker fleet (fleet.py)
+FLEET_BROKER_FILE = "fleet_broker.sqlite3"
+FLEET_LEASE_SEC = 120.0
+FLEET_POLL_SEC = 1.0
+FLEET_MAX_ATTEMPTS = 4
+FLEET_WORKER_WAIT_SEC = 300.0
+
+# Fetch -> parse -> rank pipeline (--pipeline)
+PIPELINE_PARSE_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 4
+
+# Full-SERP snapshots (snapshot.py)
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_ROW_GROUP = 50_000
+
+# Timing spans (profiler.py): histogram bucket bounds in seconds
+PROFILE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent spans kept per keyword and phase for p50/p95 (count/total/max/buckets cover every span)
+PROFILE_SAMPLE_SIZE = 512
+
+# Background jobs in the Streamlit app (jobs.py)
+JOBS_KEEP_FINISHED = 20
+JOBS_POLL_SEC = 2.0
+
+# Rank API (rank_api.py); EMAG_BASE_URL can point at a local stand-in for eMAG
+EMAG_BASE_URL = "https://www.emag.ro"
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_PAGE_TTL_SEC = 600
+API_CACHE_MAX_PAGES = 2000
+API_DEFAULT_PAGES = 5
+API_MAX_UPSTREAM_FETCHES = 2
+API_REQUEST_TIMEOUT_SEC = 90
+
+# Adaptive pacing (pacing.py): AIMD delay between pages and the run-wide circuit breaker
+PACING_MIN_DELAY_SEC = 1.0
+PACING_MAX_DELAY_SEC = 60.0
+PACING_STEP_SEC = 0.5
+PACING_BACKOFF = 2.0
+PACING_SLOW_PAGE_SEC = 12.0
+PACING_JITTER = 0.25
+BREAKER_FAILURES = 4
+BREAKER_COOLDOWN_SEC = 120.0
+BREAKER_MAX_COOLDOWN_SEC = 1800.0
+BREAKER_MAX_TRIPS = 3
+PACING_INITIAL_DELAY_SEC = 8.0
+
+# Proxy pool (proxy_pool.py): per-proxy limits, rolling health window and eviction
+PROXY_MAX_CONCURRENCY = 2
+PROXY_MIN_INTERVAL_SEC = 3.0
+PROXY_WINDOW = 20
+PROXY_MIN_SAMPLES = 5
+PROXY_EVICT_SCORE = 0.5
+PROXY_EVICT_SEC = 300.0
+PROXY_MAX_EVICT_SEC = 3600.0
+PROXY_TARGET_LATENCY_SEC = 4.0
+
+# Browser session store (session_store.py): cookies/localStorage per user agent + proxy
+SESSION_DIR = ".emag_sessions"
+SESSION_MAX_AGE_SEC = 12 * 3600
+SESSION_SAVE_EVERY_PAGES = 5
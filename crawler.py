@@ -0,0 +1,201 @@
+# Asyncio crawl scheduler for emag-product-rank-finder
+"""Run keyword × page × view fetches concurrently under a per-host politeness budget.
+
+Every request to a host first takes a token from that host's token bucket
+(`rate` requests/second, `burst` tokens) and a slot from its max-in-flight
+semaphore, so wall-clock time scales with the allowed request rate instead
+of being the sum of fixed sleeps. Pages of one keyword are fetched at most
+`max_in_flight` pages ahead of the page being ranked and ranked strictly in
+page order, so `rank_global` is exact even though pages complete out of
+order, and a keyword stops requesting pages once its target is found.
+A page that fails (challenge or any other error) ends only its own keyword;
+the failure is recorded in that keyword's outcome.
+
+Page fetching itself stays synchronous (requests / Selenium) and runs in
+worker threads; `fetch_cards(keyword, page, view)` is injectable so the
+scheduler can be pointed at a local stand-in server.
+"""
+import asyncio
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from captcha import ChallengeDetected
+from config import CRAWL_RATE_PER_SEC, CRAWL_BURST, CRAWL_MAX_IN_FLIGHT
+from emag_rank import build_search_url, filter_cards
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostBudget:
+    def __init__(self, rate: float, burst: int, max_in_flight: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+
+class CrawlScheduler:
+    def __init__(self, fetch_cards: Callable[[str, int, str], List[Dict]],
+                 rate: float = CRAWL_RATE_PER_SEC, burst: int = CRAWL_BURST,
+                 max_in_flight: int = CRAWL_MAX_IN_FLIGHT,
+                 url_builder: Callable[..., str] = build_search_url,
+                 on_page: Optional[Callable[[str, str, int, int, List[Dict]], None]] = None):
+        self.fetch_cards = fetch_cards
+        self.on_page = on_page
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max(1, max_in_flight)
+        self.url_builder = url_builder
+        self._hosts: Dict[str, HostBudget] = {}
+        self.requests = 0
+        self.wall_seconds = 0.0
+
+    def _budget(self, url: str) -> HostBudget:
+        host = urllib.parse.urlsplit(url).hostname or ""
+        if host not in self._hosts:
+            self._hosts[host] = HostBudget(self.rate, self.burst, self.max_in_flight)
+        return self._hosts[host]
+
+    async def _page(self, keyword: str, page: int, view: str) -> List[Dict]:
+        budget = self._budget(self.url_builder(keyword, page, ref=view))
+        await budget.slots.acquire()
+        try:
+            await budget.bucket.acquire()
+        except BaseException:
+            budget.slots.release()
+            raise
+        budget.in_flight += 1
+        budget.peak_in_flight = max(budget.peak_in_flight, budget.in_flight)
+        self.requests += 1
+
+        def finished(future: asyncio.Future):
+            budget.in_flight -= 1
+            budget.slots.release()
+            if not future.cancelled():
+                future.exception()  # retrieved here when the page was cancelled meanwhile
+
+        # A worker thread cannot be interrupted: cancelling the page leaves it
+        # running, so its slot is only given back when the thread returns.
+        fetch = asyncio.ensure_future(asyncio.to_thread(self.fetch_cards, keyword, page, view))
+        fetch.add_done_callback(finished)
+        return await asyncio.shield(fetch)
+
+    async def crawl_keyword(self, keyword: str, view: str, target_pd_code: str, pages: int, cap: int,
+                            strict_grid: bool, ignore_sponsored: bool, stop_on_match: bool = True,
+                            start_page: int = 1, start_rank: int = 0) -> Dict:
+        """Rank one keyword/view; pages are fetched ahead in parallel and ranked in order.
+
+        At most `max_in_flight` pages are queued ahead of the page being
+        ranked, whether or not `pages` is fixed, so a match on page 1 stops
+        the keyword after a handful of requests. Pages still queued when it
+        stops are cancelled. A challenge ends the keyword with
+        outcome["challenged"], any other fetch error with outcome["error"]
+        (page, rank_global, reason). `on_page(keyword, view, page, rank_global,
+        matches)` is called as each page is ranked, with the running rank
+        after that page.
+        """
+        last_page = pages if pages > 0 else cap
+        outcome = {"keyword": keyword, "view": view, "matches": [], "pages_fetched": 0, "challenged": None,
+                   "error": None}
+        rank_global = start_rank
+        pending: Dict[int, asyncio.Task] = {}
+        queued = start_page - 1
+
+        def fetched(task: asyncio.Task):
+            if not task.cancelled():
+                outcome["pages_fetched"] += 1
+
+        try:
+            for page in range(start_page, last_page + 1):
+                # Keep the window full ahead of the ranked page, like RankPipeline.feed
+                upto = min(last_page, page + self.max_in_flight - 1)
+                for p in range(queued + 1, upto + 1):
+                    pending[p] = asyncio.create_task(self._page(keyword, p, view))
+                    pending[p].add_done_callback(fetched)
+                queued = max(queued, upto)
+                try:
+                    cards = await pending.pop(page)
+                except ChallengeDetected as e:
+                    outcome["challenged"] = {"page": page, "rank_global": rank_global, "reason": e.reason}
+                    return outcome
+                except Exception as e:
+                    outcome["error"] = {"page": page, "rank_global": rank_global, "reason": f"{type(e).__name__}: {e}"}
+                    return outcome
+                filtered = filter_cards(cards, strict_grid, ignore_sponsored)
+                page_matches = []
+                for position, card in enumerate(filtered, start=1):
+                    if card["pd_code"] != target_pd_code:
+                        continue
+                    page_matches.append({
+                        "page": page,
+                        "position_on_page": position,
+                        "rank_global": rank_global + position,
+                        "card": card,
+                        "page_url": self.url_builder(keyword, page, ref=view),
+                        "excluded_count": len([c for c in cards if c["is_promoted"] or c["is_sponsored"]]),
+                    })
+                    if stop_on_match:
+                        break
+                outcome["matches"].extend(page_matches)
+                rank_global += len(filtered)
+                if self.on_page:
+                    self.on_page(keyword, view, page, rank_global, page_matches)
+                if page_matches and stop_on_match:
+                    return outcome
+                if not cards:
+                    return outcome
+            return outcome
+        finally:
+            for task in pending.values():
+                task.cancel()
+            # Cancelled pages waiting on the bucket leave it now; running fetches keep their slot until done
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+
+    async def crawl(self, tasks: Sequence[Tuple], target_pd_code: str, pages: int, cap: int,
+                    strict_grid: bool, ignore_sponsored: bool, stop_on_match: bool = True) -> List[Dict]:
+        started = time.monotonic()
+        try:
+            return await asyncio.gather(*(
+                self.crawl_keyword(*task[:2], target_pd_code, pages, cap, strict_grid, ignore_sponsored, stop_on_match,
+                                   *task[2:])
+                for task in tasks
+            ))
+        finally:
+            self.wall_seconds += time.monotonic() - started
+
+    def run(self, tasks: Sequence[Tuple], target_pd_code: str, pages: int, cap: int,
+            strict_grid: bool, ignore_sponsored: bool, stop_on_match: bool = True) -> List[Dict]:
+        """Blocking entry point; `tasks` holds (keyword, view[, start_page, start_rank]) tuples."""
+        self._hosts = {}  # semaphores and locks are bound to the running loop
+        return asyncio.run(self.crawl(tasks, target_pd_code, pages, cap, strict_grid, ignore_sponsored, stop_on_match))
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "wall_seconds": round(self.wall_seconds, 2),
+            "requests_per_sec": round(self.requests / self.wall_seconds, 3) if self.wall_seconds else None,
+            "peak_in_flight": {host: b.peak_in_flight for host, b in self._hosts.items()},
+        }
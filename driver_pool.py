@@ -0,0 +1,143 @@
+# Persistent Chrome driver pool for emag-product-rank-finder
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Set, Tuple
+
+
+class PooledDriver:
+    """A live driver plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver, key=None):
+        self.driver = driver
+        self.key = key
+        self.pages = 0
+        self.created_at = time.monotonic()
+
+
+class DriverPool:
+    """Keep up to `size` browsers alive and hand them out one page at a time.
+
+    Drivers are started lazily, health-checked before every lease and
+    recycled after `max_pages` pages or whenever the caller's block raises.
+    A lease can ask for a `key` (the proxy a browser was launched with): an
+    idle driver with that key is reused, otherwise a new one is started with
+    `factory(key)`, replacing an idle driver with another key if the pool is full.
+    """
+
+    def __init__(self, factory: Callable, size: int = 1, max_pages: int = 40):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.max_pages = max(1, int(max_pages))
+        self._idle: List[PooledDriver] = []  # most recently used last
+        # Guards _idle/_live; notified whenever a driver goes idle or a slot frees up
+        self._cond = threading.Condition()
+        self._live = 0
+        self._closed = False
+        self.launched = 0
+        self.recycled = 0
+
+    def _start(self, key=None) -> PooledDriver:
+        handle = PooledDriver(self.factory(key) if key is not None else self.factory(), key)
+        with self._cond:
+            self.launched += 1
+        return handle
+
+    def _discard(self, handle: PooledDriver):
+        try:
+            handle.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self._live -= 1
+            self.recycled += 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def is_healthy(handle: PooledDriver) -> bool:
+        try:
+            handle.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def idle_keys(self) -> Set:
+        """Keys (proxies) of the drivers waiting idle right now."""
+        with self._cond:
+            return {handle.key for handle in self._idle}
+
+    def _take(self, key) -> Tuple[Optional[PooledDriver], bool]:
+        """(handle, reusable) under the lock: an idle driver with `key`, a free slot, or an idle driver to replace."""
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].key == key:
+                return self._idle.pop(i), True
+        if self._live < self.size:
+            self._live += 1
+            return None, True
+        if self._idle:
+            # Launched on another proxy; make room for a browser on the requested one
+            return self._idle.pop(0), False
+        return None, False
+
+    def acquire(self, timeout: Optional[float] = None, key=None) -> PooledDriver:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is shut down.")
+                    handle, reusable = self._take(key)
+                    if handle is not None or reusable:
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No browser became available in the driver pool.")
+                    self._cond.wait(remaining)
+            if handle is None:
+                try:
+                    return self._start(key)
+                except Exception:
+                    with self._cond:
+                        self._live -= 1
+                        self._cond.notify_all()
+                    raise
+            if reusable and self.is_healthy(handle):
+                return handle
+            self._discard(handle)
+
+    def release(self, handle: PooledDriver, broken: bool = False):
+        handle.pages += 1
+        if broken or self._closed or handle.pages >= self.max_pages:
+            self._discard(handle)
+            return
+        with self._cond:
+            self._idle.append(handle)
+            self._cond.notify_all()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None, key=None):
+        """Lease a driver for one page; a crash inside the block recycles it."""
+        handle = self.acquire(timeout=timeout, key=key)
+        try:
+            yield handle.driver
+        except BaseException:
+            self.release(handle, broken=True)
+            raise
+        self.release(handle)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            handles, self._idle = self._idle, []
+            self._cond.notify_all()
+        for handle in handles:
+            self._discard(handle)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "live": self._live,
+            "idle": len(self._idle),
+            "launched": self.launched,
+            "recycled": self.recycled,
+        }
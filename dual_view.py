@@ -0,0 +1,187 @@
+# Single-navigation grid + list capture for emag-product-rank-finder
+"""Capture both listing views of a search page from one browser navigation.
+
+eMAG renders grid and list from the same results, and the
+`listing-view-type-change` toggle swaps them in place. Instead of loading
+every page twice, `fetch_dual_view_cards` loads it once in grid view and
+takes the cards, then clicks the list toggle on the same driver, waits for
+the DOM to settle again and takes the list cards.
+
+`DualViewPages` sits in front of it for callers that scan grid and list as
+separate keyword/view streams. The first view asked for a (keyword, page)
+does the navigation, the other view is served from memory and then dropped,
+and concurrent requests for the same page wait for the one navigation.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from captcha import ChallengeDetected, detect_challenge_in_driver
+from config import READY_TIMEOUT_SEC
+from driver_pool import DriverPool
+from emag_rank import (build_search_url, console, get_driver_pool, get_page_cache, get_session_store, load_search_page,
+                       parse_cards)
+from fetcher import has_card_payload
+from js_extract import extract_cards
+from profiler import span
+from readiness import wait_until_ready
+
+VIEWS = ("grid", "list")
+VIEW_TOGGLE_SELECTOR = "button.listing-view-type-change[data-type='{}'][data-target='card_grid']"
+VIEW_TYPES = {"grid": "2", "list": "1"}
+
+
+def switch_listing_view(driver, view: str, timeout: float = READY_TIMEOUT_SEC, poll: float = 0.15) -> bool:
+    """Click the grid/list toggle in place and wait for it to turn active.
+
+    False if the page has no toggle. Raises TimeoutException when the toggle
+    is still not active after `timeout`, so the page is fetched again instead
+    of reporting the grid cards as the other view.
+    """
+    try:
+        button = driver.find_element(By.CSS_SELECTOR, VIEW_TOGGLE_SELECTOR.format(VIEW_TYPES[view]))
+    except WebDriverException:
+        return False
+    if "active" in (button.get_attribute("class") or ""):
+        return True
+    button.click()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if "active" in (button.get_attribute("class") or ""):
+                return True
+        except WebDriverException:
+            # The toolbar was re-rendered with the new view
+            return True
+        time.sleep(poll)
+    raise TimeoutException(f"The {view} view toggle did not turn active within {timeout:.0f}s")
+
+
+def driver_cards(driver, extract: str = "html") -> Tuple[List[Dict], Optional[str]]:
+    """Cards of the page as currently rendered, plus its HTML when it was serialized."""
+    if extract == "js":
+        try:
+            with span("js_extract"):
+                cards = extract_cards(driver)
+        except WebDriverException:
+            cards = None
+        if cards is not None:
+            return cards, None
+    with span("page_source"):
+        html = driver.page_source
+    return parse_cards(html), html
+
+
+def fetch_dual_view_cards(keyword: str, page: int, delay_sec: float = 2.0, headless: bool = True,
+                          pool: Optional[DriverPool] = None, extract: str = "html",
+                          proxy: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """{"grid": cards, "list": cards} for one search page, from a single navigation.
+
+    Without a view toggle on a non-empty page only "grid" is returned (and
+    cached); the list view then needs its own fetch.
+    """
+    if pool is None:
+        pool = get_driver_pool(headless=headless)
+    url = build_search_url(keyword, page, ref="grid")
+    timeout = max(READY_TIMEOUT_SEC, delay_sec)
+    views: Dict[str, List[Dict]] = {}
+    html: Dict[str, Optional[str]] = {}
+    with pool.driver(key=proxy) as driver:
+        load_search_page(driver, url, delay_sec=delay_sec, force_grid=True)
+        views["grid"], html["grid"] = driver_cards(driver, extract)
+        # An empty results page has no toggle and nothing to re-rank
+        with span("view_toggle"):
+            switched = bool(views["grid"]) and switch_listing_view(driver, "list", timeout=timeout)
+        if not views["grid"]:
+            # Empty results are empty in both views
+            views["list"], html["list"] = [], html["grid"]
+        elif switched:
+            driver.execute_script("window.scrollTo(0, 0);")
+            with span("ready_wait"):
+                ready = wait_until_ready(driver, timeout=timeout)
+            reason = detect_challenge_in_driver(driver)
+            if reason:
+                store = get_session_store()
+                if store is not None:
+                    store.retire(driver)
+                raise ChallengeDetected(url, reason)
+            console.print(f"[debug] List view ready in {ready['seconds']:.2f}s ({ready['cards']} cards, same navigation)")
+            views["list"], html["list"] = driver_cards(driver, extract)
+    # Later single-view runs of the same page can be served from the page cache
+    cache = get_page_cache()
+    if cache is not None:
+        for view in views:
+            if has_card_payload(html[view]):
+                cache.put(keyword, page, view, html[view])
+    return views
+
+
+class DualViewPages:
+    """Hands out each view of a dual-captured page once, navigating once per (keyword, page).
+
+    A view the dual capture could not produce (no toggle on the page) comes
+    from `fetch_one(keyword, page, view)` instead, and so does any later
+    request for that page.
+    """
+
+    def __init__(self, fetch_both: Callable[[str, int], Dict[str, List[Dict]]],
+                 fetch_one: Callable[[str, int, str], List[Dict]]):
+        self.fetch_both = fetch_both
+        self.fetch_one = fetch_one
+        self._pages: Dict[Tuple[str, int], Dict] = {}
+        self._single_view: Set[Tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self.navigations = 0
+        self.served_from_memory = 0
+
+    def cards(self, keyword: str, page: int, view: str) -> List[Dict]:
+        key = (keyword, page)
+        while True:
+            with self._lock:
+                entry = self._pages.get(key)
+                if entry is not None and entry["ready"].is_set() and view not in entry["views"]:
+                    # This view was already handed out (e.g. a retried scan); navigate again
+                    del self._pages[key]
+                    entry = None
+                single = entry is None and key in self._single_view
+                owner = entry is None and not single
+                if owner:
+                    entry = self._pages[key] = {"ready": threading.Event(), "views": {}, "error": None}
+            if single:
+                return self.fetch_one(keyword, page, view)
+            if owner:
+                try:
+                    entry["views"] = dict(self.fetch_both(keyword, page))
+                    if set(entry["views"]) != set(VIEWS):
+                        with self._lock:
+                            self._single_view.add(key)
+                except BaseException as e:
+                    entry["error"] = e
+                    with self._lock:
+                        self._pages.pop(key, None)
+                    raise
+                finally:
+                    entry["ready"].set()
+                with self._lock:
+                    self.navigations += 1
+            else:
+                entry["ready"].wait()
+                if entry["error"] is not None:
+                    raise entry["error"]
+            with self._lock:
+                if view not in entry["views"]:
+                    continue
+                cards = entry["views"].pop(view)
+                if not owner:
+                    self.served_from_memory += 1
+                if not entry["views"] and self._pages.get(key) is entry:
+                    del self._pages[key]
+            return cards
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"navigations": self.navigations, "served_from_memory": self.served_from_memory,
+                    "pending_pages": len(self._pages)}
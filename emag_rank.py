@@ -10,20 +10,21 @@ Exemple de rulare:
 """
 
 import argparse
-import csv
 import random
 import re
 import time
 import re
 import unicodedata
 import urllib.parse
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 
 # Selenium imports
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import WebDriverException
 
 import requests
@@ -31,12 +32,34 @@ from bs4 import BeautifulSoup
 from rich.console import Console
 from rich.progress import Progress
 
+import atexit
 import os
+import threading
+
+from config import DRIVER_POOL_SIZE, DRIVER_MAX_PAGES, CACHE_DIR, CACHE_TTL_SEC, READY_TIMEOUT_SEC, LEAN_BLOCKED_URLS
+from config import CRAWL_RATE_PER_SEC, CRAWL_BURST, RANK_DB_FILE, CHECKPOINT_FILE, PIPELINE_PARSE_WORKERS, PIPELINE_QUEUE_SIZE
+from config import EMAG_BASE_URL, PACING_INITIAL_DELAY_SEC, PACING_MIN_DELAY_SEC, PACING_MAX_DELAY_SEC
+from config import PROXY_MAX_CONCURRENCY, PROXY_MIN_INTERVAL_SEC, SESSION_DIR
+from driver_pool import DriverPool
+from fetcher import TieredFetcher, has_card_payload
+from page_cache import PageCache
+from js_extract import extract_cards
+from readiness import wait_until_ready
+from browser_profile import apply_lean_options, enable_request_blocking, page_metrics
+from captcha import ChallengeDetected, QuarantineQueue, detect_challenge_in_driver, wait_for_manual_solve
+from sink import Checkpoint, CheckpointMismatch, ResultSink, get_margin
+from profiler import get_profiler, keyword_scope, span
+from pacing import CircuitBreaker, CircuitOpen, Pacer
+from proxy_pool import ProxyPool, load_proxies, proxy_label
+from session_store import SessionStore
 
 console = Console()
 
 # Constants
-BASE_SEARCH_URL = "https://www.emag.ro/search/{kw_urlencoded}?ref=effective_search"
+BASE_SEARCH_URL = "{base_url}/search/{kw_urlencoded}?ref={ref}"
+# Overridable (EMAG_BASE_URL env var or configure_base_url) to run against a local stand-in
+_base_url = os.environ.get("EMAG_BASE_URL", EMAG_BASE_URL).rstrip("/")
+DEFAULT_VIEW = "effective_search"
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -58,8 +81,10 @@ HEADERS = {
 }
 
 # Selenium helper
-def get_chrome_driver(headless=True):
+def get_chrome_driver(headless=True, lean=False, blocked_urls=None, proxy=None):
     chrome_options = Options()
+    if lean:
+        apply_lean_options(chrome_options)
     if headless:
         chrome_options.add_argument('--headless')
         chrome_options.add_argument('--disable-gpu')
@@ -67,68 +92,181 @@ def get_chrome_driver(headless=True):
     chrome_options.add_argument('--disable-dev-shm-usage')
     chrome_options.add_argument('--window-size=1920,1080')
     chrome_options.add_argument('--lang=ro')
-    chrome_options.add_argument('--user-agent=' + random.choice(USER_AGENTS))
+    store = _session_store
+    identity = store.checkout(proxy, USER_AGENTS) if store is not None else None
+    chrome_options.add_argument('--user-agent=' + (identity.user_agent if identity else random.choice(USER_AGENTS)))
+    if proxy:
+        # Chrome takes no credentials here; browser-tier proxies must be IP-allowlisted
+        chrome_options.add_argument('--proxy-server=' + proxy_label(proxy))
     # Use local ChromeDriver if available
     driver_path = os.environ.get('CHROMEDRIVER_PATH', 'chromedriver.exe')
-    try:
-        driver = webdriver.Chrome(executable_path=driver_path, options=chrome_options)
-    except TypeError:
-        # For Selenium 4+, executable_path is deprecated, fallback to default
-        driver = webdriver.Chrome(options=chrome_options)
-    except WebDriverException:
-        driver = webdriver.Chrome(options=chrome_options)
+    with span("driver_start"):
+        try:
+            driver = webdriver.Chrome(executable_path=driver_path, options=chrome_options)
+        except TypeError:
+            # For Selenium 4+, executable_path is deprecated, fallback to default
+            driver = webdriver.Chrome(options=chrome_options)
+        except WebDriverException:
+            driver = webdriver.Chrome(options=chrome_options)
+    if lean:
+        enable_request_blocking(driver, blocked_urls)
+    if identity is not None:
+        try:
+            if store.restore(driver, identity):
+                console.print(f"[debug] Restored warm browser session {identity.key[:8]}")
+        except WebDriverException as e:
+            console.print(f"[yellow]Could not restore browser session ({e.__class__.__name__}); starting cold")
     return driver
 
-def fetch_html_selenium(url: str, delay_sec: float = 2.0, force_grid: bool = False, headless: bool = True) -> str:
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
+# Cookies/localStorage per (user agent, proxy), shared by every browser and worker (None = disabled)
+_session_store: Optional[SessionStore] = None
+
+def configure_session_store(enabled: bool = True, root: str = SESSION_DIR) -> Optional[SessionStore]:
+    global _session_store
+    _session_store = SessionStore(root=root) if enabled else None
+    return _session_store
+
+def get_session_store() -> Optional[SessionStore]:
+    return _session_store
+
+# Long-lived browsers, one pool per headless/visible mode
+_driver_pools: Dict[bool, DriverPool] = {}
+_pool_signatures: Dict[bool, tuple] = {}
+_driver_pools_lock = threading.Lock()
+_pool_settings = {"size": DRIVER_POOL_SIZE, "max_pages": DRIVER_MAX_PAGES, "lean": False, "blocked_urls": None}
+
+def configure_driver_pool(size: Optional[int] = None, max_pages: Optional[int] = None,
+                          lean: Optional[bool] = None, blocked_urls: Optional[List[str]] = None):
+    """Set pool size, recycle threshold and browser profile for pools created from now on."""
+    if size is not None:
+        _pool_settings["size"] = size
+    if max_pages is not None:
+        _pool_settings["max_pages"] = max_pages
+    if lean is not None:
+        _pool_settings["lean"] = lean
+    if blocked_urls is not None:
+        _pool_settings["blocked_urls"] = list(blocked_urls)
+
+def get_driver_pool(headless: bool = True) -> DriverPool:
+    settings = dict(_pool_settings)
+    signature = (settings["size"], settings["max_pages"], settings["lean"], tuple(settings["blocked_urls"] or ()))
+    with _driver_pools_lock:
+        pool = _driver_pools.get(headless)
+        if pool is None or _pool_signatures.get(headless) != signature:
+            if pool is not None:
+                pool.shutdown()
+            pool = DriverPool(
+                lambda proxy=None: get_chrome_driver(headless=headless, lean=settings["lean"],
+                                                     blocked_urls=settings["blocked_urls"], proxy=proxy),
+                size=settings["size"],
+                max_pages=settings["max_pages"],
+            )
+            _driver_pools[headless] = pool
+            _pool_signatures[headless] = signature
+        return pool
+
+def idle_driver_proxies() -> set:
+    """Proxies that a pooled browser is waiting idle on, so the next lease can reuse it."""
+    with _driver_pools_lock:
+        pools = list(_driver_pools.values())
+    return set().union(*(pool.idle_keys() for pool in pools))
+
+def shutdown_driver_pools():
+    with _driver_pools_lock:
+        for pool in _driver_pools.values():
+            pool.shutdown()
+        _driver_pools.clear()
+        _pool_signatures.clear()
+
+atexit.register(shutdown_driver_pools)
+
+# Interactive mode waits for a human to solve challenges in a visible browser;
+# otherwise challenged pages raise ChallengeDetected and are quarantined
+_captcha_settings = {"interactive": False, "solve_timeout": 180.0}
+
+def configure_captcha(interactive: Optional[bool] = None, solve_timeout: Optional[float] = None):
+    if interactive is not None:
+        _captcha_settings["interactive"] = interactive
+    if solve_timeout is not None:
+        _captcha_settings["solve_timeout"] = solve_timeout
+
+def load_search_page(driver, url: str, delay_sec: float = 2.0, force_grid: bool = False) -> Dict:
+    """Navigate a leased driver to `url` and wait until the cards and badges are loaded.
+
+    `delay_sec` no longer sleeps; it only raises the readiness timeout.
+    """
     from selenium.webdriver.common.by import By
-    driver = get_chrome_driver(headless=headless)
-    console.print(f"[debug] Selenium headless mode: {headless}")
-    try:
+    timeout = max(READY_TIMEOUT_SEC, delay_sec)
+    with span("navigate"):
         driver.get(url)
-        time.sleep(delay_sec)  # Initial wait for page to load
-        # Always force grid view if requested
-        if force_grid:
-            try:
-                # Wait for the grid/list toggle buttons to be present
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "button.listing-view-type-change[data-type='2'][data-target='card_grid']"))
-                )
-                grid_btn = driver.find_element(By.CSS_SELECTOR, "button.listing-view-type-change[data-type='2'][data-target='card_grid']")
-                # Only click if not already active
-                if "active" not in grid_btn.get_attribute("class"):
-                    grid_btn.click()
-                    time.sleep(1)
-            except Exception:
-                pass
-        # Wait for at least one badge element to appear
+    # Always force grid view if requested
+    if force_grid:
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".card-v2-badge-cmp, .badge, .card-v2-badge"))
-            )
+            # Wait until the toggle is clickable; on slow loads it is present before it is interactable
+            grid_btn = WebDriverWait(driver, min(10, timeout)).until(EC.element_to_be_clickable(
+                (By.CSS_SELECTOR, "button.listing-view-type-change[data-type='2'][data-target='card_grid']")))
+            # Only click if not already active
+            if "active" not in grid_btn.get_attribute("class"):
+                grid_btn.click()
         except Exception:
             pass
-        # Scroll through all product cards and hover over each to trigger badge loading (only once)
-        from selenium.common.exceptions import StaleElementReferenceException
-        card_selector = ".card-item, .card-v2, .product-card, .product-container"
-        cards = driver.find_elements(By.CSS_SELECTOR, card_selector)
-        for card in cards:
-            try:
-                driver.execute_script("arguments[0].scrollIntoView();", card)
-                webdriver.ActionChains(driver).move_to_element(card).perform()
-                time.sleep(0.2)
-            except Exception:
-                continue
-        # Scroll to bottom to trigger lazy loading if needed
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        input("[yellow]If you see a CAPTCHA in the browser, please solve it now, then press Enter here to continue scraping...")
-        html = driver.page_source
-    finally:
-        driver.quit()
+    # Scroll in viewport steps until cards, badges and network activity settle
+    with span("ready_wait"):
+        ready = wait_until_ready(driver, timeout=timeout)
+    ready.update(page_metrics(driver))
+    rss = f", Chrome RSS {ready['rss_bytes'] / 2**20:.0f} MB" if ready["rss_bytes"] else ""
+    transferred = f", {ready['bytes'] / 1024:.0f} KB transferred" if ready["bytes"] is not None else ""
+    console.print(
+        f"[debug] Page ready in {ready['seconds']:.2f}s ({ready['cards']} cards, {ready['badges']} badges, "
+        f"{ready['scroll_steps']} scroll steps{', timed out' if ready['timed_out'] else ''}{transferred}{rss})"
+    )
+    reason = detect_challenge_in_driver(driver)
+    if reason:
+        with span("challenge_solve"):
+            solved = _captcha_settings["interactive"] and wait_for_manual_solve(
+                driver, reason, _captcha_settings["solve_timeout"], notify=console.print)
+        if not solved:
+            if _session_store is not None:
+                _session_store.retire(driver)
+            raise ChallengeDetected(url, reason)
+        with span("ready_wait"):
+            ready = wait_until_ready(driver, timeout=timeout)
+        if _session_store is not None:
+            # The solved challenge now warms every browser started on this identity
+            _session_store.save(driver, solved=True)
+    elif _session_store is not None:
+        _session_store.page_done(driver)
+    return ready
+
+def fetch_html_selenium(url: str, delay_sec: float = 2.0, force_grid: bool = False, headless: bool = True,
+                        pool: Optional[DriverPool] = None, proxy: Optional[str] = None) -> str:
+    if pool is None:
+        pool = get_driver_pool(headless=headless)
+    console.print(f"[debug] Selenium headless mode: {headless}")
+    with pool.driver(key=proxy) as driver:
+        load_search_page(driver, url, delay_sec=delay_sec, force_grid=force_grid)
+        with span("page_source"):
+            html = driver.page_source
     return html
 
+def fetch_cards_selenium(url: str, delay_sec: float = 2.0, force_grid: bool = False, headless: bool = True,
+                         pool: Optional[DriverPool] = None, proxy: Optional[str] = None) -> List[Dict]:
+    """Card dicts extracted inside the page with one script call; HTML parse only as fallback."""
+    if pool is None:
+        pool = get_driver_pool(headless=headless)
+    with pool.driver(key=proxy) as driver:
+        load_search_page(driver, url, delay_sec=delay_sec, force_grid=force_grid)
+        try:
+            with span("js_extract"):
+                cards = extract_cards(driver)
+        except WebDriverException as e:
+            console.print(f"[yellow]In-page extraction failed ({e.__class__.__name__}), parsing page_source instead")
+            cards = None
+        if cards is None:
+            return parse_cards(driver.page_source)
+    console.print(f"[debug] In-page extraction: {len(cards)} cards")
+    return cards
+
 # Helper functions
 def extract_pd_code(product_url: str) -> str:
     match = re.search(r"/pd/([A-Za-z0-9]+)/", product_url)
@@ -136,20 +274,166 @@ def extract_pd_code(product_url: str) -> str:
         raise ValueError("Invalid product URL. Could not extract pd_code.")
     return match.group(1)
 
-def build_search_url(keyword: str, page: int) -> str:
-    encoded_keyword = urllib.parse.quote(keyword)
-    return f"{BASE_SEARCH_URL.format(kw_urlencoded=encoded_keyword)}&page={page}"
+def configure_base_url(base_url: str):
+    global _base_url
+    _base_url = base_url.rstrip("/")
 
-def fetch_html(url: str, headers: dict, proxy: Optional[str] = None, delay_sec: float = 2.0) -> str:
-    # Use Selenium instead of requests
+def build_search_url(keyword: str, page: int, ref: str = DEFAULT_VIEW) -> str:
+    encoded_keyword = urllib.parse.quote(keyword)
+    return f"{BASE_SEARCH_URL.format(base_url=_base_url, kw_urlencoded=encoded_keyword, ref=ref)}&page={page}"
+
+# Shared tiered fetcher: pooled requests.Session first, Selenium only when needed
+_fetcher: Optional[TieredFetcher] = None
+
+def get_fetcher(mode: Optional[str] = None) -> TieredFetcher:
+    global _fetcher
+    if _fetcher is None or (mode is not None and _fetcher.mode != mode):
+        if _fetcher is not None:
+            _fetcher.close()
+        _fetcher = TieredFetcher(fetch_html_selenium, headers=HEADERS, user_agents=USER_AGENTS, mode=mode or "auto")
+    return _fetcher
+
+# Run-wide AIMD pacer and circuit breaker shared by every fetch path
+_pacer: Optional[Pacer] = None
+_pacer_signature: Optional[tuple] = None
+_pacer_lock = threading.Lock()
+
+def configure_pacing(initial_delay: float = PACING_INITIAL_DELAY_SEC, min_delay: float = PACING_MIN_DELAY_SEC,
+                     max_delay: float = PACING_MAX_DELAY_SEC, adaptive: bool = True) -> Pacer:
+    """Install a pacer; an unchanged configuration keeps the delay it has learned so far."""
+    global _pacer, _pacer_signature
+    signature = (initial_delay, min_delay, max_delay, adaptive)
+    with _pacer_lock:
+        if _pacer is None or _pacer_signature != signature:
+            _pacer = Pacer(initial_delay, min_delay=min_delay, max_delay=max_delay, adaptive=adaptive,
+                           breaker=CircuitBreaker(notify=console.print))
+            _pacer_signature = signature
+        return _pacer
+
+def get_pacer() -> Pacer:
+    return _pacer or configure_pacing()
+
+# Optional proxy pool; None sends every fetch from our own IP
+_proxy_pool: Optional[ProxyPool] = None
+_proxy_signature: Optional[tuple] = None
+
+def configure_proxies(proxies: Optional[List[str]], max_concurrency: int = PROXY_MAX_CONCURRENCY,
+                      min_interval: float = PROXY_MIN_INTERVAL_SEC) -> Optional[ProxyPool]:
+    """Install a proxy pool (or none); an unchanged configuration keeps the health it has learned."""
+    global _proxy_pool, _proxy_signature
+    signature = (tuple(proxies or ()), max_concurrency, min_interval)
+    if _proxy_signature != signature:
+        _proxy_pool = ProxyPool(proxies, max_concurrency=max_concurrency, min_interval=min_interval,
+                                notify=console.print) if proxies else None
+        _proxy_signature = signature
+    return _proxy_pool
+
+def get_proxy_pool() -> Optional[ProxyPool]:
+    return _proxy_pool
+
+def paced_fetch(url: str, fetch: Callable[[Optional[str]], object], has_cards: Callable[[object], bool],
+                proxy: Optional[str] = None):
+    """Run one page fetch under the pacer: wait out an open breaker, report the outcome, retry errors.
+
+    Errors no longer abort the run; they back the pacer off and count toward
+    the circuit breaker, which pauses every fetch and only raises CircuitOpen
+    when the site does not recover. Challenges are reported and re-raised for
+    the quarantine.
+
+    `fetch(proxy)` gets the proxy to use: `proxy` when the caller pins one,
+    otherwise a fresh lease from the proxy pool for every attempt (None
+    without a pool), preferring proxies with an idle pooled browser. The
+    lease's outcome feeds that proxy's health score.
+    """
+    pacer = get_pacer()
+    proxies = _proxy_pool if proxy is None else None
+    while True:
+        pacer.breaker.wait_ready()
+        leased = proxies.acquire(prefer=idle_driver_proxies()) if proxies is not None else proxy
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            result = fetch(leased)
+            outcome = "ok" if has_cards(result) else "empty"
+        except ChallengeDetected:
+            outcome = "challenge"
+            raise
+        except Exception as e:
+            console.print(f"[red]Error fetching URL {url}{' via ' + proxy_label(leased) if leased else ''}: {e}; "
+                          "retrying after backoff")
+        finally:
+            seconds = time.monotonic() - started
+            pacer.record(seconds, outcome)
+            if proxies is not None:
+                proxies.release(leased, seconds, outcome)
+        if outcome != "error":
+            return result
+        with span("sleep"):
+            time.sleep(pacer.next_delay())
+
+def fetch_html(url: str, headers: dict, proxy: Optional[str] = None, delay_sec: float = 2.0,
+               headless: bool = True, pool: Optional[DriverPool] = None, force_grid: bool = False) -> str:
+    def fetch(leased):
+        with span("fetch"):
+            return get_fetcher().fetch(url, headers=headers, proxy=leased, force_grid=force_grid,
+                                       delay_sec=delay_sec, headless=headless, pool=pool)
     try:
-        html = fetch_html_selenium(url, delay_sec=delay_sec)
-        return html
-    except Exception as e:
-        console.print(f"[red]Error fetching URL {url} with Selenium: {e}")
-        raise RuntimeError(f"Failed to fetch URL {url} with Selenium.")
+        return paced_fetch(url, fetch, has_card_payload, proxy=proxy)
+    except CircuitOpen as e:
+        console.print(f"[red]Giving up on {url}: {e}")
+        raise
+
+# Search-page HTML cache shared by the CLI and the Streamlit app (None = disabled)
+_page_cache: Optional[PageCache] = None
+
+def configure_page_cache(enabled: bool = True, root: str = CACHE_DIR, ttl_sec: float = CACHE_TTL_SEC) -> Optional[PageCache]:
+    global _page_cache
+    _page_cache = PageCache(root=root, ttl_sec=ttl_sec) if enabled else None
+    return _page_cache
+
+def get_page_cache() -> Optional[PageCache]:
+    return _page_cache
+
+def fetch_search_page(keyword: str, page: int, view: str = DEFAULT_VIEW, **fetch_kwargs) -> str:
+    """Search-page HTML for (keyword, page, view), served from the page cache when fresh."""
+    cache = _page_cache
+    if cache is not None:
+        with span("cache_lookup"):
+            html = cache.get(keyword, page, view)
+        if html is not None:
+            console.print(f"[debug] Cache hit: {keyword!r} page={page} view={view}")
+            return html
+    html = fetch_html(build_search_url(keyword, page, ref=view), HEADERS, **fetch_kwargs)
+    # Only real result pages are worth keeping; block pages and empty tails are not
+    if cache is not None and has_card_payload(html):
+        cache.put(keyword, page, view, html)
+    return html
 
-def parse_cards(html: str) -> List[Dict]:
+def fetch_page_cards(keyword: str, page: int, view: str = DEFAULT_VIEW, extract: str = "html", **fetch_kwargs) -> List[Dict]:
+    """Cards for one search page, via in-page extraction or the cached HTML path."""
+    if extract == "js":
+        url = build_search_url(keyword, page, ref=view)
+        return paced_fetch(url, lambda proxy: fetch_cards_selenium(url, proxy=proxy, **fetch_kwargs), bool)
+    return parse_cards(fetch_search_page(keyword, page, view, **fetch_kwargs))
+
+PARSER_BACKENDS = ("bs4", "lxml")
+_parser_backend = "bs4"
+
+def configure_parser(backend: str):
+    """Select the parse_cards backend: "bs4" (reference) or "lxml" (compiled XPath)."""
+    global _parser_backend
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    _parser_backend = backend
+
+def parse_cards(html: str, backend: Optional[str] = None) -> List[Dict]:
+    with span("parse"):
+        if (backend or _parser_backend) == "lxml":
+            from fast_parser import parse_cards_lxml
+            return parse_cards_lxml(html)
+        return parse_cards_bs4(html)
+
+def parse_cards_bs4(html: str) -> List[Dict]:
     soup = BeautifulSoup(html, "lxml")
     cards = []
     card_grid = soup.find("div", id="card_grid")
@@ -299,105 +583,378 @@ def main():
     parser.add_argument("--keywords", required=True, help="Listă de keyword-uri separate prin virgulă sau newline")
     parser.add_argument("--pages", type=int, default=0, help="Câte pagini să parcurgă pentru fiecare keyword")
     parser.add_argument("--unbounded-cap", type=int, default=80, help="Limita maximă de pagini când --pages=0")
-    parser.add_argument("--delay-sec", type=float, default=8.0, help="Întârziere între request-uri (Selenium)")
+    parser.add_argument("--delay-sec", type=float, default=PACING_INITIAL_DELAY_SEC, help="Întârziere inițială între pagini (fixă cu --pacing fixed)")
+    parser.add_argument("--pacing", choices=["aimd", "fixed"], default="aimd", help="aimd = accelerează cât timp eMAG răspunde bine, încetinește la semne de blocare")
+    parser.add_argument("--min-delay", type=float, default=PACING_MIN_DELAY_SEC, help="Pauza minimă între pagini în modul aimd")
+    parser.add_argument("--max-delay", type=float, default=PACING_MAX_DELAY_SEC, help="Pauza maximă între pagini în modul aimd")
     parser.add_argument("--strict-grid", action="store_true", help="Numără doar cardurile de produs reale")
     parser.add_argument("--ignore-sponsored", action="store_true", help="Ignoră rezultatele marcate ca Promovat/Sponsorizat")
-    parser.add_argument("--csv", help="Cale fișier pentru export CSV")
+    parser.add_argument("--csv", help="Cale fișier pentru export CSV (scris pe măsură ce se găsesc rezultate)")
+    parser.add_argument("--jsonl", help="Cale fișier pentru export JSONL (scris pe măsură ce se găsesc rezultate)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Fișier checkpoint cu paginile deja parcurse")
+    parser.add_argument("--resume", action="store_true", help="Continuă o rulare întreruptă din checkpoint")
     parser.add_argument("--debug", action="store_true", help="Printează informații de debug")
+    parser.add_argument("--pool-size", type=int, default=DRIVER_POOL_SIZE, help="Câte browsere Chrome să țină deschise")
+    parser.add_argument("--driver-max-pages", type=int, default=DRIVER_MAX_PAGES, help="Repornește un browser după atâtea pagini")
+    parser.add_argument("--fetch-mode", choices=["auto", "http", "browser"], default="auto", help="auto = HTTP întâi, browser doar la nevoie")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Director pentru cache-ul paginilor de căutare")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_SEC, help="Durata de viață a unei pagini din cache (secunde)")
+    parser.add_argument("--no-cache", action="store_true", help="Nu folosi cache-ul paginilor de căutare")
+    parser.add_argument("--parser", choices=PARSER_BACKENDS, default="bs4", help="Backend de parsare: bs4 (referință) sau lxml (rapid)")
+    parser.add_argument("--extract", choices=["html", "js"], default="html", help="js = extrage cardurile direct în browser (fără page_source)")
+    parser.add_argument("--lean", action="store_true", help="Profil Chrome minimal: fără imagini, fonturi, media și trackere")
+    parser.add_argument("--block", action="append", default=[], help="Model URL suplimentar de blocat în profilul minimal (repetabil)")
+    parser.add_argument("--visible", action="store_true", help="Rulează Chrome cu fereastră (necesar pentru --interactive-captcha)")
+    parser.add_argument("--interactive-captcha", action="store_true", help="Așteaptă rezolvarea manuală doar pe paginile cu CAPTCHA")
+    parser.add_argument("--captcha-backoff", type=float, default=60.0, help="Prima pauză (secunde) înainte de reîncercarea unui keyword blocat")
+    parser.add_argument("--history-db", default=RANK_DB_FILE, help="Baza SQLite cu istoricul pozițiilor")
+    parser.add_argument("--no-history", action="store_true", help="Nu salva pozițiile găsite în istoric")
+    parser.add_argument("--warm-start", action="store_true", help="Începe căutarea de la pagina unde produsul a fost găsit ultima dată")
+    parser.add_argument("--pipeline", action="store_true", help="Descarcă și parsează în paralel (fetch → parse → rank)")
+    parser.add_argument("--parse-workers", type=int, default=PIPELINE_PARSE_WORKERS, help="Procese de parsare în modul --pipeline")
+    parser.add_argument("--pipeline-queue", type=int, default=PIPELINE_QUEUE_SIZE, help="Câte pagini descărcate pot aștepta parsarea")
+    parser.add_argument("--concurrency", type=int, default=0, help="Request-uri simultane către eMAG (0 = serial, cu pauze fixe)")
+    parser.add_argument("--rate", type=float, default=CRAWL_RATE_PER_SEC, help="Request-uri pe secundă permise în modul concurent")
+    parser.add_argument("--burst", type=int, default=CRAWL_BURST, help="Câte request-uri pot porni imediat în modul concurent")
+    parser.add_argument("--session-dir", default=SESSION_DIR, help="Director cu sesiunile de browser salvate (cookies, localStorage)")
+    parser.add_argument("--no-sessions", action="store_true", help="Pornește fiecare browser cu un profil gol")
+    parser.add_argument("--proxies", help="Fișier cu proxy-uri (unul pe linie) sau listă separată prin virgulă")
+    parser.add_argument("--proxy-concurrency", type=int, default=PROXY_MAX_CONCURRENCY, help="Request-uri simultane permise pe un proxy")
+    parser.add_argument("--proxy-interval", type=float, default=PROXY_MIN_INTERVAL_SEC, help="Secunde minime între două request-uri pe același proxy")
+    parser.add_argument("--profile-json", help="Salvează timpii pe faze (p50/p95/max, per keyword) în acest fișier JSON")
+    parser.add_argument("--metrics", help="Salvează timpii pe faze în format text Prometheus")
     args = parser.parse_args()
+    if args.pipeline and args.extract == "js":
+        parser.error("--pipeline parsează HTML; nu se poate combina cu --extract js")
+    if args.warm_start and (args.pipeline or args.concurrency > 0):
+        parser.error("--warm-start caută pagină cu pagină pornind de la ultima poziție; "
+                     "nu se poate combina cu --pipeline sau --concurrency")
+
+    configure_captcha(interactive=args.interactive_captcha)
+    configure_pacing(args.delay_sec, args.min_delay, args.max_delay, adaptive=args.pacing == "aimd")
+    proxies = configure_proxies(load_proxies(args.proxies) if args.proxies else None,
+                                args.proxy_concurrency, args.proxy_interval)
+
+    configure_parser(args.parser)
+    configure_driver_pool(size=args.pool_size, max_pages=args.driver_max_pages,
+                          lean=args.lean, blocked_urls=LEAN_BLOCKED_URLS + args.block)
+    fetcher = get_fetcher(args.fetch_mode)
+    cache = configure_page_cache(not args.no_cache, root=args.cache_dir, ttl_sec=args.cache_ttl)
+    sessions = configure_session_store(not args.no_sessions, root=args.session_dir)
+    try:
+        run(args)
+    except CheckpointMismatch as e:
+        parser.error(f"{e}\nȘterge {args.checkpoint} sau rulează fără --resume pentru a începe de la zero")
+    finally:
+        console.print(f"[cyan]Fetch tiers: {fetcher.report()}")
+        console.print(f"[cyan]Pacing: {get_pacer().stats()}")
+        if sessions is not None:
+            console.print(f"[cyan]Browser sessions: {sessions.stats()}")
+        if proxies is not None:
+            for proxy_stats in proxies.stats():
+                console.print(f"[cyan]Proxy: {proxy_stats}")
+        if cache is not None:
+            console.print(f"[cyan]Page cache: {cache.stats()}")
+        if args.debug:
+            for headless, pool in _driver_pools.items():
+                console.print(f"[debug] Driver pool (headless={headless}): {pool.stats()}")
+        shutdown_driver_pools()
+        profiler = get_profiler()
+        profiler.print_table(console, per_keyword=args.debug)
+        if args.profile_json:
+            profiler.to_json(args.profile_json)
+        if args.metrics:
+            profiler.to_prometheus(args.metrics)
+
+def make_result(keyword: str, page: int, position_on_page: int, rank_global: int, card: Dict,
+                page_url: str, pd_code: str, view: str = DEFAULT_VIEW) -> Dict:
+    """One CLI result row (the --csv schema minus the margin columns)."""
+    return {
+        "keyword": keyword,
+        "view": view,
+        "page": page,
+        "position_on_page": position_on_page,
+        "rank_global": rank_global,
+        "result_title": card["title"],
+        "result_url": card["url_abs"],
+        "page_url": page_url,
+        "pd_code": pd_code,
+        "promoted_html": card["is_promoted"],
+        "sponsored_html": card["is_sponsored"],
+    }
+
+def crawl_keyword(unit: Dict, target_pd_code: str, args, excluded_counts: Dict,
+                  on_page: Optional[Callable[[str, int, int], None]] = None) -> Optional[Dict]:
+    """Walk the result pages of one keyword until the target is found.
+
+    `unit` holds {"keyword", "page", "rank_global"} and is advanced page by
+    page, so a ChallengeDetected raised mid-way leaves it ready to resume.
+    `on_page(keyword, page, rank_global)` is called after each page without
+    a match.
+    """
+    keyword = unit["keyword"]
+    last_page = args.pages if args.pages > 0 else args.unbounded_cap
+    while unit["page"] <= last_page:
+        page = unit["page"]
+        search_url = build_search_url(keyword, page)
+        try:
+            if args.extract == "js":
+                cards = paced_fetch(search_url, lambda proxy: fetch_cards_selenium(
+                    search_url, delay_sec=args.delay_sec, headless=not args.visible, proxy=proxy), bool)
+            else:
+                html = fetch_search_page(keyword, page, delay_sec=args.delay_sec, headless=not args.visible)
+                # Save raw HTML for inspection (only first page, first keyword)
+                if args.debug and page == 1 and unit.get("first"):
+                    with open(f"debug_emag_search_page.html", "w", encoding="utf-8") as f:
+                        f.write(html)
+                        console.print("[yellow]Saved raw HTML to debug_emag_search_page.html for inspection.")
+                cards = parse_cards(html)
+        except ChallengeDetected as e:
+            e.page = page
+            raise
+        filtered_cards = filter_cards(cards, args.strict_grid, args.ignore_sponsored)
+
+        if args.debug:
+            console.print(f"[debug] Page {page}: {len(filtered_cards)} rezultate filtrate")
+
+        position_on_page = find_target(filtered_cards, target_pd_code)
+
+        if position_on_page:
+            excluded_counts[(keyword, DEFAULT_VIEW, page)] = len([card for card in cards if card['is_promoted'] or card['is_sponsored']])
+            return make_result(keyword, page, position_on_page, unit["rank_global"] + position_on_page,
+                               filtered_cards[position_on_page - 1], search_url, target_pd_code)
+
+        unit["rank_global"] += len(filtered_cards)
+        unit["page"] += 1
+        if on_page:
+            on_page(keyword, page, unit["rank_global"])
+        if not cards:
+            break
+
+        polite_sleep(args)
+    return None
 
+def polite_sleep(args):
+    # AIMD delay learned from recent pages (or the old fixed delay + 2..6s with --pacing fixed)
+    sleep_time = get_pacer().next_delay()
+    console.print(f"[yellow]Sleeping for {sleep_time:.1f} seconds...")
+    with span("sleep"):
+        time.sleep(sleep_time)
+
+def warm_crawl_keyword(unit: Dict, target_pd_code: str, args, excluded_counts: Dict, memory,
+                       on_page: Optional[Callable[[str, int, int], None]] = None) -> Optional[Dict]:
+    """--warm-start: search outward from the page the product was last seen on.
+
+    Pages are checked out of order, so `on_page(keyword, page, rank_global)`
+    is called once the search is over, for each page before the match in
+    page order, and `unit` is advanced the same way as in `crawl_keyword`.
+    """
+    from warm_start import warm_start_search
+    keyword = unit["keyword"]
+    start_page = memory.last_page(target_pd_code, keyword, DEFAULT_VIEW)
+    if start_page is None or unit["page"] > 1:
+        # Nothing remembered, or resuming a page walk that was already under way
+        return crawl_keyword(unit, target_pd_code, args, excluded_counts, on_page)
+
+    fetched = []
+    def fetch_cards(kw, page, view):
+        if fetched:
+            polite_sleep(args)
+        fetched.append(page)
+        try:
+            return fetch_page_cards(kw, page, view, extract=args.extract, delay_sec=args.delay_sec, headless=not args.visible)
+        except ChallengeDetected as e:
+            e.page = page
+            raise
+
+    last_page = args.pages if args.pages > 0 else args.unbounded_cap
+    outcome = warm_start_search(keyword, DEFAULT_VIEW, target_pd_code, start_page, fetch_cards, last_page,
+                                args.strict_grid, args.ignore_sponsored, memory)
+    match = outcome["match"]
+    console.print(f"[cyan]Warm start {keyword!r}: last seen on page {start_page}, "
+                  f"{'found on page ' + str(match['page']) if match else 'not found'} "
+                  f"after {outcome['fetches']} fetches (pages {outcome['pages_checked']})")
+    # Report the pages before the match (or every contiguous page checked) in page order, like the cold walk
+    counts = outcome["page_counts"]
+    while unit["page"] in counts and not (match and unit["page"] >= match["page"]):
+        page = unit["page"]
+        unit["rank_global"] += counts[page]
+        unit["page"] += 1
+        if on_page:
+            on_page(keyword, page, unit["rank_global"])
+    if not match:
+        return None
+    excluded_counts[(keyword, DEFAULT_VIEW, match["page"])] = match["excluded_count"]
+    return make_result(keyword, match["page"], match["position_on_page"], match["rank_global"], match["card"],
+                       build_search_url(keyword, match["page"]), target_pd_code)
+
+def run(args):
     target_pd_code = extract_pd_code(args.product_url)
     console.print(f"[*] Identitate produs: pd_code={target_pd_code}")
 
     keywords = [kw.strip() for kw in args.keywords.split(",")]
     results = []
+    excluded_counts = {}
+    quarantine = QuarantineQueue(base_delay=args.captcha_backoff)
+
+    from rank_store import RankStore
+    run_key = {"pd_code": target_pd_code, "pages": args.pages, "unbounded_cap": args.unbounded_cap,
+               "strict_grid": args.strict_grid, "ignore_sponsored": args.ignore_sponsored}
+    checkpoint = Checkpoint(args.checkpoint, run_key, resume=args.resume, notify=console.print)
+    sink = ResultSink(args.csv, args.jsonl, strict_grid=args.strict_grid, append=args.resume)
+    store = RankStore(args.history_db)
+    memory = store if args.warm_start else None
+
+    def page_missed(keyword, page, rank_global):
+        sink.write_miss(keyword, DEFAULT_VIEW, page, build_search_url(keyword, page), target_pd_code)
+        checkpoint.page_done(keyword, page, rank_global)
+
+    def keyword_finished(keyword, result):
+        if result:
+            results.append(result)
+            sink.write_result(result, excluded_counts[(keyword, result["view"], result["page"])])
+            if not args.no_history:
+                store.record(result["pd_code"], keyword, DEFAULT_VIEW, result["page"], result["position_on_page"],
+                             result["rank_global"], result["promoted_html"], result["sponsored_html"])
+        checkpoint.keyword_done(keyword)
+
+    def run_unit(unit):
+        with keyword_scope(unit["keyword"]):
+            if memory is not None:
+                result = warm_crawl_keyword(unit, target_pd_code, args, excluded_counts, memory, page_missed)
+            else:
+                result = crawl_keyword(unit, target_pd_code, args, excluded_counts, page_missed)
+        keyword_finished(unit["keyword"], result)
+
+    pending = {}
+    for keyword in keywords:
+        resume_from = checkpoint.pending(keyword)
+        if resume_from is not None:
+            pending[keyword] = resume_from
+    if args.resume:
+        console.print(f"[cyan]Resuming from {args.checkpoint}: {len(keywords) - len(pending)} keyword(s) already done")
 
-    with Progress() as progress:
-        task = progress.add_task("[cyan]Searching eMAG...", total=len(keywords))
-
-        for keyword in keywords:
-            rank_global = 0
-            for page in range(1, args.pages + 1 if args.pages > 0 else args.unbounded_cap + 1):
-                search_url = build_search_url(keyword, page)
-                html = fetch_html(search_url, HEADERS, delay_sec=args.delay_sec)
-                # Save raw HTML for inspection (only first page, first keyword)
-                if page == 1 and keyword == keywords[0]:
-                    with open(f"debug_emag_search_page.html", "w", encoding="utf-8") as f:
-                        f.write(html)
-                        console.print("[yellow]Saved raw HTML to debug_emag_search_page.html for inspection.")
-                cards = parse_cards(html)
-                filtered_cards = filter_cards(cards, args.strict_grid, args.ignore_sponsored)
-
-                if args.debug:
-                    console.print(f"[debug] Page {page}: {len(filtered_cards)} rezultate filtrate")
-
-                rank_global += len(filtered_cards)
-                position_on_page = find_target(filtered_cards, target_pd_code)
-
-                if position_on_page:
-                    results.append({
-                        "keyword": keyword,
-                        "page": page,
-                        "position_on_page": position_on_page,
-                        "rank_global": rank_global - len(filtered_cards) + position_on_page,
-                        "result_title": filtered_cards[position_on_page - 1]["title"],
-                        "result_url": filtered_cards[position_on_page - 1]["url_abs"],
-                        "page_url": search_url,
-                        "pd_code": target_pd_code,
-                        "promoted_html": filtered_cards[position_on_page - 1]["is_promoted"],
-                        "sponsored_html": filtered_cards[position_on_page - 1]["is_sponsored"],
-                    })
-                    break
-
-                if not cards:
-                    break
+    try:
+        if args.pipeline:
+            crawl_pipelined(args, pending, target_pd_code, excluded_counts, quarantine, page_missed, keyword_finished)
+        elif args.concurrency > 0:
+            crawl_concurrently(args, pending, target_pd_code, excluded_counts, quarantine, page_missed, keyword_finished)
+        else:
+            crawl_serially(args, pending, quarantine, run_unit)
+
+        if len(quarantine):
+            # Challenged drivers were recycled by the pool, so retries start on a fresh session
+            quarantine.drain(run_unit, notify=console.print)
+        for entry in quarantine.failed:
+            console.print(f"[red]Gave up on {entry['item']['keyword']!r} at page {entry['item']['page']} "
+                          f"after {entry['attempts']} attempts ({entry['reason']})")
+    finally:
+        sink.close()
+        checkpoint.close()
+        store.close()
+    report_results(args, results, excluded_counts)
 
-                # Add random delay to reduce bot detection
-                import random
-                sleep_time = args.delay_sec + random.uniform(2, 6)
-                console.print(f"[yellow]Sleeping for {sleep_time:.1f} seconds...")
-                time.sleep(sleep_time)
+def crawl_serially(args, pending, quarantine, run_unit):
+    with Progress() as progress:
+        task = progress.add_task("[cyan]Searching eMAG...", total=len(pending))
 
+        for i, (keyword, resume_from) in enumerate(pending.items()):
+            unit = {"keyword": keyword, "page": resume_from["page"], "rank_global": resume_from["rank_global"],
+                    "first": i == 0}
+            try:
+                run_unit(unit)
+            except ChallengeDetected as e:
+                # Park this keyword at the challenged page and keep going with the others
+                console.print(f"[red]Challenge for {keyword!r} page {e.page} ({e.reason}); quarantined for retry")
+                quarantine.add(unit, e.reason)
             progress.update(task, advance=1)
 
-    def get_margin(strict_grid, filtered_count):
-        if strict_grid:
-            return 1
-        return max(2, int(0.05 * filtered_count))
-
+def page_reporter(target_pd_code, excluded_counts, page_missed, keyword_finished):
+    """on_page callback for the scheduler and the pipeline: stream each ranked page."""
+    def on_page(keyword, view, page, rank_global, matches):
+        if not matches:
+            page_missed(keyword, page, rank_global)
+            return
+        match = matches[0]
+        excluded_counts[(keyword, view, page)] = match["excluded_count"]
+        keyword_finished(keyword, make_result(keyword, page, match["position_on_page"], match["rank_global"],
+                                              match["card"], match["page_url"], target_pd_code, view))
+    return on_page
+
+def settle_outcomes(outcomes, quarantine, keyword_finished):
+    for outcome in outcomes:
+        challenged = outcome["challenged"]
+        if challenged:
+            console.print(f"[red]Challenge for {outcome['keyword']!r} page {challenged['page']} "
+                          f"({challenged['reason']}); quarantined for retry")
+            quarantine.add({"keyword": outcome["keyword"], "page": challenged["page"],
+                            "rank_global": challenged["rank_global"]}, challenged["reason"])
+        elif outcome["error"]:
+            # Left pending in the checkpoint so --resume picks it up at this page
+            console.print(f"[red]Error for {outcome['keyword']!r} page {outcome['error']['page']} "
+                          f"({outcome['error']['reason']})")
+        elif not outcome["matches"]:
+            keyword_finished(outcome["keyword"], None)
+
+def crawl_concurrently(args, pending, target_pd_code, excluded_counts, quarantine, page_missed, keyword_finished):
+    """All keywords at once under the per-host token bucket (--concurrency/--rate)."""
+    from crawler import CrawlScheduler
+    fetch_kwargs = {"delay_sec": args.delay_sec, "headless": not args.visible}
+
+    def fetch_cards(keyword, page, view):
+        with keyword_scope(keyword):
+            return fetch_page_cards(keyword, page, view, extract=args.extract, **fetch_kwargs)
+
+    scheduler = CrawlScheduler(
+        fetch_cards,
+        rate=args.rate, burst=args.burst, max_in_flight=args.concurrency,
+        on_page=page_reporter(target_pd_code, excluded_counts, page_missed, keyword_finished),
+    )
+    tasks = [(keyword, DEFAULT_VIEW, resume_from["page"], resume_from["rank_global"])
+             for keyword, resume_from in pending.items()]
+    outcomes = scheduler.run(tasks, target_pd_code, args.pages, args.unbounded_cap,
+                             args.strict_grid, args.ignore_sponsored)
+    settle_outcomes(outcomes, quarantine, keyword_finished)
+    console.print(f"[cyan]Crawl scheduler: {scheduler.stats()}")
+
+def crawl_pipelined(args, pending, target_pd_code, excluded_counts, quarantine, page_missed, keyword_finished):
+    """--pipeline: browsers keep fetching while a process pool parses (one fetcher per pooled browser)."""
+    from pipeline import RankPipeline
+
+    def fetch_html_page(keyword, page, view):
+        with keyword_scope(keyword):
+            return fetch_search_page(keyword, page, view, delay_sec=args.delay_sec, headless=not args.visible)
+
+    pipeline = RankPipeline(
+        fetch_html_page,
+        target_pd_code, args.pages if args.pages > 0 else args.unbounded_cap,
+        args.strict_grid, args.ignore_sponsored, fetch_workers=args.pool_size,
+        parse_workers=args.parse_workers, queue_size=args.pipeline_queue, backend=args.parser,
+        on_page=page_reporter(target_pd_code, excluded_counts, page_missed, keyword_finished),
+        pause=lambda: polite_sleep(args),
+    )
+    tasks = [(keyword, DEFAULT_VIEW, resume_from["page"], resume_from["rank_global"])
+             for keyword, resume_from in pending.items()]
+    settle_outcomes(pipeline.run(tasks), quarantine, keyword_finished)
+    console.print(f"[cyan]Pipeline: {pipeline.stats()}")
+
+def report_results(args, results, excluded_counts):
     def show_margin_warning(margin):
         if margin > 3:
             console.print(f"[yellow]Warning: Large margin for error (±{margin}) indicates possible grid anomalies or ads. Result may be less precise.")
 
-    if args.csv:
-        with open(args.csv, "w", newline="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=[
-                "keyword", "page", "position_on_page", "rank_global", "result_title", "result_url", "page_url", "pd_code", "promoted_html", "sponsored_html", "position_margin_error", "rank_margin_error"
-            ])
-            writer.writeheader()
-            for result in results:
-                filtered_count = max(result['position_on_page'], 1)
-                margin_error = get_margin(args.strict_grid, filtered_count)
-                result_copy = result.copy()
-                result_copy["position_margin_error"] = f"{result['position_on_page']} ±{margin_error}"
-                result_copy["rank_margin_error"] = f"{result['rank_global']} ±{margin_error}"
-                writer.writerow(result_copy)
-
     for result in results:
-        filtered_count = max(result['position_on_page'], 1)
-        margin_error = get_margin(args.strict_grid, filtered_count)
+        margin_error = get_margin(args.strict_grid, result['position_on_page'])
         position_with_margin = f"{result['position_on_page']} ±{margin_error}"
         rank_with_margin = f"{result['rank_global']} ±{margin_error}"
         show_margin_warning(margin_error)
 
-        # Count excluded promoted/sponsored cards for this page
-        # Re-parse the HTML for this result's page
-        html = fetch_html(result['page_url'], HEADERS, delay_sec=0)
-        all_cards = parse_cards(html)
-        excluded_count = len([card for card in all_cards if card['is_promoted'] or card['is_sponsored']])
+        # Excluded promoted/sponsored cards were counted when the page was crawled
+        excluded_count = excluded_counts[(result['keyword'], result['view'], result['page'])]
 
         console.print(
             f"[green]Keyword:[/green] {result['keyword']}\n"
+            f"[blue]View:[/blue] {result['view']}\n"
             f"[blue]Page:[/blue] {result['page']}\n"
             f"[blue]Position on Page:[/blue] {position_with_margin}\n"
             f"[blue]Global Rank:[/blue] {rank_with_margin}\n"
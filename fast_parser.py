@@ -0,0 +1,192 @@
+# lxml/XPath card parser for emag-product-rank-finder
+"""Drop-in replacement for the BeautifulSoup `parse_cards` backend.
+
+Every XPath and regex is compiled once at import time. The output must stay
+identical to `emag_rank.parse_cards_bs4`; tests/test_fast_parser.py checks
+parity on the saved pages. Run this module on a page to compare throughput:
+
+    python fast_parser.py debug_emag_search_page.html
+"""
+import re
+import sys
+import time
+import urllib.parse
+from typing import Dict, List
+
+from lxml import etree
+
+PD_CODE_RE = re.compile(r"/pd/([A-Za-z0-9]+)/")
+PROMOTED_GRID_RE = re.compile(r"promovat|promoted", re.I)
+PROMOTED_LIST_RE = re.compile(r"promovat|promovat", re.I)
+SPONSORED_RE = re.compile(r"sponsored|sponsorizat|reclama", re.I)
+REVIEW_TITLE_RE = re.compile(r"^\d+(\.\d+)? de review-uri")
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_CARD_GRID = etree.XPath("//div[@id='card_grid']")
+_GRID_CARDS = etree.XPath(f".//div[{_has_class('card-item')}]")
+_BADGES = etree.XPath(".//*[self::span or self::div][contains(@class, 'badge')]")
+# Same strings BeautifulSoup yields from .descendants: text, tails and comments
+_ALL_STRINGS = etree.XPath(".//text() | .//comment()")
+# Same strings BeautifulSoup's get_text() uses: no comments, scripts or styles
+_TEXT = etree.XPath(".//text()[not(parent::script) and not(parent::style) and not(parent::template)]")
+_LIST_SELECTORS = [
+    etree.XPath(f"//div[{_has_class(name)}]")
+    for name in ("card-item", "card-v2", "product-card", "product-container",
+                 "card-standard", "card-list", "card-list-updated")
+]
+_PD_LINKS = etree.XPath(".//a[contains(@href, '/pd/')]")
+_FIRST_H2 = etree.XPath("(.//h2)[1]")
+_FIRST_H3 = etree.XPath("(.//h3)[1]")
+_TITLE_WRAPPER = etree.XPath("(.//h2[contains(@class, 'card-v2-title-wrapper')])[1]")
+_TITLE_ANCHOR = etree.XPath("(.//a[contains(@class, 'card-v2-title')])[1]")
+
+_HTML_PARSER = etree.HTMLParser()
+
+
+def _strings(node):
+    """Yield (text, parent element) pairs in document order, comments included."""
+    for item in _ALL_STRINGS(node):
+        if isinstance(item, str):
+            parent = item.getparent()
+            if item.is_tail:
+                parent = parent.getparent()
+            yield item, parent
+        else:
+            yield item.text or "", item.getparent()
+
+
+def _get_text(node) -> str:
+    return "".join(_TEXT(node))
+
+
+def _get_text_strip(node) -> str:
+    return "".join(s.strip() for s in _TEXT(node))
+
+
+def _is_promoted(card, promoted_re) -> bool:
+    for badge in _BADGES(card):
+        visible_text = ""
+        for text, parent in _strings(badge):
+            text = text.strip()
+            if text and (parent is None or "hidden" not in (parent.get("class") or "").split()):
+                visible_text += text
+        if promoted_re.search(visible_text):
+            return True
+    return False
+
+
+def _is_sponsored(card) -> bool:
+    return any(SPONSORED_RE.search(text) for text, _ in _strings(card))
+
+
+def parse_cards_lxml(html: str) -> List[Dict]:
+    root = etree.fromstring(html, _HTML_PARSER) if html else None
+    if root is None:
+        return []
+    cards = []
+    grids = _CARD_GRID(root)
+    if grids:
+        for i, card in enumerate(_GRID_CARDS(grids[0])):
+            url_abs = card.get("data-url")
+            match = PD_CODE_RE.search(url_abs) if url_abs else None
+            if url_abs and not match:
+                raise ValueError("Invalid product URL. Could not extract pd_code.")
+            try:
+                data_position = int(card.get("data-position", "0"))
+            except Exception:
+                data_position = None
+            cards.append({
+                "pd_code": match.group(1) if match else None,
+                "url_abs": url_abs,
+                "title": card.get("data-name"),
+                "is_promoted": _is_promoted(card, PROMOTED_GRID_RE),
+                "is_sponsored": _is_sponsored(card),
+                "idx_on_page": i + 1,
+                "data_position": data_position,
+            })
+        return cards
+
+    # Fallback for list view and other layouts: selector order, then DOM order
+    seen = set()
+    containers = []
+    for selector in _LIST_SELECTORS:
+        for el in selector(root):
+            if el not in seen:
+                seen.add(el)
+                containers.append(el)
+
+    for idx, container in enumerate(containers, start=1):
+        link = None
+        match = None
+        for a in _PD_LINKS(container):
+            match = PD_CODE_RE.search(a.get("href", ""))
+            if match:
+                link = a
+                break
+        if link is None:
+            continue
+        href = link.get("href")
+        title = ""
+        title_tag = (_FIRST_H2(container) or _FIRST_H3(container) or [None])[0]
+        if title_tag is not None:
+            title = _get_text_strip(title_tag)
+        if not title:
+            wrapper = _TITLE_WRAPPER(container)
+            if wrapper:
+                anchor = _TITLE_ANCHOR(wrapper[0])
+                if anchor:
+                    title = _get_text_strip(anchor[0])
+        if not title:
+            title = link.get("title", _get_text(link).strip())
+        if REVIEW_TITLE_RE.match(title) or "review-uri" in title:
+            continue
+        cards.append({
+            "idx_on_page": idx,
+            "pd_code": match.group(1),
+            "title": title,
+            "url_abs": urllib.parse.urljoin("https://www.emag.ro/", href),
+            "is_promoted": _is_promoted(container, PROMOTED_LIST_RE),
+            "is_sponsored": _is_sponsored(container),
+        })
+    return cards
+
+
+def compare_backends(html: str) -> List[str]:
+    """Differences between the BeautifulSoup and lxml backends for one page."""
+    from emag_rank import parse_cards_bs4
+    expected = parse_cards_bs4(html)
+    actual = parse_cards_lxml(html)
+    diffs = []
+    if len(expected) != len(actual):
+        diffs.append(f"card count: bs4={len(expected)} lxml={len(actual)}")
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            diffs.append(f"card {i + 1}: bs4={a} lxml={b}")
+    return diffs
+
+
+def _time(fn, html: str, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(html)
+    return (time.perf_counter() - started) / rounds
+
+
+if __name__ == "__main__":
+    from emag_rank import console, parse_cards_bs4
+    console.quiet = True
+    for path in sys.argv[1:] or ["debug_emag_search_page.html"]:
+        with open(path, "r", encoding="utf-8") as f:
+            page = f.read()
+        diffs = compare_backends(page)
+        bs4_sec = _time(parse_cards_bs4, page, 5)
+        lxml_sec = _time(parse_cards_lxml, page, 20)
+        status = "identical" if not diffs else f"{len(diffs)} differences"
+        print(f"{path}: {status}; bs4 {bs4_sec * 1000:.1f} ms, lxml {lxml_sec * 1000:.1f} ms, "
+              f"speedup {bs4_sec / lxml_sec:.1f}x")
+        for diff in diffs[:10]:
+            print("  " + diff)
@@ -0,0 +1,128 @@
+# Tiered page fetcher for emag-product-rank-finder
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TIERS = ("http", "browser")
+
+_CARD_GRID_RE = re.compile(r"""id=["']card_grid["']""")
+_CARD_ITEM_RE = re.compile(r"""class=["'][^"']*\bcard-item\b""")
+_PD_LINK_RE = re.compile(r"/pd/[A-Za-z0-9]+/")
+# A rendered badge element (card-v2-badge / card-v2-badge-cmp plus the `badge` class), not an empty placeholder
+_BADGE_RE = re.compile(r"""class=["'](?=[^"']*\bcard-v2-badge)(?=[^"']*(?<![\w-])badge(?![\w-]))""")
+
+
+def has_card_payload(html: Optional[str], require_grid: bool = False, require_badges: bool = False) -> bool:
+    """Cheap check that a response carries real product cards, not a shell or block page.
+
+    `require_badges` also asks for rendered badge markup. Promoted/sponsored
+    badges can be injected client-side, and a page without them would rank
+    differently under --ignore-sponsored than the browser path does.
+    """
+    if not html:
+        return False
+    if not _CARD_ITEM_RE.search(html) or not _PD_LINK_RE.search(html):
+        return False
+    if require_grid and not _CARD_GRID_RE.search(html):
+        return False
+    if require_badges and not _BADGE_RE.search(html):
+        return False
+    return True
+
+
+class TieredFetcher:
+    """Try a pooled keep-alive requests.Session first, fall back to the browser.
+
+    `browser_fetch(url, force_grid=..., proxy=..., **kwargs)` is only called
+    when the HTTP tier fails or returns a page without a usable card payload;
+    it gets the same proxy so both tiers leave from the same IP. In "auto"
+    mode an HTTP page also needs rendered badge markup, otherwise the
+    browser renders it so promoted/sponsored detection matches.
+    """
+
+    def __init__(self, browser_fetch: Callable, headers: Optional[Dict] = None,
+                 user_agents: Optional[Sequence[str]] = None, timeout: float = 15.0,
+                 pool_maxsize: int = 8, mode: str = "auto"):
+        if mode not in ("auto",) + TIERS:
+            raise ValueError(f"Unknown fetch mode: {mode}")
+        self.browser_fetch = browser_fetch
+        self.headers = dict(headers or {})
+        self.user_agents = list(user_agents or [])
+        self.timeout = timeout
+        self.mode = mode
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.user_agents:
+            # One UA per session so the keep-alive connection looks like one client
+            self.session.headers["User-Agent"] = random.choice(self.user_agents)
+        self._lock = threading.Lock()
+        self.stats = {tier: {"pages": 0, "seconds": 0.0} for tier in TIERS}
+        self.stats["http_rejected"] = 0
+
+    def _record(self, tier: str, started: float):
+        with self._lock:
+            self.stats[tier]["pages"] += 1
+            self.stats[tier]["seconds"] += time.monotonic() - started
+
+    def fetch_http(self, url: str, headers: Optional[Dict] = None, proxy: Optional[str] = None) -> Optional[str]:
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        proxies = {"http": proxy, "https": proxy} if proxy else None
+        try:
+            resp = self.session.get(url, headers=merged, proxies=proxies, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        if resp.status_code != 200:
+            return None
+        return resp.text
+
+    def fetch(self, url: str, headers: Optional[Dict] = None, proxy: Optional[str] = None,
+              force_grid: bool = False, **browser_kwargs) -> str:
+        if self.mode in ("auto", "http"):
+            started = time.monotonic()
+            html = self.fetch_http(url, headers=headers, proxy=proxy)
+            if has_card_payload(html, require_grid=force_grid, require_badges=self.mode == "auto"):
+                self._record("http", started)
+                return html
+            with self._lock:
+                self.stats["http_rejected"] += 1
+            if self.mode == "http":
+                from captcha import ChallengeDetected, detect_challenge
+                if html is None:
+                    raise RuntimeError(f"HTTP tier could not fetch {url}")
+                reason = detect_challenge(html)
+                if reason:
+                    raise ChallengeDetected(url, reason)
+                # No cards and no challenge: a genuinely empty results page
+                self._record("http", started)
+                return html
+        started = time.monotonic()
+        html = self.browser_fetch(url, force_grid=force_grid, proxy=proxy, **browser_kwargs)
+        self._record("browser", started)
+        return html
+
+    def report(self) -> Dict:
+        """Pages and time per tier, plus an estimate of the browser time avoided."""
+        with self._lock:
+            http, browser = self.stats["http"], self.stats["browser"]
+            avg_browser = browser["seconds"] / browser["pages"] if browser["pages"] else None
+            return {
+                "http_pages": http["pages"],
+                "http_seconds": round(http["seconds"], 2),
+                "browser_pages": browser["pages"],
+                "browser_seconds": round(browser["seconds"], 2),
+                "http_rejected": self.stats["http_rejected"],
+                "browser_seconds_saved_est": round(http["pages"] * avg_browser - http["seconds"], 2) if avg_browser else None,
+            }
+
+    def close(self):
+        self.session.close()
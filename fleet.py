@@ -0,0 +1,444 @@
+# Multi-process worker fleet for emag-product-rank-finder
+"""Spread keyword × view × page fetches over worker processes through a SQLite broker.
+
+The coordinator (`python fleet.py run ...`) queues one unit per search page
+in the broker's `units` table and starts N local workers. Workers
+(`python fleet.py worker --broker ... --job ...`, also runnable by hand on
+other hosts that share the broker file) each drive their own browser. A
+worker leases one unit at a time, extends its lease with a heartbeat while it
+fetches, and writes the parsed cards back. Units whose lease runs out are
+handed to another worker, until a unit has used up its attempts (e.g. a page
+that keeps killing its worker), which then fails like any other.
+
+The coordinator ranks every keyword/view strictly in page order as pages
+arrive. It queues more pages only as the walk advances, and cancels the
+rest once the target is found or the results end. Output goes through the
+same streaming sink as `emag_rank.main()` (--csv / --jsonl), and found ranks
+go to the rank history store.
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from captcha import ChallengeDetected
+from config import (
+    FLEET_BROKER_FILE, FLEET_LEASE_SEC, FLEET_POLL_SEC, FLEET_MAX_ATTEMPTS, FLEET_WORKER_WAIT_SEC, RANK_DB_FILE,
+    CACHE_DIR, SESSION_DIR,
+)
+from emag_rank import (
+    console, extract_pd_code, build_search_url, fetch_page_cards, filter_cards, find_target, make_result,
+    report_results, configure_parser, configure_driver_pool, configure_captcha, configure_page_cache,
+    get_fetcher, shutdown_driver_pools, polite_sleep, configure_pacing, configure_proxies, configure_session_store,
+    PARSER_BACKENDS, DEFAULT_VIEW,
+)
+from proxy_pool import load_proxies
+from rank_store import RankStore
+from sink import ResultSink
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    closed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    view TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cards TEXT,
+    error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (job, keyword, view, page)
+);
+CREATE INDEX IF NOT EXISTS idx_units_job_state ON units (job, state, not_before);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    job TEXT,
+    host TEXT,
+    pid INTEGER,
+    started REAL,
+    seen REAL,
+    pages INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class Broker:
+    """Work queue over one SQLite file; every process opens its own connection.
+
+    Unit states: pending -> leased -> done | failed, or cancelled when the
+    coordinator no longer needs the page.
+    """
+
+    def __init__(self, path: str = FLEET_BROKER_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+
+    # -- coordinator side ----------------------------------------------
+
+    def create_job(self, job: str):
+        self._write("INSERT OR IGNORE INTO jobs (job, created) VALUES (?, ?)", (job, time.time()))
+
+    def close_job(self, job: str):
+        self._write("UPDATE jobs SET closed = 1 WHERE job = ?", (job,))
+
+    def job_closed(self, job: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT closed FROM jobs WHERE job = ?", (job,)).fetchone()
+        return row is None or bool(row[0])
+
+    def enqueue(self, job: str, units: Sequence[tuple]):
+        """Queue (keyword, view, page) units; already queued pages are left alone."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("INSERT OR IGNORE INTO units (job, keyword, view, page) VALUES (?, ?, ?, ?)",
+                                      [(job,) + tuple(u) for u in units])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def collect(self, job: str) -> List[Dict]:
+        """Finished (done or failed) units not handed to the coordinator yet."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, keyword, view, page, state, cards, error FROM units"
+                " WHERE job = ? AND state IN ('done', 'failed') AND collected = 0", (job,)).fetchall()
+            if rows:
+                self.conn.executemany("UPDATE units SET collected = 1 WHERE id = ?", [(r[0],) for r in rows])
+        return [{"id": r[0], "keyword": r[1], "view": r[2], "page": r[3], "state": r[4],
+                 "cards": json.loads(r[5]) if r[5] else None, "error": r[6]} for r in rows]
+
+    def cancel(self, job: str, keyword: str, view: str, after_page: int):
+        self._write("UPDATE units SET state = 'cancelled' WHERE job = ? AND keyword = ? AND view = ?"
+                    " AND page > ? AND state = 'pending'", (job, keyword, view, after_page))
+
+    def counts(self, job: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM units WHERE job = ? GROUP BY state", (job,)).fetchall()
+        return dict(rows)
+
+    def workers(self, job: str) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT worker, host, pid, pages, seen FROM workers WHERE job = ? ORDER BY worker",
+                                     (job,)).fetchall()
+        return [{"worker": r[0], "host": r[1], "pid": r[2], "pages": r[3], "last_seen_sec": round(time.time() - r[4], 1)}
+                for r in rows]
+
+    # -- worker side ---------------------------------------------------
+
+    def register(self, worker: str, job: str):
+        now = time.time()
+        self._write("INSERT OR REPLACE INTO workers (worker, job, host, pid, started, seen, pages)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 0)", (worker, job, socket.gethostname(), os.getpid(), now, now))
+
+    def lease(self, job: str, worker: str, lease_sec: float, max_attempts: int = FLEET_MAX_ATTEMPTS) -> Optional[Dict]:
+        """Claim the lowest pending page (or one whose lease expired and has attempts left)."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "UPDATE units SET state = 'failed', error = 'lease expired on every attempt (worker lost)'"
+                    " WHERE job = ? AND state = 'leased' AND lease_until < ? AND attempts >= ?",
+                    (job, now, max_attempts))
+                row = self.conn.execute(
+                    "SELECT id, keyword, view, page, attempts FROM units WHERE job = ?"
+                    " AND ((state = 'pending' AND not_before <= ?) OR (state = 'leased' AND lease_until < ?))"
+                    " ORDER BY page, id LIMIT 1", (job, now, now)).fetchone()
+                if row:
+                    self.conn.execute("UPDATE units SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1"
+                                      " WHERE id = ?", (worker, now + lease_sec, row[0]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return {"id": row[0], "keyword": row[1], "view": row[2], "page": row[3], "attempts": row[4] + 1}
+
+    def heartbeat(self, worker: str, unit_id: Optional[int], lease_sec: float):
+        now = time.time()
+        if unit_id is not None:
+            self._write("UPDATE units SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                        (now + lease_sec, unit_id, worker))
+        self._write("UPDATE workers SET seen = ? WHERE worker = ?", (now, worker))
+
+    def complete(self, unit_id: int, worker: str, cards: List[Dict]) -> bool:
+        """Store the cards; False when the lease was lost to another worker."""
+        done = self._write("UPDATE units SET state = 'done', cards = ?, error = NULL WHERE id = ? AND worker = ?"
+                           " AND state = 'leased'", (json.dumps(cards, ensure_ascii=False), unit_id, worker))
+        self._write("UPDATE workers SET pages = pages + 1, seen = ? WHERE worker = ?", (time.time(), worker))
+        return bool(done)
+
+    def fail(self, unit_id: int, worker: str, reason: str, retry_after: float, max_attempts: int):
+        self._write("UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                    " not_before = ?, error = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                    (max_attempts, time.time() + retry_after, reason, unit_id, worker))
+
+    def close(self):
+        self.conn.close()
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps the current unit's lease alive while a slow page loads."""
+
+    def __init__(self, broker: Broker, worker: str, lease_sec: float):
+        super().__init__(daemon=True)
+        self.broker = broker
+        self.worker = worker
+        self.lease_sec = lease_sec
+        self.unit_id: Optional[int] = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lease_sec / 3):
+            self.broker.heartbeat(self.worker, self.unit_id, self.lease_sec)
+
+
+def run_worker(args):
+    configure_parser(args.parser)
+    configure_driver_pool(size=1, lean=args.lean)
+    configure_captcha(interactive=False)
+    configure_pacing(args.delay_sec, adaptive=args.pacing == "aimd")
+    configure_proxies(load_proxies(args.proxies) if args.proxies else None)
+    get_fetcher(args.fetch_mode)
+    configure_page_cache(not args.no_cache, root=args.cache_dir)
+    configure_session_store(not args.no_sessions, root=args.session_dir)
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    broker = Broker(args.broker)
+    broker.register(worker, args.job)
+    heartbeat = _Heartbeat(broker, worker, args.lease_sec)
+    heartbeat.start()
+    try:
+        while True:
+            unit = broker.lease(args.job, worker, args.lease_sec, args.max_attempts)
+            if unit is None:
+                if broker.job_closed(args.job):
+                    break
+                time.sleep(args.poll_sec)
+                continue
+            heartbeat.unit_id = unit["id"]
+            try:
+                cards = fetch_page_cards(unit["keyword"], unit["page"], unit["view"], extract=args.extract,
+                                         delay_sec=args.delay_sec, headless=not args.visible)
+            except ChallengeDetected as e:
+                # The pool recycled the challenged browser; back off before anyone retries the page
+                broker.fail(unit["id"], worker, e.reason, args.captcha_backoff * 2 ** (unit["attempts"] - 1),
+                            args.max_attempts)
+            except Exception as e:
+                broker.fail(unit["id"], worker, f"{type(e).__name__}: {e}", args.captcha_backoff, args.max_attempts)
+            else:
+                broker.complete(unit["id"], worker, cards)
+            finally:
+                heartbeat.unit_id = None
+            polite_sleep(args)
+    finally:
+        heartbeat.stopped.set()
+        shutdown_driver_pools()
+        broker.close()
+
+
+def worker_command(args, job: str, worker_id: str) -> List[str]:
+    cmd = [sys.executable, os.path.abspath(__file__), "worker", "--broker", args.broker, "--job", job,
+           "--worker-id", worker_id, "--parser", args.parser, "--fetch-mode", args.fetch_mode,
+           "--extract", args.extract, "--delay-sec", str(args.delay_sec), "--pacing", args.pacing,
+           "--cache-dir", args.cache_dir, "--session-dir", args.session_dir,
+           "--lease-sec", str(args.lease_sec), "--poll-sec", str(args.poll_sec),
+           "--captcha-backoff", str(args.captcha_backoff), "--max-attempts", str(args.max_attempts)]
+    if args.proxies:
+        cmd += ["--proxies", args.proxies]
+    for flag in ("lean", "visible", "no_cache", "no_sessions"):
+        if getattr(args, flag):
+            cmd.append("--" + flag.replace("_", "-"))
+    return cmd
+
+
+def coordinate(args):
+    target_pd_code = extract_pd_code(args.product_url)
+    keywords = [kw.strip() for kw in args.keywords.split(",") if kw.strip()]
+    views = [v.strip() for v in args.views.split(",") if v.strip()]
+    last_page = args.pages if args.pages > 0 else args.unbounded_cap
+    # Pages queued ahead of each keyword/view's ranked page, whether or not --pages is fixed
+    window = max(1, args.workers)
+    job = args.job or f"{target_pd_code}-{int(time.time())}"
+    console.print(f"[*] Fleet job {job}: pd_code={target_pd_code}, {len(keywords)} keyword(s) × {len(views)} view(s), "
+                  f"{args.workers} local worker(s)")
+
+    broker = Broker(args.broker)
+    broker.create_job(job)
+    streams = {(kw, view): {"keyword": kw, "view": view, "next": 1, "queued": 0, "rank_global": 0,
+                            "done": False, "pages": {}}
+               for kw in keywords for view in views}
+    results, excluded_counts, errors = [], {}, []
+    sink = ResultSink(args.csv, args.jsonl, strict_grid=args.strict_grid)
+    store = RankStore(args.history_db)
+
+    def top_up():
+        units = []
+        for s in streams.values():
+            if s["done"]:
+                continue
+            upto = min(last_page, s["next"] + window - 1)
+            units += [(s["keyword"], s["view"], page) for page in range(s["queued"] + 1, upto + 1)]
+            s["queued"] = max(s["queued"], upto)
+        if units:
+            broker.enqueue(job, units)
+
+    def finish(s):
+        s["done"] = True
+        broker.cancel(job, s["keyword"], s["view"], s["next"])
+
+    def advance(s):
+        # Rank strictly in page order; later pages wait in s["pages"]
+        while not s["done"] and s["next"] in s["pages"]:
+            page = s["next"]
+            unit = s["pages"].pop(page)
+            keyword = s["keyword"]
+            if unit["state"] == "failed":
+                errors.append(f"{keyword} / {s['view']}: gave up on page {page} ({unit['error']})")
+                finish(s)
+                break
+            cards = unit["cards"]
+            filtered = filter_cards(cards, args.strict_grid, args.ignore_sponsored)
+            position = find_target(filtered, target_pd_code)
+            page_url = build_search_url(keyword, page, ref=s["view"])
+            if position:
+                key = (keyword, s["view"], page)
+                excluded_counts[key] = len([c for c in cards if c["is_promoted"] or c["is_sponsored"]])
+                result = make_result(keyword, page, position, s["rank_global"] + position,
+                                     filtered[position - 1], page_url, target_pd_code, s["view"])
+                results.append(result)
+                sink.write_result(result, excluded_counts[key])
+                if not args.no_history:
+                    store.record(target_pd_code, keyword, s["view"], page, position, result["rank_global"],
+                                 result["promoted_html"], result["sponsored_html"])
+                finish(s)
+                break
+            s["rank_global"] += len(filtered)
+            sink.write_miss(keyword, s["view"], page, page_url, target_pd_code)
+            s["next"] += 1
+            if not cards or s["next"] > last_page:
+                finish(s)
+
+    if not args.workers:
+        console.print(f"[cyan]Waiting for external workers: python fleet.py worker --broker {args.broker} --job {job}")
+    processes = [subprocess.Popen(worker_command(args, job, f"{socket.gethostname()}-w{i + 1}"))
+                 for i in range(args.workers)]
+    started = time.monotonic()
+    try:
+        top_up()
+        while not all(s["done"] for s in streams.values()):
+            for unit in broker.collect(job):
+                s = streams[(unit["keyword"], unit["view"])]
+                if not s["done"]:
+                    s["pages"][unit["page"]] = unit
+                    advance(s)
+            top_up()
+            if processes and all(p.poll() is not None for p in processes):
+                errors.append("All local workers exited before the job finished")
+                break
+            if not processes and time.monotonic() - started > args.worker_wait_sec and not any(
+                    w["last_seen_sec"] < args.worker_wait_sec for w in broker.workers(job)):
+                errors.append(f"No worker has been active on job {job} for {args.worker_wait_sec:.0f}s "
+                              f"(--workers 0 needs workers started with: fleet.py worker --job {job})")
+                break
+            time.sleep(args.poll_sec)
+    finally:
+        broker.close_job(job)
+        for p in processes:
+            try:
+                p.wait(timeout=args.lease_sec)
+            except subprocess.TimeoutExpired:
+                p.terminate()
+        sink.close()
+        store.close()
+
+    console.print(f"[cyan]Fleet units: {broker.counts(job)} in {time.monotonic() - started:.1f}s")
+    for w in broker.workers(job):
+        console.print(f"[cyan]  {w['worker']} ({w['host']}, pid {w['pid']}): {w['pages']} pages")
+    for error in errors:
+        console.print(f"[red]{error}")
+    broker.close()
+    report_results(args, sorted(results, key=lambda r: (keywords.index(r["keyword"]), views.index(r["view"]))),
+                   excluded_counts)
+
+
+def add_worker_options(parser):
+    parser.add_argument("--broker", default=FLEET_BROKER_FILE, help="Fișierul SQLite folosit drept coadă de lucru")
+    parser.add_argument("--parser", choices=PARSER_BACKENDS, default="lxml", help="Backend de parsare")
+    parser.add_argument("--fetch-mode", choices=["auto", "http", "browser"], default="auto", help="auto = HTTP întâi, browser doar la nevoie")
+    parser.add_argument("--extract", choices=["html", "js"], default="html", help="js = extrage cardurile direct în browser")
+    parser.add_argument("--delay-sec", type=float, default=8.0, help="Întârziere inițială între request-urile fiecărui worker")
+    parser.add_argument("--pacing", choices=["aimd", "fixed"], default="aimd", help="aimd = pauza se adaptează la răspunsurile eMAG")
+    parser.add_argument("--proxies", help="Fișier cu proxy-uri (unul pe linie) sau listă separată prin virgulă")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Director pentru cache-ul paginilor de căutare")
+    parser.add_argument("--no-cache", action="store_true", help="Nu folosi cache-ul paginilor de căutare")
+    parser.add_argument("--session-dir", default=SESSION_DIR, help="Director cu sesiunile de browser, comun tuturor worker-ilor")
+    parser.add_argument("--no-sessions", action="store_true", help="Pornește fiecare browser cu un profil gol")
+    parser.add_argument("--lean", action="store_true", help="Profil Chrome minimal")
+    parser.add_argument("--visible", action="store_true", help="Rulează Chrome cu fereastră")
+    parser.add_argument("--lease-sec", type=float, default=FLEET_LEASE_SEC, help="Cât timp rămâne o pagină rezervată unui worker fără heartbeat")
+    parser.add_argument("--poll-sec", type=float, default=FLEET_POLL_SEC, help="Interval de verificare a cozii")
+    parser.add_argument("--captcha-backoff", type=float, default=60.0, help="Prima pauză înainte de reîncercarea unei pagini blocate")
+    parser.add_argument("--max-attempts", type=int, default=FLEET_MAX_ATTEMPTS, help="Încercări per pagină înainte de renunțare")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="eMAG Product Rank Finder - worker fleet")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Coordonator: împarte munca și pornește workerii locali")
+    run_parser.add_argument("--product-url", required=True, help="URL complet către pagina produsului eMAG")
+    run_parser.add_argument("--keywords", required=True, help="Listă de keyword-uri separate prin virgulă")
+    run_parser.add_argument("--views", default=DEFAULT_VIEW, help="Vizualizări (ref) separate prin virgulă")
+    run_parser.add_argument("--pages", type=int, default=0, help="Câte pagini să parcurgă pentru fiecare keyword")
+    run_parser.add_argument("--unbounded-cap", type=int, default=80, help="Limita maximă de pagini când --pages=0")
+    run_parser.add_argument("--strict-grid", action="store_true", help="Numără doar cardurile de produs reale")
+    run_parser.add_argument("--ignore-sponsored", action="store_true", help="Ignoră rezultatele Promovat/Sponsorizat")
+    run_parser.add_argument("--workers", type=int, default=2, help="Câți workeri locali să pornească (0 = doar workeri externi)")
+    run_parser.add_argument("--worker-wait-sec", type=float, default=FLEET_WORKER_WAIT_SEC,
+                            help="Cu --workers 0: renunță dacă niciun worker extern nu e activ atâtea secunde")
+    run_parser.add_argument("--job", help="Identificator job (implicit pd_code-timestamp)")
+    run_parser.add_argument("--csv", help="Cale fișier pentru export CSV")
+    run_parser.add_argument("--jsonl", help="Cale fișier pentru export JSONL")
+    run_parser.add_argument("--history-db", default=RANK_DB_FILE, help="Baza SQLite cu istoricul pozițiilor")
+    run_parser.add_argument("--no-history", action="store_true", help="Nu salva pozițiile găsite în istoric")
+    add_worker_options(run_parser)
+
+    worker_parser = sub.add_parser("worker", help="Worker: preia pagini din coadă și le descarcă")
+    worker_parser.add_argument("--job", required=True, help="Jobul din care preia pagini")
+    worker_parser.add_argument("--worker-id", help="Nume worker (implicit host-pid)")
+    add_worker_options(worker_parser)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        run_worker(args)
+    else:
+        coordinate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Background analysis jobs for emag-product-rank-finder
+"""Run long analyses off the Streamlit script thread.
+
+Streamlit reruns the whole script on every widget interaction, so an inline
+multi-minute scrape gets killed or restarted by any click. `JobRunner.submit`
+starts the analysis in a daemon thread and returns a job id. The app keeps
+that id in `st.session_state` and re-attaches to the job on every rerun.
+
+The job body never calls Streamlit. It appends result rows, log lines,
+errors and progress to its `Job`, and the app polls `Job.snapshot()` to
+render them. `cancel()` sets an event that `Job.check_cancelled()` and
+`Job.wait()` check, so a cancelled job stops before its next page or
+mid-sleep.
+"""
+import itertools
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from config import JOBS_KEEP_FINISHED
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, label: str, total: int = 0):
+        self.id = job_id
+        self.label = label
+        self.status = "queued"
+        self.total = total
+        self.done = 0
+        self.rows: List[Dict] = []
+        self.log: List[str] = []
+        self.errors: List[str] = []
+        self.notes: List[str] = []
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_row(self, row: Dict):
+        with self._lock:
+            self.rows.append(row)
+
+    def add_log(self, message: str):
+        with self._lock:
+            self.log.append(message)
+
+    def add_error(self, message: str):
+        with self._lock:
+            self.errors.append(message)
+
+    def add_note(self, message: str):
+        with self._lock:
+            self.notes.append(message)
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.total = total
+
+    def advance(self, n: int = 1):
+        with self._lock:
+            self.done += n
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def wait(self, seconds: float):
+        """time.sleep that returns early (raising JobCancelled) when the job is cancelled."""
+        if self._cancel.wait(seconds):
+            raise JobCancelled(self.id)
+
+    def snapshot(self) -> Dict:
+        """Consistent copy for rendering while the worker keeps appending."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "label": self.label,
+                "status": self.status,
+                "done": self.done,
+                "total": self.total,
+                "rows": list(self.rows),
+                "log": list(self.log),
+                "errors": list(self.errors),
+                "notes": list(self.notes),
+                "error": self.error,
+                "elapsed": (self.finished or time.time()) - self.created,
+            }
+
+
+class JobRunner:
+    """Process-wide registry of background jobs; survives Streamlit reruns and sessions."""
+
+    def __init__(self, keep_finished: int = JOBS_KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, label: str, target: Callable[[Job], None], total: int = 0) -> str:
+        with self._lock:
+            job_id = f"job-{int(time.time())}-{next(self._ids)}"
+            job = self._jobs[job_id] = Job(job_id, label, total)
+        threading.Thread(target=self._run, args=(job, target), name=job_id, daemon=True).start()
+        self.prune()
+        return job_id
+
+    def _run(self, job: Job, target: Callable[[Job], None]):
+        job.status = "running"
+        try:
+            target(job)
+            job.status = "cancelled" if job.cancelled else "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = f"{e.__class__.__name__}: {e}"
+            job.add_log(traceback.format_exc())
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or not job.running:
+            return False
+        job.cancel()
+        return True
+
+    def active(self) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.running]
+
+    def prune(self):
+        """Forget the oldest finished jobs beyond `keep_finished`."""
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values() if not job.running), key=lambda job: job.created)
+            for job in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[job.id]
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,85 @@
+# In-browser card extraction for emag-product-rank-finder
+"""Pull card data out of the live DOM with a single execute_script call.
+
+Instead of serializing the whole page through `driver.page_source` and
+re-parsing it in Python, the script below walks `#card_grid .card-item` in
+the page and returns one compact row per card:
+
+    [data-url, data-name, data-position, [visible badge texts], sponsored]
+
+`rows_to_cards` turns those rows into the same dicts the grid branch of
+`parse_cards` produces, so `filter_cards`/`find_target` use them unchanged.
+Like both parsers, it raises ValueError for a data-url without a /pd/ code
+and gives pd_code=None to a card without a data-url.
+The script returns null when there is no card grid; callers then fall back
+to the HTML path.
+"""
+from typing import Dict, List, Optional
+
+from fast_parser import PD_CODE_RE, PROMOTED_GRID_RE
+
+EXTRACT_CARDS_JS = r"""
+const grid = document.querySelector('div#card_grid');
+if (!grid) { return null; }
+const SPONSORED = /sponsored|sponsorizat|reclama/i;
+const SHOW = NodeFilter.SHOW_TEXT | NodeFilter.SHOW_COMMENT;
+function strings(root, fn) {
+  const walker = document.createTreeWalker(root, SHOW);
+  for (let n = walker.nextNode(); n; n = walker.nextNode()) {
+    if (fn(n) === true) { return true; }
+  }
+  return false;
+}
+const rows = [];
+for (const card of grid.querySelectorAll('div.card-item')) {
+  const badges = [];
+  for (const badge of card.querySelectorAll('span[class*="badge"], div[class*="badge"]')) {
+    let text = '';
+    strings(badge, n => {
+      const t = n.nodeValue.trim();
+      const parent = n.parentElement;
+      if (t && !(parent && parent.classList.contains('hidden'))) { text += t; }
+    });
+    badges.push(text);
+  }
+  const sponsored = strings(card, n => SPONSORED.test(n.nodeValue));
+  rows.push([
+    card.getAttribute('data-url'),
+    card.getAttribute('data-name'),
+    card.getAttribute('data-position'),
+    badges,
+    sponsored,
+  ]);
+}
+return rows;
+"""
+
+
+def rows_to_cards(rows: List[list]) -> List[Dict]:
+    cards = []
+    for i, (url_abs, title, position, badges, sponsored) in enumerate(rows):
+        match = PD_CODE_RE.search(url_abs) if url_abs else None
+        if url_abs and not match:
+            raise ValueError("Invalid product URL. Could not extract pd_code.")
+        try:
+            data_position = int(position if position is not None else "0")
+        except Exception:
+            data_position = None
+        cards.append({
+            "pd_code": match.group(1) if match else None,
+            "url_abs": url_abs,
+            "title": title,
+            "is_promoted": any(PROMOTED_GRID_RE.search(text) for text in badges),
+            "is_sponsored": bool(sponsored),
+            "idx_on_page": i + 1,
+            "data_position": data_position,
+        })
+    return cards
+
+
+def extract_cards(driver) -> Optional[List[Dict]]:
+    """Card dicts from the current page, or None when the page has no card grid."""
+    rows = driver.execute_script(EXTRACT_CARDS_JS)
+    if rows is None:
+        return None
+    return rows_to_cards(rows)
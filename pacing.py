@@ -0,0 +1,160 @@
+# Adaptive request pacing for emag-product-rank-finder
+"""AIMD pacing between page fetches, plus a circuit breaker for the whole run.
+
+`Pacer` replaces the fixed `--delay-sec + random.uniform(2, 6)` sleep.
+Every fetch reports how it went, and the pacer adjusts:
+
+* a fast page with cards subtracts `step` seconds from the delay (additive increase of the request rate);
+* a slow page multiplies the delay by `backoff` (multiplicative decrease);
+* an error multiplies it by `backoff`;
+* a page without a card grid multiplies it by sqrt(backoff), since the last page of a keyword is legitimately empty;
+* a CAPTCHA/block page multiplies it by backoff squared.
+
+The delay stays within [min_delay, max_delay], and each sleep gets
+±`jitter` so requests do not tick like a metronome.
+
+`CircuitBreaker` counts consecutive fetch failures (errors and challenges)
+across all threads. After `threshold` failures in a row it opens, and every
+fetch waits in `wait_ready()` until the cooldown has passed. Fetches after
+that are probes: a success closes the breaker, and a failure reopens it at
+once with a doubled cooldown. If it trips again after `max_trips` pauses
+with no success in between, `wait_ready()` raises `CircuitOpen`.
+"""
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import (BREAKER_COOLDOWN_SEC, BREAKER_FAILURES, BREAKER_MAX_COOLDOWN_SEC, BREAKER_MAX_TRIPS,
+                    PACING_BACKOFF, PACING_JITTER, PACING_MAX_DELAY_SEC, PACING_MIN_DELAY_SEC, PACING_SLOW_PAGE_SEC,
+                    PACING_STEP_SEC)
+
+OUTCOMES = ("ok", "empty", "error", "challenge")
+
+
+class CircuitOpen(RuntimeError):
+    """The breaker tripped too many times in a row; the site is not recovering."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_FAILURES, cooldown_sec: float = BREAKER_COOLDOWN_SEC,
+                 max_cooldown_sec: float = BREAKER_MAX_COOLDOWN_SEC, max_trips: int = BREAKER_MAX_TRIPS,
+                 sleep: Callable[[float], None] = time.sleep, notify: Callable[[str], None] = print):
+        self.threshold = threshold
+        self.cooldown_sec = cooldown_sec
+        self.max_cooldown_sec = max_cooldown_sec
+        self.max_trips = max_trips
+        self.sleep = sleep
+        self.notify = notify
+        self.failures = 0
+        self.trips = 0
+        self.total_trips = 0
+        self.open_until: Optional[float] = None
+        self.paused_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.open_until is None:
+                return "closed"
+            return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def wait_ready(self):
+        """Block while the breaker is open; raises CircuitOpen once it has given up."""
+        while True:
+            with self._lock:
+                if self.trips > self.max_trips:
+                    trips, self.trips, self.open_until = self.trips, 0, None
+                    # Whoever catches this decides what happens next; later fetches start from a closed breaker
+                    raise CircuitOpen(f"{trips} breaker trips without a successful fetch")
+                wait = self.open_until - time.monotonic() if self.open_until is not None else 0
+            if wait <= 0:
+                return
+            self.sleep(min(wait, 5.0))
+
+    def success(self):
+        with self._lock:
+            was_open = self.open_until is not None
+            self.failures = 0
+            self.trips = 0
+            self.open_until = None
+        if was_open:
+            self.notify("Circuit breaker closed: fetches are succeeding again")
+
+    def failure(self, reason: str):
+        with self._lock:
+            self.failures += 1
+            half_open = self.open_until is not None and time.monotonic() >= self.open_until
+            if self.failures < self.threshold and not half_open:
+                return
+            self.trips += 1
+            self.total_trips += 1
+            self.failures = 0
+            cooldown = min(self.max_cooldown_sec, self.cooldown_sec * 2 ** (self.trips - 1))
+            self.open_until = time.monotonic() + cooldown
+            self.paused_seconds += cooldown
+        self.notify(f"Circuit breaker open after repeated failures ({reason}); pausing all fetches for {cooldown:.0f}s")
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.total_trips,
+                "paused_seconds": round(self.paused_seconds, 1)}
+
+
+class Pacer:
+    def __init__(self, initial_delay: float, min_delay: float = PACING_MIN_DELAY_SEC,
+                 max_delay: float = PACING_MAX_DELAY_SEC, step: float = PACING_STEP_SEC,
+                 backoff: float = PACING_BACKOFF, slow_page_sec: float = PACING_SLOW_PAGE_SEC,
+                 jitter: float = PACING_JITTER, adaptive: bool = True,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self.delay = min(self.max_delay, max(min_delay, initial_delay))
+        self.initial_delay = initial_delay
+        self.step = step
+        self.backoff = backoff
+        self.slow_page_sec = slow_page_sec
+        self.jitter = jitter
+        self.adaptive = adaptive
+        self.breaker = breaker or CircuitBreaker()
+        self.counts = {outcome: 0 for outcome in OUTCOMES}
+        self.slow = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, outcome: str):
+        """Feed one fetch result ("ok", "empty", "error" or "challenge") and its latency."""
+        with self._lock:
+            self.counts[outcome] += 1
+            slow = seconds > self.slow_page_sec
+            self.slow += slow
+            if outcome == "challenge":
+                factor = self.backoff ** 2
+            elif outcome == "error" or slow:
+                factor = self.backoff
+            elif outcome == "empty":
+                factor = self.backoff ** 0.5
+            else:
+                factor = None
+            if factor:
+                self.delay = min(self.max_delay, self.delay * factor)
+            else:
+                self.delay = max(self.min_delay, self.delay - self.step)
+        if outcome in ("error", "challenge"):
+            self.breaker.failure(outcome)
+        else:
+            self.breaker.success()
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next page; the old fixed schedule when not adaptive."""
+        if not self.adaptive:
+            return self.initial_delay + random.uniform(2, 6)
+        with self._lock:
+            delay = self.delay
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = {"mode": "aimd" if self.adaptive else "fixed", "delay_sec": round(self.delay, 2),
+                      "slow_pages": self.slow, **self.counts}
+        report["breaker"] = self.breaker.stats()
+        return report
@@ -0,0 +1,128 @@
+# On-disk search-page cache for emag-product-rank-finder
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from config import CACHE_DIR, CACHE_TTL_SEC, CACHE_MAX_BYTES
+from utils import normalize_keyword
+
+_HEADER = struct.Struct("<d")  # write timestamp, used for the TTL check
+
+
+class PageCache:
+    """zlib-compressed search-page HTML keyed by (normalized keyword, page, view).
+
+    Entries expire `ttl_sec` after they were written. When the directory
+    grows past `max_bytes` the least recently used pages are evicted first.
+    The directory is walked once at startup, ordered by mtime, and after that
+    sizes and LRU order are kept in memory, so a write costs O(1) and not a
+    full walk. File mtime is still bumped on every hit, so the next process
+    starts from the same order.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, ttl_sec: float = CACHE_TTL_SEC,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".html.z"):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+        entries.sort()
+        with self._lock:
+            self._index = OrderedDict((full, size) for _, size, full in entries)
+            self._total = sum(self._index.values())
+
+    def _forget(self, path: str):
+        with self._lock:
+            self._total -= self._index.pop(path, 0)
+
+    @staticmethod
+    def key(keyword: str, page: int, view: str) -> str:
+        raw = f"{normalize_keyword(keyword)}\x00{int(page)}\x00{view}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".html.z")
+
+    def get(self, keyword: str, page: int, view: str) -> Optional[str]:
+        path = self._path(self.key(keyword, page, view))
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            (written,) = _HEADER.unpack_from(blob)
+            if time.time() - written > self.ttl_sec:
+                self._forget(path)
+                os.remove(path)
+                raise FileNotFoundError(path)
+            html = zlib.decompress(blob[_HEADER.size:]).decode("utf-8")
+            os.utime(path, None)
+        except (OSError, struct.error, zlib.error):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self._index:
+                self._index.move_to_end(path)
+        return html
+
+    def put(self, keyword: str, page: int, view: str, html: str):
+        path = self._path(self.key(keyword, page, view))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        blob = _HEADER.pack(time.time()) + zlib.compress(html.encode("utf-8"), 6)
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        with self._lock:
+            self._total += len(blob) - self._index.pop(path, 0)
+            self._index[path] = len(blob)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes or not self._index:
+                    return
+                full, size = self._index.popitem(last=False)
+                self._total -= size
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+    def clear(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".html.z"):
+                    os.remove(os.path.join(dirpath, name))
+        with self._lock:
+            self._index.clear()
+            self._total = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
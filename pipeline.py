@@ -0,0 +1,252 @@
+# Pipelined fetch -> parse -> rank for emag-product-rank-finder
+"""Overlap page fetching with HTML parsing.
+
+Three stages are connected by queues:
+
+* fetch: `fetch_workers` threads turn (keyword, view, page) units into HTML
+  and push it into a bounded queue. When the parsers fall behind, the
+  fetchers block instead of piling up pages.
+* parse: a dispatcher hands each page to a `ProcessPoolExecutor`, which runs
+  `parse_cards` and `filter_cards` off the main interpreter.
+* rank: the calling thread buffers parsed pages and ranks each keyword/view
+  strictly in page order, so `rank_global` is exact even when pages finish
+  out of order. It also feeds the next pages of a keyword (`window` ahead of
+  the ranked page) and drops the keyword once the target is found.
+
+`stats()` reports each stage's items, busy time, utilization and queue depth.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from captcha import ChallengeDetected
+from config import PIPELINE_PARSE_WORKERS, PIPELINE_QUEUE_SIZE
+from emag_rank import build_search_url, parse_cards, filter_cards
+
+_STOP = object()
+
+
+def parse_page(html: str, backend: Optional[str], strict_grid: bool, ignore_sponsored: bool) -> Dict:
+    """Parse stage body; runs in a worker process."""
+    started = time.perf_counter()
+    cards = parse_cards(html, backend)
+    return {
+        "cards": len(cards),
+        "filtered": filter_cards(cards, strict_grid, ignore_sponsored),
+        "excluded_count": len([c for c in cards if c["is_promoted"] or c["is_sponsored"]]),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.depth_sum = 0
+        self.depth_samples = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.items += 1
+            self.busy += seconds
+
+    def sample(self, depth: int):
+        with self._lock:
+            self.depth_sum += depth
+            self.depth_samples += 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def report(self, wall: float) -> Dict:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 2),
+            "utilization": round(self.busy / (wall * self.workers), 3) if wall else None,
+            "avg_queue_depth": round(self.depth_sum / self.depth_samples, 2) if self.depth_samples else 0,
+            "max_queue_depth": self.max_depth,
+        }
+
+
+class RankPipeline:
+    def __init__(self, fetch_html: Callable[[str, int, str], str], target_pd_code: str, last_page: int,
+                 strict_grid: bool, ignore_sponsored: bool, fetch_workers: int = 1,
+                 parse_workers: int = PIPELINE_PARSE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 window: Optional[int] = None, backend: Optional[str] = None,
+                 on_page: Optional[Callable[[str, str, int, int, List[Dict]], None]] = None,
+                 pause: Optional[Callable[[], None]] = None):
+        self.fetch_html = fetch_html
+        self.target_pd_code = target_pd_code
+        self.last_page = last_page
+        self.strict_grid = strict_grid
+        self.ignore_sponsored = ignore_sponsored
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(1, parse_workers)
+        self.queue_size = max(1, queue_size)
+        # One page parsing while the next ones download
+        self.window = window or self.fetch_workers + 1
+        self.backend = backend
+        self.on_page = on_page
+        self.pause = pause
+        self.stages = {
+            "fetch": StageStats("fetch", self.fetch_workers),
+            "parse": StageStats("parse", self.parse_workers),
+            "rank": StageStats("rank", 1),
+        }
+        self.wall_seconds = 0.0
+
+    def _fetcher(self, work_q: queue.Queue, parse_q: queue.Queue, rank_q: queue.Queue, streams: Dict):
+        while True:
+            unit = work_q.get()
+            if unit is _STOP:
+                return
+            if streams[unit[:2]]["done"]:
+                continue
+            started = time.perf_counter()
+            try:
+                keyword, view, page = unit
+                html = self.fetch_html(keyword, page, view)
+            except Exception as e:
+                # Challenges and errors skip parsing; the ranker handles them in page order
+                rank_q.put((unit, e))
+                continue
+            finally:
+                self.stages["fetch"].record(time.perf_counter() - started)
+            self.stages["parse"].sample(parse_q.qsize())
+            parse_q.put((unit, html))
+            if self.pause:
+                self.pause()
+
+    def _dispatcher(self, pool: ProcessPoolExecutor, parse_q: queue.Queue, rank_q: queue.Queue):
+        slots = threading.BoundedSemaphore(self.parse_workers)
+
+        def done(unit, future):
+            slots.release()
+            try:
+                parsed = future.result()
+            except Exception as e:
+                rank_q.put((unit, e))
+                return
+            self.stages["parse"].record(parsed["seconds"])
+            self.stages["rank"].sample(rank_q.qsize())
+            rank_q.put((unit, parsed))
+
+        while True:
+            item = parse_q.get()
+            if item is _STOP:
+                return
+            unit, html = item
+            slots.acquire()
+            future = pool.submit(parse_page, html, self.backend, self.strict_grid, self.ignore_sponsored)
+            future.add_done_callback(lambda f, unit=unit: done(unit, f))
+
+    def run(self, tasks: Sequence[Tuple]) -> List[Dict]:
+        """Rank every (keyword, view[, start_page, start_rank]) task; outcomes match CrawlScheduler's."""
+        streams: Dict[Tuple[str, str], Dict] = {}
+        for task in tasks:
+            keyword, view, start_page, start_rank = (tuple(task) + (1, 0))[:4]
+            streams[(keyword, view)] = {
+                "outcome": {"keyword": keyword, "view": view, "matches": [], "pages_fetched": 0, "challenged": None,
+                            "error": None},
+                "next": start_page, "queued": start_page - 1, "rank_global": start_rank, "done": False, "pages": {},
+            }
+        work_q: queue.Queue = queue.Queue()
+        parse_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        rank_q: queue.Queue = queue.Queue()
+        error: Optional[BaseException] = None
+
+        def feed(key):
+            s = streams[key]
+            upto = min(self.last_page, s["next"] + self.window - 1)
+            for page in range(s["queued"] + 1, upto + 1):
+                self.stages["fetch"].sample(work_q.qsize())
+                work_q.put(key + (page,))
+            s["queued"] = max(s["queued"], upto)
+
+        def finish(s):
+            s["done"] = True
+
+        started = time.monotonic()
+        pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        fetchers = [threading.Thread(target=self._fetcher, args=(work_q, parse_q, rank_q, streams), daemon=True)
+                    for _ in range(self.fetch_workers)]
+        dispatcher = threading.Thread(target=self._dispatcher, args=(pool, parse_q, rank_q), daemon=True)
+        for thread in fetchers + [dispatcher]:
+            thread.start()
+        try:
+            for key, s in streams.items():
+                if s["next"] > self.last_page:
+                    finish(s)
+                else:
+                    feed(key)
+            while not all(s["done"] for s in streams.values()):
+                unit, parsed = rank_q.get()
+                key, page = unit[:2], unit[2]
+                s = streams[key]
+                if s["done"]:
+                    continue
+                s["outcome"]["pages_fetched"] += 1
+                s["pages"][page] = parsed
+                ranked = time.perf_counter()
+                self._advance(key, s, finish)
+                self.stages["rank"].record(time.perf_counter() - ranked)
+                if not s["done"]:
+                    feed(key)
+        except BaseException as e:
+            error = e
+            for s in streams.values():
+                finish(s)
+        finally:
+            for _ in fetchers:
+                work_q.put(_STOP)
+            for thread in fetchers:
+                thread.join()
+            parse_q.put(_STOP)
+            dispatcher.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.wall_seconds += time.monotonic() - started
+        if error is not None:
+            raise error
+        return [s["outcome"] for s in streams.values()]
+
+    def _advance(self, key, s: Dict, finish: Callable):
+        keyword, view = key
+        outcome = s["outcome"]
+        while not s["done"] and s["next"] in s["pages"]:
+            page = s["next"]
+            parsed = s["pages"].pop(page)
+            if isinstance(parsed, ChallengeDetected):
+                outcome["challenged"] = {"page": page, "rank_global": s["rank_global"], "reason": parsed.reason}
+                finish(s)
+                return
+            if isinstance(parsed, BaseException):
+                raise parsed
+            matches = []
+            for position, card in enumerate(parsed["filtered"], start=1):
+                if card["pd_code"] == self.target_pd_code:
+                    matches.append({
+                        "page": page,
+                        "position_on_page": position,
+                        "rank_global": s["rank_global"] + position,
+                        "card": card,
+                        "page_url": build_search_url(keyword, page, ref=view),
+                        "excluded_count": parsed["excluded_count"],
+                    })
+                    break
+            outcome["matches"].extend(matches)
+            s["rank_global"] += len(parsed["filtered"])
+            s["next"] += 1
+            if self.on_page:
+                self.on_page(keyword, view, page, s["rank_global"], matches)
+            if matches or not parsed["cards"] or s["next"] > self.last_page:
+                finish(s)
+
+    def stats(self) -> Dict:
+        report = {name: stage.report(self.wall_seconds) for name, stage in self.stages.items()}
+        report["wall_seconds"] = round(self.wall_seconds, 2)
+        return report
@@ -0,0 +1,206 @@
+# Per-phase timing spans for emag-product-rank-finder
+"""Where does a run spend its time?
+
+`span(phase)` times one phase (browser start, navigation, readiness wait,
+page_source, parse, sleeps, ...) and records it under the current keyword.
+`keyword_scope(keyword)` sets that keyword for the spans of the current
+thread or task. Spans nest, so "fetch" includes the "navigate" and
+"ready_wait" spans of a browser fetch.
+
+`Profiler.summary()` aggregates each phase per run and per keyword into
+count/total/p50/p95/max. Memory stays bounded on long runs: count, total,
+max and the histogram buckets are running aggregates, and p50/p95 come
+from the most recent `PROFILE_SAMPLE_SIZE` spans of each keyword/phase. `to_json()` and `to_prometheus()` export that
+aggregation, and `print_table()` renders it with rich for the CLI.
+"""
+import contextlib
+import contextvars
+import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import PROFILE_BUCKETS, PROFILE_SAMPLE_SIZE
+
+_current_keyword: contextvars.ContextVar = contextvars.ContextVar("profile_keyword", default=None)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class PhaseStats:
+    """Running aggregates of one phase's spans plus a bounded window of recent ones."""
+
+    def __init__(self, sample_size: int = PROFILE_SAMPLE_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(PROFILE_BUCKETS)
+        self.recent: deque = deque(maxlen=sample_size)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(PROFILE_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.recent.append(seconds)
+
+    @classmethod
+    def merged(cls, parts: Iterable["PhaseStats"]) -> "PhaseStats":
+        parts = list(parts)
+        merged = cls(sample_size=sum(p.recent.maxlen for p in parts))
+        for part in parts:
+            merged.count += part.count
+            merged.total += part.total
+            merged.max = max(merged.max, part.max)
+            merged.buckets = [a + b for a, b in zip(merged.buckets, part.buckets)]
+            merged.recent.extend(part.recent)
+        return merged
+
+    def describe(self) -> Dict:
+        ordered = sorted(self.recent)
+        return {
+            "count": self.count,
+            "total": round(self.total, 4),
+            "p50": round(percentile(ordered, 50), 4),
+            "p95": round(percentile(ordered, 95), 4),
+            "max": round(self.max, 4),
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._spans: Dict[Optional[str], Dict[str, PhaseStats]] = defaultdict(lambda: defaultdict(PhaseStats))
+            self.started = time.monotonic()
+
+    def record(self, phase: str, seconds: float, keyword: Optional[str] = None):
+        if keyword is None:
+            keyword = _current_keyword.get()
+        with self._lock:
+            self._spans[keyword][phase].add(seconds)
+
+    @contextlib.contextmanager
+    def span(self, phase: str, keyword: Optional[str] = None) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started, keyword)
+
+    def _by_phase(self) -> Dict[str, PhaseStats]:
+        parts: Dict[str, List[PhaseStats]] = defaultdict(list)
+        for phases in self._spans.values():
+            for phase, stats in phases.items():
+                parts[phase].append(stats)
+        return {phase: PhaseStats.merged(stats) for phase, stats in parts.items()}
+
+    def summary(self) -> Dict:
+        """{"wall_seconds", "phases": {phase: stats}, "keywords": {keyword: {phase: stats}}}."""
+        with self._lock:
+            by_phase = self._by_phase()
+            keywords = {keyword: {phase: stats.describe() for phase, stats in phases.items()}
+                        for keyword, phases in self._spans.items() if keyword is not None}
+            wall = time.monotonic() - self.started
+        return {
+            "wall_seconds": round(wall, 2),
+            "phases": {phase: stats.describe() for phase, stats in sorted(by_phase.items())},
+            "keywords": keywords,
+        }
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.summary(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, path: Optional[str] = None) -> str:
+        """Prometheus text format: a per-phase histogram plus per-keyword p50/p95 summaries."""
+        with self._lock:
+            by_phase = self._by_phase()
+            keywords = {keyword: {phase: stats.describe() for phase, stats in phases.items()}
+                        for keyword, phases in self._spans.items() if keyword is not None}
+        lines = [
+            "# HELP emag_rank_phase_seconds Time spent per run phase.",
+            "# TYPE emag_rank_phase_seconds histogram",
+        ]
+        for phase, stats in sorted(by_phase.items()):
+            for bound, count in zip(PROFILE_BUCKETS, stats.buckets):
+                lines.append(f'emag_rank_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'emag_rank_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {stats.count}')
+            lines.append(f'emag_rank_phase_seconds_sum{{phase="{phase}"}} {stats.total:.6f}')
+            lines.append(f'emag_rank_phase_seconds_count{{phase="{phase}"}} {stats.count}')
+        lines += [
+            "# HELP emag_rank_phase_seconds_max Slowest single span per phase.",
+            "# TYPE emag_rank_phase_seconds_max gauge",
+        ]
+        for phase, stats in sorted(by_phase.items()):
+            lines.append(f'emag_rank_phase_seconds_max{{phase="{phase}"}} {stats.max:.6f}')
+        lines += [
+            "# HELP emag_rank_keyword_phase_seconds Time spent per keyword and phase.",
+            "# TYPE emag_rank_keyword_phase_seconds summary",
+        ]
+        for keyword, phases in sorted(keywords.items()):
+            label = keyword.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            for phase, stats in sorted(phases.items()):
+                labels = f'keyword="{label}",phase="{phase}"'
+                for q, key in ((0.5, "p50"), (0.95, "p95")):
+                    lines.append(f'emag_rank_keyword_phase_seconds{{{labels},quantile="{q}"}} {stats[key]:.6f}')
+                lines.append(f"emag_rank_keyword_phase_seconds_sum{{{labels}}} {stats['total']:.6f}")
+                lines.append(f"emag_rank_keyword_phase_seconds_count{{{labels}}} {stats['count']}")
+        text = "\n".join(lines) + "\n"
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def print_table(self, console, per_keyword: bool = False):
+        from rich.table import Table
+        summary = self.summary()
+        table = Table(title=f"Run profile ({summary['wall_seconds']}s wall, spans nest)")
+        for column in ("phase", "count", "total s", "p50 s", "p95 s", "max s"):
+            table.add_column(column, justify="left" if column == "phase" else "right")
+        for phase, stats in sorted(summary["phases"].items(), key=lambda item: -item[1]["total"]):
+            table.add_row(phase, str(stats["count"]), f"{stats['total']:.2f}", f"{stats['p50']:.3f}",
+                          f"{stats['p95']:.3f}", f"{stats['max']:.3f}")
+        console.print(table)
+        if per_keyword:
+            for keyword, phases in summary["keywords"].items():
+                slowest = sorted(phases.items(), key=lambda item: -item[1]["total"])[:3]
+                console.print(f"[cyan]{keyword}:[/cyan] " + ", ".join(
+                    f"{phase} {stats['total']:.1f}s (p95 {stats['p95']:.2f}s)" for phase, stats in slowest))
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    return _profiler
+
+
+def span(phase: str, keyword: Optional[str] = None):
+    return _profiler.span(phase, keyword)
+
+
+@contextlib.contextmanager
+def keyword_scope(keyword: Optional[str]) -> Iterator[None]:
+    """Attribute the spans opened inside this block (same thread/task) to `keyword`."""
+    token = _current_keyword.set(keyword)
+    try:
+        yield
+    finally:
+        _current_keyword.reset(token)
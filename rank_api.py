@@ -0,0 +1,349 @@
+# HTTP rank API for emag-product-rank-finder
+"""Ranks on demand over HTTP for other tools.
+
+    python rank_api.py --port 8765
+    curl 'http://127.0.0.1:8765/rank?product_url=https://www.emag.ro/.../pd/DPN7K9MBM/&keyword=core300s'
+
+Endpoints (all JSON):
+
+* GET /rank: product_url or pd_code, keyword, plus optional pages, view,
+  strict_grid and ignore_sponsored. POST /rank takes the same fields as a
+  JSON body.
+* GET /page: keyword, page, view; the parsed cards of one search page.
+* GET /stats and GET /health.
+
+Two layers keep eMAG traffic down when many callers ask at once.
+`SingleFlight` runs one fetch per (keyword, page, view) and the concurrent
+callers for the same page wait for it. Fetches run on a shared pool of
+`--upstream` threads whatever the number of callers, and a request that is
+not answered within `--request-timeout` gets a 504 while its fetch finishes
+in the background. `TTLCache` keeps the parsed cards, so looking up another
+pd_code on an already fetched SERP only costs a filter_cards/find_target
+pass. Point `--base-url` (or EMAG_BASE_URL) at a
+local stand-in to run the service without touching eMAG.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from captcha import ChallengeDetected
+from config import (API_CACHE_MAX_PAGES, API_DEFAULT_PAGES, API_HOST, API_MAX_UPSTREAM_FETCHES, API_PAGE_TTL_SEC,
+                    API_PORT, API_REQUEST_TIMEOUT_SEC, CACHE_DIR)
+from emag_rank import (DEFAULT_VIEW, PARSER_BACKENDS, build_search_url, configure_base_url, configure_driver_pool,
+                       configure_page_cache, configure_parser, configure_proxies, configure_session_store, console,
+                       extract_pd_code,
+                       fetch_search_page, filter_cards, find_target, get_fetcher, get_proxy_pool, parse_cards,
+                       shutdown_driver_pools)
+from proxy_pool import load_proxies
+from utils import normalize_keyword
+
+
+class SingleFlight:
+    """Run `fn` once per key at a time on a shared executor; concurrent callers share its result.
+
+    The executor's worker count is the limit on upstream fetches in flight.
+    A caller that stops waiting after `timeout` leaves the call running, so
+    its result still reaches the cache for the next caller.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self.executor = executor
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def _forget(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], object], timeout: Optional[float] = None) -> Tuple[object, bool]:
+        """(result, shared): `shared` is True when another caller's call produced the result.
+
+        Raises TimeoutError when the call is not done within `timeout` seconds.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = self.executor.submit(fn)
+            else:
+                self.shared += 1
+        if leader:
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return future.result(timeout), not leader
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, ttl_sec: float = API_PAGE_TTL_SEC, max_entries: int = API_CACHE_MAX_PAGES):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"pages": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RankService:
+    def __init__(self, fetch_html: Optional[Callable[[str, int, str], str]] = None,
+                 ttl_sec: float = API_PAGE_TTL_SEC, max_pages: int = API_CACHE_MAX_PAGES,
+                 default_pages: int = API_DEFAULT_PAGES, max_upstream: int = API_MAX_UPSTREAM_FETCHES,
+                 request_timeout: float = API_REQUEST_TIMEOUT_SEC):
+        self.fetch_html = fetch_html or (lambda keyword, page, view: fetch_search_page(keyword, page, view))
+        self.pages = TTLCache(ttl_sec, max_pages)
+        # Upstream fetches (and their paced retries) run here, never in the handler threads
+        self.upstream = ThreadPoolExecutor(max_workers=max(1, max_upstream), thread_name_prefix="rank-api-fetch")
+        self.flight = SingleFlight(self.upstream)
+        self.default_pages = default_pages
+        self.request_timeout = request_timeout
+        self.fetches = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def page_cards(self, keyword: str, page: int, view: str = DEFAULT_VIEW,
+                   timeout: Optional[float] = None) -> Tuple[List[Dict], str]:
+        """Parsed cards for one SERP page and where they came from: "cache", "shared" or "fetch".
+
+        Raises TimeoutError when the page is not ready within `timeout`
+        seconds (default: the request timeout); the fetch keeps going and
+        fills the cache.
+        """
+        key = (normalize_keyword(keyword), page, view)
+        cards = self.pages.get(key)
+        if cards is not None:
+            return cards, "cache"
+
+        def load():
+            html = self.fetch_html(keyword, page, view)
+            with self._lock:
+                self.fetches += 1
+            parsed = parse_cards(html)
+            self.pages.put(key, parsed)
+            return parsed
+
+        try:
+            cards, shared = self.flight.do(key, load, self.request_timeout if timeout is None else timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"search page {page} for {keyword!r} not ready within the request timeout") from None
+        return cards, "shared" if shared else "fetch"
+
+    def rank(self, pd_code: str, keyword: str, pages: Optional[int] = None, view: str = DEFAULT_VIEW,
+             strict_grid: bool = True, ignore_sponsored: bool = False) -> Dict:
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.request_timeout
+        last_page = pages or self.default_pages
+        rank_global = 0
+        sources = []
+        result = {"pd_code": pd_code, "keyword": keyword, "view": view, "found": False}
+        for page in range(1, last_page + 1):
+            cards, source = self.page_cards(keyword, page, view, timeout=max(0.0, deadline - time.monotonic()))
+            sources.append(source)
+            filtered = filter_cards(cards, strict_grid, ignore_sponsored)
+            position = find_target(filtered, pd_code)
+            if position:
+                card = filtered[position - 1]
+                result.update({
+                    "found": True,
+                    "page": page,
+                    "position_on_page": position,
+                    "rank_global": rank_global + position,
+                    "title": card["title"],
+                    "result_url": card["url_abs"],
+                    "promoted": card["is_promoted"],
+                    "sponsored": card["is_sponsored"],
+                    "page_url": build_search_url(keyword, page, ref=view),
+                })
+                break
+            rank_global += len(filtered)
+            if not cards:
+                break
+        result["pages_checked"] = len(sources)
+        result["page_sources"] = sources
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def stats(self) -> Dict:
+        proxies = get_proxy_pool()
+        return {"fetches": self.fetches, "coalesced": self.flight.shared, "timeouts": self.timeouts,
+                "page_cache": self.pages.stats(), "proxies": proxies.stats() if proxies is not None else None}
+
+    def close(self):
+        self.upstream.shutdown(wait=False, cancel_futures=True)
+
+
+def _flag(value, default: bool) -> bool:
+    if value is None:
+        return default
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def rank_request(service: RankService, params: Dict) -> Dict:
+    """Validate /rank parameters (query string or JSON body) and run the lookup."""
+    keyword = (params.get("keyword") or "").strip()
+    if not keyword:
+        raise ValueError("keyword is required")
+    if params.get("pd_code"):
+        pd_code = params["pd_code"]
+    elif params.get("product_url"):
+        pd_code = extract_pd_code(params["product_url"])
+    else:
+        raise ValueError("product_url or pd_code is required")
+    pages = int(params["pages"]) if params.get("pages") not in (None, "") else None
+    if pages is not None and not 1 <= pages <= 80:
+        raise ValueError("pages must be between 1 and 80")
+    return service.rank(pd_code, keyword, pages, params.get("view") or DEFAULT_VIEW,
+                        _flag(params.get("strict_grid"), True), _flag(params.get("ignore_sponsored"), False))
+
+
+class RankHandler(BaseHTTPRequestHandler):
+    service: RankService = None
+
+    def _send(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, path: str, params: Dict):
+        try:
+            if path == "/rank":
+                self._send(200, rank_request(self.service, params))
+            elif path == "/page":
+                keyword = (params.get("keyword") or "").strip()
+                if not keyword:
+                    raise ValueError("keyword is required")
+                cards, source = self.service.page_cards(keyword, int(params.get("page") or 1),
+                                                        params.get("view") or DEFAULT_VIEW)
+                self._send(200, {"keyword": keyword, "source": source, "cards": cards})
+            elif path == "/stats":
+                self._send(200, self.service.stats())
+            elif path == "/health":
+                self._send(200, {"ok": True})
+            else:
+                self._send(404, {"error": f"unknown endpoint {path}"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except ChallengeDetected as e:
+            self._send(503, {"error": "challenge", "reason": e.reason, "url": e.url})
+        except TimeoutError as e:
+            self._send(504, {"error": str(e)})
+        except RuntimeError as e:
+            self._send(502, {"error": str(e)})
+        except Exception as e:
+            # Anything else is a bug or an unexpected page; the caller still gets JSON instead of a dropped connection
+            console.print(f"[red]API {path} failed: {type(e).__name__}: {e}")
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        self._dispatch(url.path, params)
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "body must be a JSON object"})
+            return
+        if not isinstance(params, dict):
+            self._send(400, {"error": "body must be a JSON object"})
+            return
+        self._dispatch(url.path, params)
+
+    def log_message(self, format, *args):
+        console.print(f"[debug] API {self.address_string()} {format % args}")
+
+
+class RankServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of callers for the same keyword arrive together; the default backlog of 5 drops SYNs
+    request_queue_size = 128
+
+
+def make_server(service: RankService, host: str = API_HOST, port: int = API_PORT) -> ThreadingHTTPServer:
+    handler = type("BoundRankHandler", (RankHandler,), {"service": service})
+    server = RankServer((host, port), handler)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="eMAG Product Rank Finder - API HTTP pentru poziții")
+    parser.add_argument("--host", default=API_HOST, help="Adresa pe care ascultă serverul")
+    parser.add_argument("--port", type=int, default=API_PORT, help="Portul serverului")
+    parser.add_argument("--base-url", help="Altă adresă pentru eMAG (ex. un server local de test)")
+    parser.add_argument("--pages", type=int, default=API_DEFAULT_PAGES, help="Câte pagini se caută implicit per keyword")
+    parser.add_argument("--ttl", type=float, default=API_PAGE_TTL_SEC, help="Cât timp (secunde) rămân paginile parsate în memorie")
+    parser.add_argument("--upstream", type=int, default=API_MAX_UPSTREAM_FETCHES, help="Câte pagini se descarcă simultan de pe eMAG, pentru toate cererile")
+    parser.add_argument("--request-timeout", type=float, default=API_REQUEST_TIMEOUT_SEC, help="Timpul maxim (secunde) al unei cereri; descărcarea continuă în fundal și umple cache-ul")
+    parser.add_argument("--max-pages", type=int, default=API_CACHE_MAX_PAGES, help="Câte pagini parsate se țin în memorie")
+    parser.add_argument("--parser", choices=PARSER_BACKENDS, default="lxml", help="Backend de parsare")
+    parser.add_argument("--fetch-mode", choices=["auto", "http", "browser"], default="auto", help="auto = HTTP întâi, browser doar la nevoie")
+    parser.add_argument("--pool-size", type=int, default=1, help="Câte browsere Chrome să țină deschise")
+    parser.add_argument("--lean", action="store_true", help="Profil Chrome minimal")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Director pentru cache-ul paginilor de căutare")
+    parser.add_argument("--no-cache", action="store_true", help="Nu folosi cache-ul de pe disc al paginilor")
+    parser.add_argument("--proxies", help="Fișier cu proxy-uri (unul pe linie) sau listă separată prin virgulă")
+    parser.add_argument("--no-sessions", action="store_true", help="Pornește fiecare browser cu un profil gol")
+    args = parser.parse_args()
+
+    if args.base_url:
+        configure_base_url(args.base_url)
+    configure_parser(args.parser)
+    configure_proxies(load_proxies(args.proxies) if args.proxies else None)
+    configure_driver_pool(size=args.pool_size, lean=args.lean)
+    get_fetcher(args.fetch_mode)
+    configure_page_cache(not args.no_cache, root=args.cache_dir)
+    configure_session_store(not args.no_sessions)
+    service = RankService(ttl_sec=args.ttl, max_pages=args.max_pages, default_pages=args.pages,
+                          max_upstream=args.upstream, request_timeout=args.request_timeout)
+    server = make_server(service, args.host, args.port)
+    console.print(f"[green]Rank API on http://{args.host}:{server.server_port} "
+                  f"(search pages from {build_search_url('KEYWORD', 1)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        shutdown_driver_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# SQLite rank history store for emag-product-rank-finder
+"""Append-only rank history in one SQLite file.
+
+Every observed rank is a row in `rank_history`; rows are buffered and written
+in batches with `executemany` inside one transaction. Queries go through the
+(pd_code, keyword, ts) index and aggregate in SQL, so charting months of
+history only moves the bucketed points into pandas.
+
+The store also keeps the per-page card counts (and the product codes on each
+page) used by warm start, so it can be passed to `warm_start_search` as its
+`memory`.
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from config import RANK_DB_FILE, RANK_DB_BATCH_SIZE, PAGE_COUNT_TTL_SEC
+from utils import normalize_keyword
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rank_history (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    pd_code TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    view TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    rank_global INTEGER NOT NULL,
+    promoted INTEGER NOT NULL DEFAULT 0,
+    sponsored INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_rank_history_pd_kw_ts ON rank_history (pd_code, keyword, ts);
+CREATE TABLE IF NOT EXISTS page_counts (
+    keyword TEXT NOT NULL,
+    view TEXT NOT NULL,
+    filters TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    pd_codes TEXT,
+    PRIMARY KEY (keyword, view, filters, page)
+);
+"""
+
+_INSERT_RANK = ("INSERT INTO rank_history (ts, pd_code, keyword, view, page, position, rank_global, promoted, sponsored)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_UPSERT_COUNT = ("INSERT OR REPLACE INTO page_counts (keyword, view, filters, page, count, ts, pd_codes)"
+                 " VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+class RankStore:
+    """Batched writer and indexed reader over the rank history database."""
+
+    def __init__(self, path: str = RANK_DB_FILE, batch_size: int = RANK_DB_BATCH_SIZE,
+                 count_ttl_sec: float = PAGE_COUNT_TTL_SEC):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.count_ttl_sec = count_ttl_sec
+        # Streamlit reruns the script on other threads; one connection guarded by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if "pd_codes" not in {row[1] for row in self.conn.execute("PRAGMA table_info(page_counts)")}:
+            # Databases from before the codes were kept; their rows read back as unknown
+            self.conn.execute("ALTER TABLE page_counts ADD COLUMN pd_codes TEXT")
+        self._lock = threading.Lock()
+        self._ranks: List[tuple] = []
+        self._counts: Dict[tuple, tuple] = {}
+
+    # -- writes ---------------------------------------------------------
+
+    def record(self, pd_code: str, keyword: str, view: str, page: int, position: int, rank_global: int,
+               promoted: bool = False, sponsored: bool = False, ts: Optional[float] = None):
+        """Buffer one observed rank; written when the batch fills or on flush()."""
+        row = (ts if ts is not None else time.time(), pd_code, normalize_keyword(keyword), view,
+               int(page), int(position), int(rank_global), int(bool(promoted)), int(bool(sponsored)))
+        with self._lock:
+            self._ranks.append(row)
+            full = len(self._ranks) >= self.batch_size
+        if full:
+            self.flush()
+
+    def record_many(self, rows: Iterable[Dict]):
+        """Buffer dicts with the `record` keyword arguments."""
+        for row in rows:
+            self.record(**row)
+
+    def flush(self):
+        with self._lock:
+            ranks, self._ranks = self._ranks, []
+            counts, self._counts = list(self._counts.values()), {}
+            if not ranks and not counts:
+                return
+            with self.conn:
+                self.conn.executemany(_INSERT_RANK, ranks)
+                self.conn.executemany(_UPSERT_COUNT, counts)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # -- warm-start memory ----------------------------------------------
+
+    def last_page(self, pd_code: str, keyword: str, view: str) -> Optional[int]:
+        latest = self.latest(pd_code, keyword=keyword, view=view)
+        return latest[0]["page"] if latest else None
+
+    def _page_row(self, keyword: str, view: str, filters: str, page: int) -> Optional[tuple]:
+        key = (normalize_keyword(keyword), view, filters, page)
+        with self._lock:
+            row = self._counts.get(key)
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT keyword, view, filters, page, count, ts, pd_codes FROM page_counts"
+                    " WHERE keyword = ? AND view = ? AND filters = ? AND page = ?", key).fetchone()
+        if row and time.time() - row[5] <= self.count_ttl_sec:
+            return row
+        return None
+
+    def page_count(self, keyword: str, view: str, filters: str, page: int) -> Optional[int]:
+        row = self._page_row(keyword, view, filters, page)
+        return row[4] if row else None
+
+    def page_codes(self, keyword: str, view: str, filters: str, page: int) -> Optional[Set[str]]:
+        """pd_codes of the counted cards on a page, or None when not cached (or cached without them)."""
+        row = self._page_row(keyword, view, filters, page)
+        return set(row[6].split()) if row and row[6] is not None else None
+
+    def record_page_count(self, keyword: str, view: str, filters: str, page: int, count: int,
+                          pd_codes: Optional[Sequence[str]] = None):
+        key = (normalize_keyword(keyword), view, filters, page)
+        codes = None if pd_codes is None else " ".join(sorted(set(pd_codes)))
+        with self._lock:
+            self._counts[key] = key + (count, time.time(), codes)
+
+    # -- queries --------------------------------------------------------
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def history(self, pd_code: str, keyword: Optional[str] = None, view: Optional[str] = None,
+                since: Optional[float] = None, until: Optional[float] = None) -> List[Dict]:
+        """Raw rows for one product in [since, until], oldest first."""
+        sql = "SELECT ts, keyword, view, page, position, rank_global, promoted, sponsored FROM rank_history WHERE pd_code = ?"
+        params = [pd_code]
+        if keyword is not None:
+            sql += " AND keyword = ?"
+            params.append(normalize_keyword(keyword))
+        if view is not None:
+            sql += " AND view = ?"
+            params.append(view)
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            params.append(until)
+        return self._query(sql + " ORDER BY ts", tuple(params))
+
+    def series(self, pd_code: str, since: Optional[float] = None, until: Optional[float] = None,
+               bucket_sec: int = 86400) -> List[Dict]:
+        """Best (lowest) global rank per keyword/view per time bucket, aggregated in SQL."""
+        sql = ("SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, keyword, view, MIN(rank_global) AS rank_global,"
+               " COUNT(*) AS samples FROM rank_history WHERE pd_code = ?")
+        params = [bucket_sec, bucket_sec, pd_code]
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            params.append(until)
+        return self._query(sql + " GROUP BY bucket, keyword, view ORDER BY bucket", tuple(params))
+
+    def latest(self, pd_code: Optional[str] = None, keyword: Optional[str] = None,
+               view: Optional[str] = None) -> List[Dict]:
+        """Most recent row per (pd_code, keyword, view)."""
+        # SQLite returns the bare columns of the row holding MAX(ts)
+        sql = ("SELECT pd_code, keyword, view, MAX(ts) AS ts, page, position, rank_global, promoted, sponsored"
+               " FROM rank_history")
+        clauses, params = [], []
+        if pd_code is not None:
+            clauses.append("pd_code = ?")
+            params.append(pd_code)
+        if keyword is not None:
+            clauses.append("keyword = ?")
+            params.append(normalize_keyword(keyword))
+        if view is not None:
+            clauses.append("view = ?")
+            params.append(view)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._query(sql + " GROUP BY pd_code, keyword, view ORDER BY pd_code, keyword, view", tuple(params))
+
+    def products(self) -> List[str]:
+        return [row["pd_code"] for row in self._query("SELECT DISTINCT pd_code FROM rank_history ORDER BY pd_code", ())]
+
+
+_default_store: Optional[RankStore] = None
+
+
+def get_rank_store(path: str = RANK_DB_FILE) -> RankStore:
+    """Process-wide store, so the Streamlit app keeps one connection across reruns."""
+    global _default_store
+    if _default_store is None or _default_store.path != path:
+        _default_store = RankStore(path)
+    return _default_store
@@ -0,0 +1,75 @@
+# Page readiness detection for emag-product-rank-finder
+"""Decide when a search page is done loading, instead of sleeping fixed amounts.
+
+`wait_until_ready` scrolls the page in viewport-sized steps (which is what
+eMAG's lazy loaders react to) and polls a small in-page probe. A page counts
+as ready once it has been scrolled to the bottom, the DOM has been quiet for
+`quiet_ms` (tracked by a MutationObserver), and the card, badge and network
+resource counts have stopped changing. A timeout caps the wait either way.
+"""
+import time
+from typing import Dict
+
+from config import READY_TIMEOUT_SEC
+
+BADGE_SELECTOR = ".card-v2-badge-cmp, .badge, .card-v2-badge"
+CARD_SELECTOR = ".card-item, .card-v2, .product-card, .product-container"
+
+INSTALL_OBSERVER_JS = """
+if (!window.__rankReady) {
+  const state = {mutations: 0, last: performance.now()};
+  new MutationObserver(records => {
+    state.mutations += records.length;
+    state.last = performance.now();
+  }).observe(document.documentElement, {childList: true, subtree: true, characterData: true, attributes: true});
+  window.__rankReady = state;
+}
+window.__rankReady.last = performance.now();
+"""
+
+PROBE_JS = """
+const state = window.__rankReady || {mutations: 0, last: performance.now()};
+const doc = document.scrollingElement || document.documentElement;
+return {
+  readyState: document.readyState,
+  cards: document.querySelectorAll(arguments[0]).length,
+  badges: document.querySelectorAll(arguments[1]).length,
+  resources: performance.getEntriesByType('resource').length,
+  quietMs: performance.now() - state.last,
+  atBottom: window.scrollY + window.innerHeight >= doc.scrollHeight - 2,
+};
+"""
+
+SCROLL_STEP_JS = "window.scrollBy(0, window.innerHeight);"
+
+
+def wait_until_ready(driver, timeout: float = READY_TIMEOUT_SEC, poll: float = 0.15,
+                     quiet_ms: float = 400, stable_polls: int = 3) -> Dict:
+    """Scroll and poll until the page settles; returns timing and count details."""
+    started = time.monotonic()
+    driver.execute_script(INSTALL_OBSERVER_JS)
+    previous = None
+    stable = 0
+    steps = 0
+    probe = {}
+    timed_out = True
+    while time.monotonic() - started < timeout:
+        probe = driver.execute_script(PROBE_JS, CARD_SELECTOR, BADGE_SELECTOR)
+        counts = (probe["cards"], probe["badges"], probe["resources"])
+        stable = stable + 1 if counts == previous else 0
+        previous = counts
+        if not probe["atBottom"]:
+            driver.execute_script(SCROLL_STEP_JS)
+            steps += 1
+        elif (probe["readyState"] != "loading" and probe["quietMs"] >= quiet_ms
+              and stable >= stable_polls):
+            timed_out = False
+            break
+        time.sleep(poll)
+    return {
+        "seconds": time.monotonic() - started,
+        "cards": probe.get("cards", 0),
+        "badges": probe.get("badges", 0),
+        "scroll_steps": steps,
+        "timed_out": timed_out,
+    }
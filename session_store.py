@@ -0,0 +1,207 @@
+# Persistent browser sessions for emag-product-rank-finder
+"""Keep warm browser sessions across drivers, runs and fleet workers.
+
+A fresh Chrome profile goes through consent banners and bot scoring on its
+first pages, and a challenge solved in one browser used to be thrown away
+with `driver.quit()`. `SessionStore` saves the cookies and localStorage of
+a browser under its identity, the (user agent, proxy) pair it was launched
+with. It writes one JSON file per identity, so every process that shares
+the directory shares the sessions. The proxy is stored and keyed by its
+label (scheme://host:port), so proxy credentials never reach the disk.
+
+* `checkout(proxy, user_agents)` picks the identity for a new driver: the
+  warmest saved session for that proxy (solved challenges first, then the
+  most recently saved), else a random user agent with no saved state.
+* `restore(driver, identity)` loads the saved cookies with
+  `Network.setCookies` before the first navigation. It also registers a
+  small script that puts localStorage back on the first eMAG document, so
+  restoring costs no extra page load.
+* `page_done(driver)` saves the session after the first clean page and then
+  every `save_every` pages. `save(driver, solved=True)` saves it right after
+  a solved challenge.
+* `retire(driver)` deletes a challenged session and keeps its user
+  agent off that proxy for a while, so the replacement browser starts under
+  another identity.
+"""
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from config import SESSION_DIR, SESSION_MAX_AGE_SEC, SESSION_SAVE_EVERY_PAGES
+from proxy_pool import proxy_label
+
+LOCAL_STORAGE_JS = "return {origin: location.origin, items: Object.assign({}, window.localStorage)};"
+
+# Runs before the page's own scripts; restores once per tab so later removals by the site stick
+RESTORE_LOCAL_STORAGE_JS = """
+(function (origin, items) {
+  if (location.origin !== origin) return;
+  try {
+    if (sessionStorage.getItem('__rank_session_restored')) return;
+    for (const [key, value] of Object.entries(items)) {
+      if (localStorage.getItem(key) === null) localStorage.setItem(key, value);
+    }
+    sessionStorage.setItem('__rank_session_restored', '1');
+  } catch (e) {}
+})(%s, %s);
+"""
+
+
+class Identity(NamedTuple):
+    user_agent: str
+    proxy: Optional[str]  # proxy_label() of the proxy, without credentials
+
+    @property
+    def key(self) -> str:
+        raw = f"{self.user_agent}\x00{self.proxy or ''}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _cdp_cookie(cookie: Dict) -> Dict:
+    """Selenium get_cookies() entry -> Network.setCookies CookieParam."""
+    param = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+             if key in cookie}
+    if "expiry" in cookie:
+        param["expires"] = cookie["expiry"]
+    return param
+
+
+class SessionStore:
+    def __init__(self, root: str = SESSION_DIR, max_age_sec: float = SESSION_MAX_AGE_SEC,
+                 save_every: int = SESSION_SAVE_EVERY_PAGES, retire_sec: float = SESSION_MAX_AGE_SEC):
+        self.root = root
+        self.max_age_sec = max_age_sec
+        self.save_every = max(1, int(save_every))
+        self.retire_sec = retire_sec
+        self._retired: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.counts = {"warm": 0, "fresh": 0, "saved": 0, "retired": 0}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, identity: Identity) -> str:
+        return os.path.join(self.root, identity.key + ".json")
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def load(self, identity: Identity) -> Optional[Dict]:
+        path = self._path(identity)
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - state.get("saved", 0) > self.max_age_sec:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return state
+
+    def sessions(self, proxy: Optional[str] = None) -> List[Dict]:
+        """Saved, unexpired sessions for `proxy`, warmest first."""
+        proxy = proxy_label(proxy) if proxy else None
+        found = []
+        now = time.time()
+        for path in glob.glob(os.path.join(self.root, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if state.get("proxy") == proxy and now - state.get("saved", 0) <= self.max_age_sec:
+                found.append(state)
+        found.sort(key=lambda state: (state.get("solved", 0), state.get("saved", 0)), reverse=True)
+        return found
+
+    def checkout(self, proxy: Optional[str], user_agents: Sequence[str]) -> Identity:
+        """Identity for a new driver on `proxy`: a warm saved session if there is one."""
+        proxy = proxy_label(proxy) if proxy else None
+        now = time.time()
+        with self._lock:
+            retired = {key for key, until in self._retired.items() if until > now}
+        for state in self.sessions(proxy):
+            identity = Identity(state["user_agent"], proxy)
+            if identity.key not in retired:
+                self._count("warm")
+                return identity
+        candidates = [ua for ua in user_agents if Identity(ua, proxy).key not in retired] or list(user_agents)
+        self._count("fresh")
+        return Identity(random.choice(candidates), proxy)
+
+    def restore(self, driver, identity: Identity) -> bool:
+        """Load the saved cookies and localStorage into a driver that has not navigated yet."""
+        driver.session_identity = identity
+        driver.session_pages = 0
+        driver.session_saved = False
+        state = self.load(identity)
+        if state is None:
+            return False
+        now = time.time()
+        cookies = [_cdp_cookie(c) for c in state.get("cookies", []) if c.get("expiry", now + 1) > now]
+        if cookies:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        if state.get("local_storage") and state.get("origin"):
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+                "source": RESTORE_LOCAL_STORAGE_JS % (json.dumps(state["origin"]), json.dumps(state["local_storage"])),
+            })
+        return True
+
+    def save(self, driver, solved: bool = False):
+        """Write the driver's cookies and localStorage under its identity."""
+        identity: Optional[Identity] = getattr(driver, "session_identity", None)
+        if identity is None:
+            return
+        previous = self.load(identity) or {}
+        storage = driver.execute_script(LOCAL_STORAGE_JS)
+        state = {
+            "user_agent": identity.user_agent,
+            "proxy": identity.proxy,
+            "origin": storage["origin"],
+            "cookies": driver.get_cookies(),
+            "local_storage": storage["items"],
+            "saved": time.time(),
+            "pages": previous.get("pages", 0) + driver.session_pages,
+            "solved": previous.get("solved", 0) + int(solved),
+        }
+        driver.session_pages = 0
+        path = self._path(identity)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._count("saved")
+
+    def page_done(self, driver):
+        """Count a clean page; save after the first one and then every `save_every` pages."""
+        if getattr(driver, "session_identity", None) is None:
+            return
+        driver.session_pages += 1
+        if not driver.session_saved or driver.session_pages >= self.save_every:
+            driver.session_saved = True
+            self.save(driver)
+
+    def retire(self, driver):
+        """Drop a challenged session so the replacement browser starts under another identity."""
+        identity: Optional[Identity] = getattr(driver, "session_identity", None)
+        if identity is None:
+            return
+        driver.session_identity = None
+        try:
+            os.remove(self._path(identity))
+        except OSError:
+            pass
+        with self._lock:
+            self._retired[identity.key] = time.time() + self.retire_sec
+        self._count("retired")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,144 @@
+# Streaming result sink and sweep checkpoint for emag-product-rank-finder
+"""Write outcomes as they happen so a crash or Ctrl-C loses at most one page.
+
+`ResultSink` appends every found rank and every "not found on page N" outcome
+to the --csv / --jsonl files, flushed line by line. `Checkpoint` is an
+append-only JSONL log of finished keyword pages; `--resume` replays it and
+restarts each keyword after its last finished page with the running global
+rank, and skips keywords that are already done.
+"""
+import csv
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+CSV_FIELDS = [
+    "keyword", "view", "page", "position_on_page", "rank_global", "result_title", "result_url", "page_url", "pd_code",
+    "promoted_html", "sponsored_html", "position_margin_error", "rank_margin_error", "excluded_count", "status",
+]
+
+
+def get_margin(strict_grid: bool, position_on_page: int) -> int:
+    filtered_count = max(position_on_page, 1)
+    if strict_grid:
+        return 1
+    return max(2, int(0.05 * filtered_count))
+
+
+class ResultSink:
+    def __init__(self, csv_path: Optional[str] = None, jsonl_path: Optional[str] = None,
+                 strict_grid: bool = False, append: bool = False):
+        self.strict_grid = strict_grid
+        self._csv_file = self._jsonl_file = self._writer = None
+        mode = "a" if append else "w"
+        if csv_path:
+            write_header = not (append and os.path.exists(csv_path) and os.path.getsize(csv_path))
+            self._csv_file = open(csv_path, mode, newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._csv_file, fieldnames=CSV_FIELDS)
+            if write_header:
+                self._writer.writeheader()
+        if jsonl_path:
+            self._jsonl_file = open(jsonl_path, mode, encoding="utf-8")
+
+    def _write(self, row: Dict):
+        if self._writer is not None:
+            self._writer.writerow(row)
+            self._csv_file.flush()
+        if self._jsonl_file is not None:
+            self._jsonl_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._jsonl_file.flush()
+
+    def write_result(self, result: Dict, excluded_count: int):
+        margin = get_margin(self.strict_grid, result["position_on_page"])
+        row = dict(result)
+        row["position_margin_error"] = f"{result['position_on_page']} ±{margin}"
+        row["rank_margin_error"] = f"{result['rank_global']} ±{margin}"
+        row["excluded_count"] = excluded_count
+        row["status"] = "found"
+        self._write(row)
+
+    def write_miss(self, keyword: str, view: str, page: int, page_url: str, pd_code: str):
+        self._write({"keyword": keyword, "view": view, "page": page, "page_url": page_url, "pd_code": pd_code, "status": "not_found"})
+
+    def close(self):
+        for f in (self._csv_file, self._jsonl_file):
+            if f is not None:
+                f.close()
+
+
+class CheckpointMismatch(ValueError):
+    """The checkpoint file was written by a run with other settings."""
+
+
+class Checkpoint:
+    """Append-only log of finished (keyword, page) units for --resume.
+
+    A last line cut short by a crash mid-write is dropped (with a `notify`
+    warning) when resuming; that page is simply fetched again.
+    """
+
+    def __init__(self, path: str, run_key: Dict, resume: bool = False, notify: Callable[[str], None] = print):
+        self.path = path
+        self.state: Dict[str, Dict] = {}
+        if resume and os.path.exists(path):
+            lines = self._replay(path, notify)
+            if lines and lines[0].get("run") != run_key:
+                raise CheckpointMismatch(f"Checkpoint {path} was written for a different run: {lines[0].get('run')}")
+            for event in lines[1:]:
+                entry = self.state.setdefault(event["keyword"], {"page": 1, "rank_global": 0, "done": False})
+                if event.get("done"):
+                    entry["done"] = True
+                else:
+                    entry["page"] = event["page"] + 1
+                    entry["rank_global"] = event["rank_global"]
+            self._file = open(path, "a", encoding="utf-8")
+            if not lines:
+                self._log({"run": run_key})
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._log({"run": run_key})
+
+    @staticmethod
+    def _replay(path: str, notify: Callable[[str], None]) -> List[Dict]:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        rows = text.split("\n")
+        events = []
+        for i, row in enumerate(rows):
+            if not row.strip():
+                continue
+            try:
+                events.append(json.loads(row))
+            except ValueError:
+                if i < len(rows) - 1 and any(r.strip() for r in rows[i + 1:]):
+                    raise
+                notify(f"Checkpoint {path}: skipping a truncated last line ({row[:80]!r})")
+                text = "\n".join(rows[:i])
+        if text and not text.endswith("\n"):
+            text += "\n"
+        if text != "\n".join(rows):
+            # New events must start on a line of their own
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return events
+
+    def _log(self, event: Dict):
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def pending(self, keyword: str) -> Optional[Dict]:
+        """{"page", "rank_global"} to continue from, or None if the keyword is finished."""
+        entry = self.state.get(keyword, {"page": 1, "rank_global": 0, "done": False})
+        if entry["done"]:
+            return None
+        return {"page": entry["page"], "rank_global": entry["rank_global"]}
+
+    def page_done(self, keyword: str, page: int, rank_global: int):
+        """Page finished without a match; `rank_global` counts the cards up to and including it."""
+        self._log({"keyword": keyword, "page": page, "rank_global": rank_global})
+
+    def keyword_done(self, keyword: str):
+        self._log({"keyword": keyword, "done": True})
+
+    def close(self):
+        self._file.close()
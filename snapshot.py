@@ -0,0 +1,349 @@
+# Full-SERP snapshots for emag-product-rank-finder
+"""Keep every card of every crawled page in a compact columnar store.
+
+A snapshot is a directory of Parquet segments:
+
+* `cards-NNNNN.parquet`: one row per card with keyword, view, page,
+  idx_on_page, data_position, an int32 product id and the promoted/sponsored
+  flags. Keyword and view are dictionary-encoded by Parquet.
+* `pages-NNNNN.parquet`: one row per fetched page, including empty ones, so
+  the end of the results is known offline.
+* `products-NNNNN.parquet`: the interned products (pd_code, URL slug, title)
+  first seen in that segment. Card URLs are rebuilt from pd_code and slug
+  instead of being stored per card.
+
+The writer flushes a segment every `row_group` cards, so memory stays bounded
+by one segment plus the product dictionary, and a crash loses at most the
+current segment. `SnapshotReader.rank()` answers any product's rank for a
+keyword from the stored pages, with the same filtering as a live crawl.
+
+Needs pyarrow (installed with streamlit).
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = ds = pq = None
+
+from config import SNAPSHOT_DIR, SNAPSHOT_ROW_GROUP, CACHE_DIR, CRAWL_RATE_PER_SEC
+from emag_rank import (
+    console, extract_pd_code, fetch_page_cards, filter_cards, find_target, configure_parser, configure_driver_pool,
+    configure_page_cache, get_fetcher, shutdown_driver_pools, PARSER_BACKENDS, DEFAULT_VIEW,
+)
+
+_PRODUCT_URL_RE = re.compile(r"^https?://www\.emag\.ro/(.+?)/pd/([A-Za-z0-9]+)/")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Snapshots need pyarrow: pip install pyarrow")
+
+
+def _schemas():
+    cards = pa.schema([
+        ("keyword", pa.dictionary(pa.int32(), pa.string())),
+        ("view", pa.dictionary(pa.int8(), pa.string())),
+        ("page", pa.int16()),
+        ("idx_on_page", pa.int16()),
+        # Null for list-view and no-grid pages, whose cards carry no data-position
+        pa.field("data_position", pa.int32(), nullable=True),
+        ("product", pa.int32()),
+        ("promoted", pa.bool_()),
+        ("sponsored", pa.bool_()),
+    ])
+    pages = pa.schema([("keyword", pa.string()), ("view", pa.string()), ("page", pa.int16()), ("cards", pa.int16())])
+    products = pa.schema([("product", pa.int32()), ("pd_code", pa.string()), ("slug", pa.string()), ("title", pa.string())])
+    return cards, pages, products
+
+
+def url_slug(url_abs: Optional[str], pd_code: str) -> str:
+    """Path part before /pd/; a non-canonical URL is kept whole."""
+    match = _PRODUCT_URL_RE.match(url_abs or "")
+    if match and match.group(2) == pd_code:
+        return match.group(1)
+    return url_abs or ""
+
+
+def product_url(pd_code: str, slug: str) -> str:
+    if not pd_code or slug.startswith("http") or not slug:
+        return slug
+    return f"https://www.emag.ro/{slug}/pd/{pd_code}/"
+
+
+class SnapshotWriter:
+    def __init__(self, root: str = SNAPSHOT_DIR, snapshot_id: Optional[str] = None,
+                 row_group: int = SNAPSHOT_ROW_GROUP, meta: Optional[Dict] = None):
+        _require_pyarrow()
+        self.snapshot_id = snapshot_id or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(root, self.snapshot_id)
+        os.makedirs(self.path, exist_ok=True)
+        self.row_group = max(1, row_group)
+        self.meta = dict(meta or {}, id=self.snapshot_id, created=datetime.datetime.now().isoformat(timespec="seconds"))
+        self._card_schema, self._page_schema, self._product_schema = _schemas()
+        self._lock = threading.Lock()
+        self._products: Dict[str, int] = {}
+        self._new_products: List[tuple] = []
+        self._cards = {name: [] for name in self._card_schema.names}
+        self._pages = {name: [] for name in self._page_schema.names}
+        self._segment = 0
+        self.totals = {"pages": 0, "cards": 0}
+
+    def _intern(self, card: Dict) -> int:
+        pd_code = card["pd_code"] or ""
+        product = self._products.get(pd_code)
+        if product is None:
+            product = self._products[pd_code] = len(self._products)
+            self._new_products.append((product, pd_code, url_slug(card["url_abs"], pd_code), card["title"] or ""))
+        return product
+
+    def add_page(self, keyword: str, view: str, page: int, cards: List[Dict]):
+        """Record one fetched page (thread-safe; empty pages mark the end of results)."""
+        with self._lock:
+            self._pages["keyword"].append(keyword)
+            self._pages["view"].append(view)
+            self._pages["page"].append(page)
+            self._pages["cards"].append(len(cards))
+            for card in cards:
+                self._cards["keyword"].append(keyword)
+                self._cards["view"].append(view)
+                self._cards["page"].append(page)
+                self._cards["idx_on_page"].append(card["idx_on_page"])
+                self._cards["data_position"].append(card.get("data_position"))
+                self._cards["product"].append(self._intern(card))
+                self._cards["promoted"].append(bool(card["is_promoted"]))
+                self._cards["sponsored"].append(bool(card["is_sponsored"]))
+            self.totals["pages"] += 1
+            self.totals["cards"] += len(cards)
+            if len(self._cards["product"]) >= self.row_group:
+                self._flush()
+
+    def _flush(self):
+        if not self._pages["page"]:
+            return
+        self._segment += 1
+        name = f"{self._segment:05d}.parquet"
+        pq.write_table(pa.Table.from_pydict(self._cards, schema=self._card_schema),
+                       os.path.join(self.path, "cards-" + name), compression="zstd")
+        pq.write_table(pa.Table.from_pydict(self._pages, schema=self._page_schema),
+                       os.path.join(self.path, "pages-" + name), compression="zstd")
+        if self._new_products:
+            columns = list(zip(*self._new_products))
+            pq.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=self._product_schema),
+                           os.path.join(self.path, "products-" + name), compression="zstd")
+        self._new_products = []
+        self._cards = {name: [] for name in self._card_schema.names}
+        self._pages = {name: [] for name in self._page_schema.names}
+
+    def close(self, **extra_meta) -> str:
+        with self._lock:
+            self._flush()
+            self.meta.update(extra_meta, segments=self._segment, products=len(self._products), **self.totals)
+            with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        return self.path
+
+
+class SnapshotReader:
+    def __init__(self, path: str):
+        _require_pyarrow()
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        self.meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        # Product dictionary, indexed by the int32 id stored on each card
+        products = self._read("products")
+        rows = products.to_pylist() if products is not None else []
+        self.pd_codes = [""] * len(rows)
+        self.slugs = [""] * len(rows)
+        self.titles = [""] * len(rows)
+        for row in rows:
+            self.pd_codes[row["product"]] = row["pd_code"]
+            self.slugs[row["product"]] = row["slug"]
+            self.titles[row["product"]] = row["title"]
+
+    def _dataset(self, kind: str):
+        files = sorted(glob.glob(os.path.join(self.path, f"{kind}-*.parquet")))
+        return ds.dataset(files, format="parquet") if files else None
+
+    def _read(self, kind: str, filter=None):
+        dataset = self._dataset(kind)
+        return dataset.to_table(filter=filter) if dataset is not None else None
+
+    def keywords(self) -> List[tuple]:
+        pages = self._read("pages")
+        if pages is None:
+            return []
+        return sorted(set(zip(pages.column("keyword").to_pylist(), pages.column("view").to_pylist())))
+
+    def pages_table(self):
+        """All fetched pages (keyword, view, page, cards) as a pyarrow Table."""
+        return self._read("pages")
+
+    def cards_table(self, columns: Optional[Sequence[str]] = None):
+        """All card rows as a pyarrow Table (product ids, not pd_codes)."""
+        dataset = self._dataset("cards")
+        return dataset.to_table(columns=columns) if dataset is not None else None
+
+    def page_cards(self, keyword: str, view: str = DEFAULT_VIEW) -> Dict[int, List[Dict]]:
+        """Stored pages of one keyword/view as live-crawl card dicts, up to the first empty page."""
+        where = (ds.field("keyword") == keyword) & (ds.field("view") == view)
+        pages = self._read("pages", where)
+        cards = self._read("cards", where)
+        fetched = sorted(set(pages.column("page").to_pylist())) if pages is not None else []
+        result = {page: [] for page in fetched}
+        if cards is not None:
+            for row in cards.to_pylist():
+                product = row["product"]
+                result[row["page"]].append({
+                    "pd_code": self.pd_codes[product] or None,
+                    "url_abs": product_url(self.pd_codes[product], self.slugs[product]),
+                    "title": self.titles[product],
+                    "is_promoted": row["promoted"],
+                    "is_sponsored": row["sponsored"],
+                    "idx_on_page": row["idx_on_page"],
+                    "data_position": row["data_position"],
+                })
+        return result
+
+    def rank(self, pd_code: str, keyword: str, view: str = DEFAULT_VIEW, strict_grid: bool = False,
+             ignore_sponsored: bool = False) -> Optional[Dict]:
+        """The product's rank in this snapshot; None if absent or a page before it is missing."""
+        pages = self.page_cards(keyword, view)
+        rank_global = 0
+        page = 1
+        while page in pages:
+            cards = pages[page]
+            filtered = filter_cards(cards, strict_grid, ignore_sponsored)
+            position = find_target(filtered, pd_code)
+            if position:
+                return {"keyword": keyword, "view": view, "page": page, "position_on_page": position,
+                        "rank_global": rank_global + position, "card": filtered[position - 1]}
+            if not cards:
+                break
+            rank_global += len(filtered)
+            page += 1
+        return None
+
+
+def list_snapshots(root: str = SNAPSHOT_DIR) -> List[Dict]:
+    snapshots = []
+    for meta_path in sorted(glob.glob(os.path.join(root, "*", "meta.json"))):
+        with open(meta_path, encoding="utf-8") as f:
+            snapshots.append(dict(json.load(f), path=os.path.dirname(meta_path)))
+    return snapshots
+
+
+def capture(args) -> str:
+    """Crawl every page of every keyword/view (no early stop) into a new snapshot."""
+    from crawler import CrawlScheduler
+    configure_parser(args.parser)
+    configure_driver_pool(lean=args.lean)
+    fetcher = get_fetcher(args.fetch_mode)
+    configure_page_cache(not args.no_cache, root=args.cache_dir)
+    keywords = [kw.strip() for kw in args.keywords.split(",") if kw.strip()]
+    views = [v.strip() for v in args.views.split(",") if v.strip()]
+    writer = SnapshotWriter(args.out, args.id, meta={"keywords": keywords, "views": views})
+
+    def fetch_cards(keyword, page, view):
+        cards = fetch_page_cards(keyword, page, view, extract=args.extract, delay_sec=args.delay_sec,
+                                 headless=not args.visible)
+        writer.add_page(keyword, view, page, cards)
+        return cards
+
+    scheduler = CrawlScheduler(fetch_cards, rate=args.rate, max_in_flight=args.concurrency)
+    incomplete = []
+    try:
+        # "-" is never a pd_code, so every keyword runs to its last page
+        outcomes = scheduler.run([(kw, view) for kw in keywords for view in views], "-",
+                                 args.pages, args.unbounded_cap, False, False, stop_on_match=False)
+        for outcome in outcomes:
+            if outcome["challenged"]:
+                incomplete.append({"keyword": outcome["keyword"], "view": outcome["view"],
+                                   "page": outcome["challenged"]["page"], "reason": outcome["challenged"]["reason"]})
+                console.print(f"[red]Challenge for {outcome['keyword']!r} / {outcome['view']} on page "
+                              f"{outcome['challenged']['page']}; snapshot stops there for this keyword")
+            elif outcome["error"]:
+                incomplete.append({"keyword": outcome["keyword"], "view": outcome["view"],
+                                   "page": outcome["error"]["page"], "reason": outcome["error"]["reason"]})
+                console.print(f"[red]Error for {outcome['keyword']!r} / {outcome['view']} on page "
+                              f"{outcome['error']['page']} ({outcome['error']['reason']}); snapshot stops there for this keyword")
+    finally:
+        path = writer.close(incomplete=incomplete)
+        console.print(f"[cyan]Fetch tiers: {fetcher.report()}")
+        shutdown_driver_pools()
+    console.print(f"[green]Snapshot {writer.snapshot_id}: {writer.totals['pages']} pages, "
+                  f"{writer.totals['cards']} cards, {writer.meta['products']} products -> {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="eMAG Product Rank Finder - snapshot-uri complete ale rezultatelor")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cap = sub.add_parser("capture", help="Salvează toate cardurile din toate paginile")
+    cap.add_argument("--keywords", required=True, help="Listă de keyword-uri separate prin virgulă")
+    cap.add_argument("--views", default=DEFAULT_VIEW, help="Vizualizări (ref) separate prin virgulă")
+    cap.add_argument("--pages", type=int, default=0, help="Câte pagini per keyword (0 = până la ultima)")
+    cap.add_argument("--unbounded-cap", type=int, default=80, help="Limita maximă de pagini când --pages=0")
+    cap.add_argument("--out", default=SNAPSHOT_DIR, help="Director pentru snapshot-uri")
+    cap.add_argument("--id", help="Identificator snapshot (implicit data și ora)")
+    cap.add_argument("--parser", choices=PARSER_BACKENDS, default="lxml", help="Backend de parsare")
+    cap.add_argument("--fetch-mode", choices=["auto", "http", "browser"], default="auto", help="auto = HTTP întâi, browser doar la nevoie")
+    cap.add_argument("--extract", choices=["html", "js"], default="html", help="js = extrage cardurile direct în browser")
+    cap.add_argument("--delay-sec", type=float, default=8.0, help="Întârziere pentru încărcarea paginii în browser")
+    cap.add_argument("--cache-dir", default=CACHE_DIR, help="Director pentru cache-ul paginilor de căutare")
+    cap.add_argument("--no-cache", action="store_true", help="Nu folosi cache-ul paginilor de căutare")
+    cap.add_argument("--lean", action="store_true", help="Profil Chrome minimal")
+    cap.add_argument("--visible", action="store_true", help="Rulează Chrome cu fereastră")
+    cap.add_argument("--concurrency", type=int, default=1, help="Request-uri simultane către eMAG")
+    cap.add_argument("--rate", type=float, default=CRAWL_RATE_PER_SEC, help="Request-uri pe secundă")
+
+    rank = sub.add_parser("rank", help="Poziția unui produs într-un snapshot, fără acces la rețea")
+    rank.add_argument("--snapshot", required=True, help="Directorul snapshot-ului")
+    target = rank.add_mutually_exclusive_group(required=True)
+    target.add_argument("--product-url", help="URL complet către pagina produsului eMAG")
+    target.add_argument("--pd-code", help="Codul produsului (după /pd/)")
+    rank.add_argument("--keywords", help="Keyword-uri separate prin virgulă (implicit toate din snapshot)")
+    rank.add_argument("--strict-grid", action="store_true", help="Numără doar cardurile de produs reale")
+    rank.add_argument("--ignore-sponsored", action="store_true", help="Ignoră rezultatele Promovat/Sponsorizat")
+
+    sub.add_parser("list", help="Listează snapshot-urile salvate").add_argument("--out", default=SNAPSHOT_DIR)
+
+    args = parser.parse_args()
+    if args.command == "capture":
+        capture(args)
+    elif args.command == "list":
+        for meta in list_snapshots(args.out):
+            console.print(f"{meta['id']}: {meta.get('pages')} pages, {meta.get('cards')} cards, "
+                          f"{meta.get('products')} products, keywords={meta.get('keywords')}")
+    else:
+        reader = SnapshotReader(args.snapshot)
+        pd_code = args.pd_code or extract_pd_code(args.product_url)
+        if args.keywords:
+            wanted = {kw.strip() for kw in args.keywords.split(",") if kw.strip()}
+            pairs = [(kw, view) for kw, view in reader.keywords() if kw in wanted]
+        else:
+            pairs = reader.keywords()
+        for keyword, view in pairs:
+            found = reader.rank(pd_code, keyword, view, args.strict_grid, args.ignore_sponsored)
+            if found:
+                console.print(f"[green]{keyword}[/green] / {view}: page {found['page']}, "
+                              f"position {found['position_on_page']}, global rank {found['rank_global']}")
+            else:
+                console.print(f"[yellow]{keyword}[/yellow] / {view}: not in snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Shared test setup for emag-product-rank-finder
+import http.client
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Saved eMAG search pages used as parser fixtures
+SEARCH_PAGE = os.path.join(ROOT, "debug_emag_search_page.html")
+
+
+def read_page(path: str = SEARCH_PAGE) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class StandIn(ThreadingHTTPServer):
+    """Local stand-in for eMAG search: `page_html(page)` answers `?page=N`, after `delay` seconds.
+
+    Records the pages served and the peak number of requests handled at once.
+    """
+    daemon_threads = True
+
+    def __init__(self, page_html: Callable[[int], str], delay: float = 0.05):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.page_html = page_html
+        self.delay = delay
+        self.served: List[int] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("page", ["1"])[0])
+        server = self.server
+        with server.lock:
+            server.served.append(page)
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            body = server.page_html(page).encode("utf-8")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ForwardingProxy(ThreadingHTTPServer):
+    """Local plain-HTTP forward proxy; answers `fail_status` instead of forwarding when it is set."""
+    daemon_threads = True
+
+    def __init__(self, fail_status: Optional[int] = None):
+        super().__init__(("127.0.0.1", 0), _ForwardingHandler)
+        self.fail_status = fail_status
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class _ForwardingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.fail_status:
+            self.send_error(server.fail_status)
+            return
+        # Proxied requests carry the absolute URL in the request line
+        target = urllib.parse.urlsplit(self.path)
+        upstream = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+        try:
+            upstream.request("GET", target.path + ("?" + target.query if target.query else ""))
+            response = upstream.getresponse()
+            body = response.read()
+        finally:
+            upstream.close()
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.getheader("Content-Type", "text/html"))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,128 @@
+import time
+import urllib.parse
+
+import pytest
+import requests
+
+from conftest import StandIn, read_page
+
+from crawler import CrawlScheduler
+from emag_rank import console, filter_cards, parse_cards
+
+console.quiet = True
+
+TARGET = "DPN7K9MBM"
+TARGET_PAGE = 3
+LAST_PAGE = 6
+SEARCH_HTML = read_page()
+PER_PAGE = len(filter_cards(parse_cards(SEARCH_HTML), True, True))
+
+
+def canned_page(page: int) -> str:
+    """The saved search page as pages 1..LAST_PAGE; TARGET only appears on TARGET_PAGE."""
+    if page > LAST_PAGE:
+        return "<html><body>Nu am gasit rezultate</body></html>"
+    if page == TARGET_PAGE:
+        return SEARCH_HTML
+    return SEARCH_HTML.replace(TARGET, "DOTHER0000")
+
+
+@pytest.fixture
+def stand_in():
+    with StandIn(canned_page) as server:
+        yield server
+
+
+def make_scheduler(server: StandIn, **kwargs) -> CrawlScheduler:
+    def url_builder(keyword: str, page: int, ref: str = "") -> str:
+        return f"{server.base_url}/search/{urllib.parse.quote(keyword)}?ref={ref}&page={page}"
+
+    def fetch_cards(keyword: str, page: int, view: str):
+        response = requests.get(url_builder(keyword, page, ref=view), timeout=10)
+        response.raise_for_status()
+        return parse_cards(response.text)
+
+    return CrawlScheduler(fetch_cards, url_builder=url_builder, **kwargs)
+
+
+def test_exact_rank_and_early_stop(stand_in):
+    scheduler = make_scheduler(stand_in, rate=50, burst=2, max_in_flight=2)
+    [outcome] = scheduler.run([("casti", "grid")], TARGET, pages=0, cap=50, strict_grid=True, ignore_sponsored=True)
+
+    [match] = outcome["matches"]
+    assert (match["page"], match["position_on_page"]) == (TARGET_PAGE, 1)
+    assert match["rank_global"] == (TARGET_PAGE - 1) * PER_PAGE + 1
+    # Nothing is queued beyond one window ahead of the page that matched
+    assert max(stand_in.served) <= TARGET_PAGE + scheduler.max_in_flight - 1
+    assert scheduler.requests <= TARGET_PAGE + scheduler.max_in_flight - 1
+    assert outcome["challenged"] is None
+
+
+def test_in_flight_cap_per_host(stand_in):
+    scheduler = make_scheduler(stand_in, rate=100, burst=3, max_in_flight=3)
+    scheduler.run([("casti", "grid"), ("boxe", "grid")], "NOTHERE", pages=LAST_PAGE, cap=50,
+                  strict_grid=True, ignore_sponsored=True)
+
+    assert sorted(stand_in.served) == sorted(list(range(1, LAST_PAGE + 1)) * 2)
+    assert scheduler.stats()["peak_in_flight"] == {"127.0.0.1": 3}
+    assert stand_in.peak_in_flight <= 3
+
+
+def test_token_bucket_paces_requests(stand_in):
+    stand_in.delay = 0
+    scheduler = make_scheduler(stand_in, rate=20, burst=1, max_in_flight=4)
+    started = time.monotonic()
+    scheduler.run([("casti", "grid")], "NOTHERE", pages=5, cap=50, strict_grid=True, ignore_sponsored=True)
+
+    assert scheduler.requests == 5
+    # One token up front, then one every 1/rate seconds
+    assert time.monotonic() - started >= 4 / 20 - 0.01
+
+
+def test_stops_at_the_first_empty_page(stand_in):
+    scheduler = make_scheduler(stand_in, rate=100, burst=2, max_in_flight=2)
+    ranked = []
+    scheduler.on_page = lambda keyword, view, page, rank_global, matches: ranked.append((page, rank_global))
+    [outcome] = scheduler.run([("casti", "grid")], "NOTHERE", pages=0, cap=50,
+                              strict_grid=True, ignore_sponsored=True)
+
+    assert outcome["matches"] == []
+    assert ranked == [(page, min(page, LAST_PAGE) * PER_PAGE) for page in range(1, LAST_PAGE + 2)]
+    assert max(stand_in.served) <= LAST_PAGE + scheduler.max_in_flight
+
+
+def test_cancelled_pages_keep_their_slot_until_the_fetch_returns():
+    def slow_after_first(page):
+        if page > 1:
+            time.sleep(0.3)
+        return canned_page(page)
+
+    # The first keyword matches on page 1 while its pages 2-3 are still being
+    # fetched; those threads keep running, so the next keyword must wait for them
+    with StandIn(slow_after_first, delay=0) as server:
+        scheduler = make_scheduler(server, rate=100, burst=6, max_in_flight=3)
+        outcomes = scheduler.run([("casti", "grid"), ("boxe", "grid")], "DOTHER0000", pages=0, cap=50,
+                                 strict_grid=True, ignore_sponsored=True)
+
+    assert [outcome["matches"][0]["page"] for outcome in outcomes] == [1, 1]
+    assert server.peak_in_flight <= 3
+    assert scheduler.stats()["peak_in_flight"] == {"127.0.0.1": 3}
+
+
+def test_failed_page_ends_only_its_keyword(stand_in):
+    scheduler = make_scheduler(stand_in, rate=100, burst=3, max_in_flight=2)
+    fetch_cards = scheduler.fetch_cards
+
+    def flaky(keyword, page, view):
+        if keyword == "boxe" and page == 2:
+            raise requests.ConnectionError("connection reset")
+        return fetch_cards(keyword, page, view)
+
+    scheduler.fetch_cards = flaky
+    casti, boxe = scheduler.run([("casti", "grid"), ("boxe", "grid")], TARGET, pages=0, cap=50,
+                                strict_grid=True, ignore_sponsored=True)
+
+    assert casti["matches"][0]["page"] == TARGET_PAGE
+    assert casti["error"] is None
+    assert boxe["matches"] == []
+    assert boxe["error"] == {"page": 2, "rank_global": PER_PAGE, "reason": "ConnectionError: connection reset"}
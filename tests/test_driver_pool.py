@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from driver_pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self, key=None):
+        self.key = key
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if self.quit_called:
+            raise RuntimeError("driver is gone")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def lease_in_threads(pool: DriverPool, n: int, hold: float = 0.05, key=None, timeout=2):
+    errors = []
+
+    def work():
+        try:
+            with pool.driver(timeout=timeout, key=key):
+                time.sleep(hold)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads), "a waiter never woke up"
+    return errors
+
+
+def test_recycled_driver_wakes_a_waiter():
+    pool = DriverPool(FakeDriver, size=1, max_pages=1)
+    assert lease_in_threads(pool, 2) == []
+    assert pool.stats()["launched"] == 2
+    assert pool.stats()["live"] == 0
+
+
+def test_waiter_without_timeout_gets_a_replacement_for_a_broken_driver():
+    pool = DriverPool(FakeDriver, size=1, max_pages=40)
+
+    def crash():
+        with pool.driver():
+            time.sleep(0.05)
+            raise RuntimeError("tab crashed")
+
+    crasher = threading.Thread(target=lambda: pytest.raises(RuntimeError, crash))
+    crasher.start()
+    time.sleep(0.01)
+    assert lease_in_threads(pool, 1, timeout=None) == []
+    crasher.join(5)
+    assert pool.stats()["launched"] == 2
+
+
+def test_more_callers_than_drivers_all_get_served():
+    pool = DriverPool(FakeDriver, size=2, max_pages=3)
+    assert lease_in_threads(pool, 8, hold=0.02) == []
+    stats = pool.stats()
+    assert stats["live"] <= 2
+    assert stats["live"] == stats["idle"]
+
+
+def test_idle_driver_on_another_key_is_replaced():
+    pool = DriverPool(FakeDriver, size=1)
+    with pool.driver(key="http://10.0.0.1:8080") as first:
+        pass
+    assert pool.idle_keys() == {"http://10.0.0.1:8080"}
+    with pool.driver(key="http://10.0.0.2:8080") as second:
+        assert second.key == "http://10.0.0.2:8080"
+    assert first.quit_called
+    assert pool.idle_keys() == {"http://10.0.0.2:8080"}
+
+
+def test_acquire_times_out_when_every_driver_is_busy():
+    pool = DriverPool(FakeDriver, size=1)
+    handle = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.release(handle)
+    assert pool.acquire(timeout=0.05) is handle
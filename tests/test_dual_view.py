@@ -0,0 +1,37 @@
+import threading
+
+from dual_view import DualViewPages
+
+GRID = [{"pd_code": "DPN7K9MBM"}]
+LIST = [{"pd_code": "DLIST0001"}]
+
+
+def test_each_view_comes_from_one_navigation():
+    single = []
+    pages = DualViewPages(lambda kw, page: {"grid": GRID, "list": LIST},
+                          lambda kw, page, view: single.append(view))
+    assert pages.cards("casti", 1, "list") == LIST
+    assert pages.cards("casti", 1, "grid") == GRID
+    assert pages.stats() == {"navigations": 1, "served_from_memory": 1, "pending_pages": 0}
+    assert single == []
+
+
+def test_page_without_a_toggle_fetches_the_list_view_on_its_own():
+    fetched = []
+
+    def fetch_one(kw, page, view):
+        fetched.append(view)
+        return LIST
+
+    pages = DualViewPages(lambda kw, page: {"grid": GRID}, fetch_one)
+    results = {}
+    threads = [threading.Thread(target=lambda v=view: results.__setitem__(v, pages.cards("casti", 1, v)))
+               for view in ("grid", "list")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert results == {"grid": GRID, "list": LIST}
+    assert fetched == ["list"]
+    assert pages.stats()["navigations"] == 1
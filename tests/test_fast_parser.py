@@ -0,0 +1,24 @@
+from conftest import read_page
+
+from emag_rank import console, parse_cards_bs4
+from fast_parser import compare_backends, parse_cards_lxml
+
+console.quiet = True
+
+
+def test_lxml_matches_bs4_on_the_saved_page():
+    html = read_page()
+    assert compare_backends(html) == []
+    assert parse_cards_lxml(html) == parse_cards_bs4(html)
+
+
+def test_lxml_matches_bs4_without_card_grid():
+    # Without #card_grid both parsers fall back to scanning every card container
+    html = read_page().replace('id="card_grid"', 'id="card_list"')
+    assert compare_backends(html) == []
+
+
+def test_saved_search_page_has_cards():
+    cards = parse_cards_lxml(read_page())
+    assert cards
+    assert all(card["pd_code"] and card["url_abs"].startswith("https://www.emag.ro/") for card in cards)
@@ -0,0 +1,33 @@
+import pytest
+
+from emag_rank import console, parse_cards_bs4
+from js_extract import rows_to_cards
+
+console.quiet = True
+
+GRID_PAGE = """<html><body><div id="card_grid">{}</div></body></html>"""
+CARD = '<div class="card-item" data-url="{url}" data-name="{name}" data-position="{pos}"><span class="badge">{badge}</span></div>'
+
+
+def page_and_rows(cards):
+    html = GRID_PAGE.format("".join(CARD.format(**card) for card in cards))
+    rows = [[card["url"], card["name"], str(card["pos"]), [card["badge"]], False] for card in cards]
+    return html, rows
+
+
+def test_rows_match_bs4_grid_cards():
+    html, rows = page_and_rows([
+        {"url": "https://www.emag.ro/a/pd/AAA111/", "name": "A", "pos": 1, "badge": "Promovat"},
+        {"url": "https://www.emag.ro/b/pd/BBB222/", "name": "B", "pos": 2, "badge": "Super Pret"},
+        {"url": "", "name": "No link", "pos": 3, "badge": ""},
+    ])
+    assert rows_to_cards(rows) == parse_cards_bs4(html)
+
+
+@pytest.mark.parametrize("url", ["https://www.emag.ro/no-code/", "/relative/path"])
+def test_invalid_product_url_raises_like_bs4(url):
+    html, rows = page_and_rows([{"url": url, "name": "X", "pos": 1, "badge": ""}])
+    with pytest.raises(ValueError):
+        parse_cards_bs4(html)
+    with pytest.raises(ValueError):
+        rows_to_cards(rows)
@@ -0,0 +1,124 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from conftest import StandIn, read_page
+
+from emag_rank import console
+from rank_api import RankService, make_server
+
+console.quiet = True
+
+TARGET = "DPN7K9MBM"
+SEARCH_HTML = read_page()
+
+
+@pytest.fixture
+def stand_in():
+    with StandIn(lambda page: SEARCH_HTML, delay=0.3) as server:
+        yield server
+
+
+@contextlib.contextmanager
+def serve(service: RankService):
+    """The API for `service` on a free local port; yields its base URL."""
+    server = make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+@pytest.fixture
+def api(stand_in, request):
+    def fetch_html(keyword, page, view):
+        response = requests.get(f"{stand_in.base_url}/search/{keyword}?ref={view}&page={page}", timeout=10)
+        response.raise_for_status()
+        return response.text
+
+    service = RankService(fetch_html, **getattr(request, "param", {}))
+    with serve(service) as url:
+        yield service, url
+
+
+def rank(url: str, keyword: str = "casti", **params):
+    return requests.get(f"{url}/rank", params={"pd_code": TARGET, "keyword": keyword, "pages": 1, **params}, timeout=10)
+
+
+def test_concurrent_callers_share_one_fetch(stand_in, api):
+    service, url = api
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: rank(url), range(8)))
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert {r.json()["rank_global"] for r in responses} == {1}
+    sources = sorted(r.json()["page_sources"][0] for r in responses)
+    assert sources.count("fetch") == 1
+    assert set(sources) <= {"fetch", "shared", "cache"}
+    assert stand_in.served == [1]
+    assert service.fetches == 1
+
+
+def test_keyword_spelling_shares_the_cache(stand_in, api):
+    service, url = api
+    assert rank(url, "Casti  Bluetooth").json()["page_sources"] == ["fetch"]
+    assert rank(url, " casti bluetooth").json()["page_sources"] == ["cache"]
+    assert service.fetches == 1
+
+
+@pytest.mark.parametrize("api", [{"ttl_sec": 0.5}], indirect=True)
+def test_cached_page_expires_after_ttl(stand_in, api):
+    service, url = api
+    assert rank(url).json()["page_sources"] == ["fetch"]
+    assert rank(url).json()["page_sources"] == ["cache"]
+    assert service.pages.stats() == {"pages": 1, "hits": 1, "misses": 1}
+
+    time.sleep(0.6)
+    assert rank(url).json()["page_sources"] == ["fetch"]
+    assert service.fetches == 2
+    assert stand_in.served == [1, 1]
+    assert service.pages.stats()["misses"] == 2
+
+
+@pytest.mark.parametrize("api", [{"max_upstream": 1}], indirect=True)
+def test_upstream_fetches_share_one_limit(stand_in, api):
+    service, url = api
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(lambda kw: rank(url, kw), ["a", "b", "c", "d"]))
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert service.fetches == 4
+    assert stand_in.peak_in_flight == 1
+
+
+@pytest.mark.parametrize("api", [{"request_timeout": 0.1}], indirect=True)
+def test_slow_upstream_times_out_and_still_fills_the_cache(stand_in, api):
+    service, url = api
+    response = rank(url)
+    assert response.status_code == 504
+    assert "error" in response.json()
+
+    # The abandoned fetch finishes (0.3s upstream + parsing) and caches the page
+    deadline = time.monotonic() + 5
+    while not service.pages.stats()["pages"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert rank(url).json()["page_sources"] == ["cache"]
+    assert service.fetches == 1
+    assert service.stats()["timeouts"] == 1
+
+
+def test_unexpected_errors_return_json():
+    def broken(keyword, page, view):
+        raise KeyError("card_grid")
+
+    with serve(RankService(broken)) as url:
+        response = rank(url)
+    assert response.status_code == 500
+    assert "KeyError" in response.json()["error"]
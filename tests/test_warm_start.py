@@ -0,0 +1,55 @@
+from emag_rank import console
+from rank_store import RankStore
+from warm_start import filter_key, warm_start_search
+
+console.quiet = True
+
+TARGET = "DPN7K9MBM"
+PER_PAGE = 4
+
+
+def card(pd_code: str, idx: int) -> dict:
+    return {"pd_code": pd_code, "title": f"Casti {pd_code}", "idx_on_page": idx,
+            "is_promoted": False, "is_sponsored": False}
+
+
+def site(target_pages, last_page=8):
+    """fetch_cards for a keyword whose results list TARGET (first slot) on `target_pages`."""
+    fetched = []
+
+    def fetch_cards(keyword, page, view):
+        fetched.append(page)
+        if page > last_page:
+            return []
+        codes = [f"D{page:03d}{i}" for i in range(PER_PAGE)]
+        if page in target_pages:
+            codes[0] = TARGET
+        return [card(code, i) for i, code in enumerate(codes, start=1)]
+
+    return fetch_cards, fetched
+
+
+def search(store, fetch_cards, start_page):
+    return warm_start_search("casti", "grid", TARGET, start_page, fetch_cards, 20, False, False, store)
+
+
+def test_earlier_occurrence_wins_over_the_page_last_seen(tmp_path):
+    store = RankStore(str(tmp_path / "history.sqlite3"))
+    fetch_cards, fetched = site({2, 5})
+    outcome = search(store, fetch_cards, start_page=5)
+    store.close()
+
+    assert fetched[0] == 5
+    assert (outcome["match"]["page"], outcome["match"]["rank_global"]) == (2, PER_PAGE + 1)
+
+
+def test_cached_pages_without_the_target_are_not_refetched(tmp_path):
+    store = RankStore(str(tmp_path / "history.sqlite3"))
+    search(store, site({5})[0], start_page=1)
+    fetch_cards, fetched = site({5})
+    outcome = search(store, fetch_cards, start_page=5)
+
+    assert fetched == [5]
+    assert outcome["match"]["rank_global"] == 4 * PER_PAGE + 1
+    assert store.page_codes("casti", "grid", filter_key(False, False), 2) == {f"D002{i}" for i in range(PER_PAGE)}
+    store.close()
@@ -1,5 +1,7 @@
 # Utility functions for emag-product-rank-finder
 import datetime
+import re
+import unicodedata
 import pandas as pd
 
 def deduplicate_cards(cards):
@@ -22,6 +24,11 @@ def filter_columns(df, columns):
     """Return DataFrame with selected columns only."""
     return df[columns]
 
+def normalize_keyword(keyword):
+    """Canonical form of a search keyword: NFKC, lowercase, single spaces."""
+    keyword = unicodedata.normalize("NFKC", str(keyword)).lower()
+    return re.sub(r"\s+", " ", keyword).strip()
+
 def get_version():
     return "v0.02"
 
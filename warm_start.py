@@ -0,0 +1,96 @@
+# Warm-start rank search for emag-product-rank-finder
+"""Start the page walk near where a product was last seen instead of at page 1.
+
+`warm_start_search` fetches the last known page first and then searches
+outward (p, p+1, p-1, p+2, ...). Once the product is found, every earlier
+page must be known not to list it (the product can appear more than once)
+and the exact global rank needs their filtered card counts; both come from
+the page-count cache when fresh and are fetched (and cached) otherwise.
+
+`memory` is the rank history store (`rank_store.RankStore`): it answers the
+last known page and keeps the per-page counts.
+"""
+from typing import Callable, Dict, Iterator, List
+
+from emag_rank import filter_cards, find_target
+
+
+def filter_key(strict_grid: bool, ignore_sponsored: bool) -> str:
+    return f"strict={int(bool(strict_grid))},ignore={int(bool(ignore_sponsored))}"
+
+
+def outward_pages(start: int, last_page: int) -> Iterator[int]:
+    """start, start+1, start-1, start+2, start-2, ... clipped to [1, last_page]."""
+    start = min(max(1, start), last_page)
+    yield start
+    for step in range(1, last_page):
+        for page in (start + step, start - step):
+            if 1 <= page <= last_page:
+                yield page
+
+
+def warm_start_search(keyword: str, view: str, target_pd_code: str, start_page: int,
+                      fetch_cards: Callable[[str, int, str], List[Dict]], last_page: int,
+                      strict_grid: bool, ignore_sponsored: bool, memory) -> Dict:
+    """Find the target searching outward from `start_page`; returns match details and fetch count.
+
+    A hit is only reported once every page below it is known not to hold the
+    target, so the match is the first occurrence, as in the cold walk.
+    `page_counts` maps every page whose filtered card count is known (fetched
+    or taken from the cache) to that count, so callers can rank the pages
+    before the match in order.
+    """
+    filters = filter_key(strict_grid, ignore_sponsored)
+    outcome = {"match": None, "fetches": 0, "pages_checked": [], "page_counts": {}}
+    upper = last_page
+
+    def load(page):
+        cards = fetch_cards(keyword, page, view)
+        filtered = filter_cards(cards, strict_grid, ignore_sponsored)
+        outcome["fetches"] += 1
+        outcome["pages_checked"].append(page)
+        outcome["page_counts"][page] = len(filtered)
+        memory.record_page_count(keyword, view, filters, page, len(filtered), [c["pd_code"] for c in filtered])
+        return cards, filtered
+
+    found = None
+    for page in outward_pages(start_page, last_page):
+        if page > upper:
+            continue
+        cards, filtered = load(page)
+        if not cards:
+            # Results end before this page; nothing above it can match
+            upper = page - 1
+            continue
+        position = find_target(filtered, target_pd_code)
+        if position:
+            found = (page, cards, filtered, position)
+            break
+    if found is None:
+        return outcome
+
+    # Pages checked above had no match; the rest below the hit must be cleared too
+    preceding = 0
+    for earlier in range(1, found[0]):
+        count = outcome["page_counts"].get(earlier)
+        if count is None:
+            count = memory.page_count(keyword, view, filters, earlier)
+            codes = memory.page_codes(keyword, view, filters, earlier)
+            if count is None or codes is None or target_pd_code in codes:
+                cards, filtered = load(earlier)
+                count = len(filtered)
+                position = find_target(filtered, target_pd_code)
+                if position:
+                    found = (earlier, cards, filtered, position)
+                    break
+            outcome["page_counts"][earlier] = count
+        preceding += count
+    page, cards, filtered, position = found
+    outcome["match"] = {
+        "page": page,
+        "position_on_page": position,
+        "rank_global": preceding + position,
+        "card": filtered[position - 1],
+        "excluded_count": len([c for c in cards if c["is_promoted"] or c["is_sponsored"]]),
+    }
+    return outcome